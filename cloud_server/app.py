@@ -85,7 +85,8 @@ def get_all_tapes(date):
         colls_to_add = xcept(collections, aa.collection_list)
         print(f'Need to add collection {colls_to_add}')
         config.optd['COLLECTIONS'] = config.optd['COLLECTIONS'] + colls_to_add
-        aa = Archivary.Archivary(collection_list=config.optd['COLLECTIONS'])
+        for collection in colls_to_add:
+            aa.add_collection(collection)
     tapes = aa.tape_dates[date]
     get_anything = True
     tape_collections = []
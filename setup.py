@@ -33,6 +33,7 @@ setup(
         "aiofiles",
         "cherrypy",
         "gpiozero",
+        "numpy",
         "pexpect",
         "Pillow",
         "psutil",
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+"""
+    Benchmarks of the Archivary, run on synthetic archives so that no network is needed.
+    The stand-ins for archive.org are those of the tests. It is not shipped with the package, so run it from the root of the repository:
+
+    python -m test.benchmark --n_tapes 200000
+    python -m test.benchmark --benchmark download --n_tapes 50000
+    python -m test.benchmark --benchmark metadata --n_tapes 1000 --n_fetch 200
+    python -m test.benchmark --benchmark startup --n_tapes 200000 --n_collections 4
+    python -m test.benchmark --benchmark metadata_cache --n_tapes 1000
+"""
+import json
+import optparse
+import os
+import tempfile
+import time
+from operator import methodcaller
+
+from test.stand_ins import ScrapeStandIn, archive_metadata, period_files, synthetic_rows
+from timemachine import Archivary
+from timemachine import config
+
+parser = optparse.OptionParser()
+parser.add_option("--benchmark", dest="benchmark", type="string", default="scoring", help="scoring, download, metadata, metadata_cache or startup [default %default]")
+parser.add_option("--n_tapes", dest="n_tapes", type="int", default=200_000, help="number of tapes [default %default]")
+parser.add_option("--seed", dest="seed", type="int", default=1, help="random seed [default %default]")
+parser.add_option(
+    "--favored_taper", dest="favored_taper", type="string", default='{"miller": 3, "UltraMatrix": 5}', help="json of FAVORED_TAPER [default %default]"
+)
+parser.add_option("--page_size", dest="page_size", type="int", default=1000, help="items per scrape page [default %default]")
+parser.add_option("--n_fetch", dest="n_fetch", type="int", default=200, help="tapes whose metadata is fetched [default %default]")
+parser.add_option("--max_workers", dest="max_workers", type="int", default=4, help="parallel downloads [default %default]")
+parser.add_option("--n_collections", dest="n_collections", type="int", default=4, help="collections loaded at startup [default %default]")
+
+
+def timed(label, f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    print(f"{label:<40} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def ordering(tapes, scores):
+    """The identifiers of the tapes, best first within each date"""
+    ranked = sorted(zip(tapes, scores), key=lambda ts: ts[1], reverse=True)
+    ranked = sorted(ranked, key=lambda ts: ts[0].date)
+    return [t.identifier for t, _ in ranked]
+
+
+def benchmark_scoring(dbpath, rows):
+    """Score every tape with the scalar GDTape.compute_score and with the batch scorer"""
+    iddir = os.path.join(dbpath, "GratefulDead_ids")
+    os.makedirs(iddir)
+    table = timed(f"build TapeIndex ({len(rows)} tapes)", Archivary.TapeIndex.from_rows, iddir, rows)
+    archive = Archivary.GDArchive.__new__(Archivary.GDArchive)
+    archive.dbpath = dbpath
+    archive.collection_list = ["GratefulDead"]
+    archive.set_data = Archivary.GDSetBreaks(archive.collection_list)
+    archive.score_cache = Archivary.TapeScoreCache.for_dbpath(dbpath)
+    tape_rows = [Archivary.GDTapeRow(archive, table, i) for i in range(len(table))]
+    gd_tapes = timed("build GDTapes", lambda: [Archivary.GDTape(dbpath, row, archive.set_data, archive.collection_list) for row in rows])
+
+    scalar = timed("GDTape.compute_score", lambda: [t.compute_score() for t in gd_tapes])
+    row_scalar = timed("GDTapeRow.compute_score", lambda: [t.compute_score() for t in tape_rows])
+    batch = timed("batch_scores", Archivary.batch_scores, tape_rows)
+    timed("rank_tapes", Archivary.rank_tapes, tape_rows)
+    timed("sorted by compute_score", sorted, gd_tapes, key=methodcaller("compute_score"), reverse=True)
+
+    assert list(batch) == scalar == row_scalar, "batch scores differ from compute_score"
+    assert ordering(tape_rows, batch) == ordering(gd_tapes, scalar), "batch ordering differs"
+    print("scores and orderings are identical")
+
+
+def benchmark_download(dbpath, rows, page_size, max_workers):
+    """Download an etree collection from a ScrapeStandIn, serially and in parallel"""
+    for row in rows:
+        row["collection"] = ["etree"] + row["collection"]
+    results = {}
+    with ScrapeStandIn(rows, page_size=page_size, latency=0.05, item_latency=0.0002) as stand_in:
+        for workers in [1, max_workers]:
+            iddir = os.path.join(dbpath, f"{workers}", "etree_ids")
+            downloader = Archivary.IATapeDownloader(stand_in.url, max_workers=workers, rate_limiter=Archivary.RateLimiter(20))
+            n_requests = stand_in.n_requests
+            timed(f"download with {workers} workers", downloader.get_all_tapes, iddir, date_range=[1960, 1999])
+            print(f"{stand_in.n_requests - n_requests} requests")
+            results[workers] = period_files(iddir)
+    assert results[1] == results[max_workers], "parallel download differs"
+    print("downloads are identical")
+
+
+def benchmark_metadata(dbpath, rows, n_fetch):
+    """Fetch the metadata of n_fetch tapes from a ScrapeStandIn, with requests and with aiohttp"""
+    set_data = Archivary.GDSetBreaks(["GratefulDead"])
+    results = {}
+    with ScrapeStandIn(rows, latency=0.05, item_latency=0.0002) as stand_in:
+        for backend, aiohttp in [("requests", None), ("aiohttp", Archivary.aiohttp)]:
+            tapes = [Archivary.GDTape(os.path.join(dbpath, backend), row, set_data, ["GratefulDead"]) for row in rows[:n_fetch]]
+            for tape in tapes:
+                tape.url_metadata = f"{stand_in.url}/metadata/{tape.identifier}"
+            Archivary.aiohttp, aiohttp = aiohttp, Archivary.aiohttp
+            try:
+                timed(f"fetch_metadata of {n_fetch} tapes, {backend}", Archivary.fetch_metadata, tapes)
+            finally:
+                Archivary.aiohttp = aiohttp
+            results[backend] = [[(t.title, t.files[0]["name"]) for t in tape.tracks()] for tape in tapes]
+        for host, stats in Archivary.http_client.stats().items():
+            print(f"{host}: {stats['requests']} requests on {stats['connections']} connections")
+    assert results["requests"] == results["aiohttp"], "tracks differ"
+    print("tracks are identical")
+
+
+def benchmark_metadata_cache(dbpath, rows):
+    """The disk usage and the time to read the metadata of each tape, with the legacy cache of the raw json and the
+    slim, compressed cache it is migrated to"""
+    set_data = Archivary.GDSetBreaks(["GratefulDead"])
+
+    def new_tapes():
+        return [Archivary.GDTape(dbpath, row, set_data, ["GratefulDead"]) for row in rows]
+
+    def legacy_path(tape):
+        return tape.meta_path[: -len(Archivary.METADATA_SUFFIX)] + Archivary.LEGACY_METADATA_SUFFIX
+
+    def read_legacy(tapes):
+        for tape in tapes:
+            tape.load_metadata(json.load(open(legacy_path(tape), "r")), write=False)
+
+    def read_cached(tapes):
+        for tape in tapes:
+            tape.load_metadata(Archivary.read_cached_metadata(tape.meta_path, Archivary.slim_ia_metadata), write=False)
+
+    for tape in new_tapes():
+        os.makedirs(os.path.dirname(tape.meta_path), exist_ok=True)
+        json.dump(archive_metadata(tape.identifier, 5 + len(tape.identifier) % 10), open(legacy_path(tape), "w"), indent=2)
+    legacy_tapes = new_tapes()
+    timed(f"read legacy metadata of {len(rows)} tapes", read_legacy, legacy_tapes)
+    n_files, legacy_bytes, n_bytes = timed("migrate_metadata_cache", Archivary.migrate_metadata_cache, dbpath)
+    tapes = new_tapes()
+    timed(f"read slim metadata of {len(rows)} tapes", read_cached, tapes)
+    print(f"{n_files} files: {legacy_bytes} bytes before, {n_bytes} bytes after, {legacy_bytes / max(1, n_bytes):.1f}x smaller")
+    assert [[(t.title, t.files) for t in tape.tracks()] for tape in tapes] == [[(t.title, t.files) for t in tape.tracks()] for tape in legacy_tapes], "tracks differ"
+    assert [tape.venue() for tape in tapes] == [tape.venue() for tape in legacy_tapes], "venues differ"
+    print("tracks and venues are identical")
+
+
+def benchmark_startup(dbpath, rows, n_collections, max_workers):
+    """Load an archive of n_collections collections, reading them serially and in a process pool, with the tape
+    indexes built from the json (cold) and read from disk (warm)"""
+    collection_list = [f"Collection{c}" for c in range(n_collections)]
+    periods = {}
+    for i, row in enumerate(rows):
+        row["collection"] = [collection_list[i % n_collections]] + row["collection"][1:]
+        periods.setdefault((row["collection"][0], Archivary.to_decade(row["date"])), []).append(row)
+    for workers in [1, max_workers]:
+        for (collection, period), period_rows in periods.items():
+            iddir = os.path.join(dbpath, f"{workers}", f"{collection}_ids")
+            os.makedirs(iddir, exist_ok=True)
+            Archivary.write_rows(os.path.join(iddir, f"ids_{period}.json"), period_rows)
+    config.optd["COLLECTIONS"] = collection_list
+    results = {}
+    times = {}
+    load_workers = Archivary.GDArchive.load_workers
+    try:
+        for workers in [1, max_workers]:
+            Archivary.GDArchive.load_workers = workers
+            for state in ["cold", "warm"]:
+                start = time.perf_counter()
+                archive = Archivary.GDArchive(dbpath=os.path.join(dbpath, f"{workers}"), collection_list=collection_list, date_range=[1960, 1999])
+                times[(workers, state)] = time.perf_counter() - start
+                print(f"{f'{state} load with {workers} workers':<40} {times[(workers, state)]:8.3f}s")
+            results[workers] = {date: [t.identifier for t in tapes] for date, tapes in archive.tape_dates.items()}
+    finally:
+        Archivary.GDArchive.load_workers = load_workers
+    for state in ["cold", "warm"]:
+        print(f"{state} speedup with {max_workers} workers: {times[(1, state)] / times[(max_workers, state)]:.2f}x")
+    assert results[1] == results[max_workers], "parallel load differs"
+    print("archives are identical")
+
+
+if __name__ == "__main__":
+    parms, remainder = parser.parse_args()
+    config.optd = {"COLLECTIONS": ["GratefulDead"], "FAVORED_TAPER": json.loads(parms.favored_taper), "PLAY_LOSSLESS": False}
+    Archivary.http_client.rate_limiter = Archivary.RateLimiter(None)  # the stand-in needs no protection
+    with tempfile.TemporaryDirectory() as dbpath:
+        if parms.benchmark == "metadata":
+            benchmark_metadata(dbpath, synthetic_rows(parms.n_tapes, parms.seed), parms.n_fetch)
+        elif parms.benchmark == "metadata_cache":
+            benchmark_metadata_cache(dbpath, synthetic_rows(parms.n_tapes, parms.seed))
+        elif parms.benchmark == "startup":
+            benchmark_startup(dbpath, synthetic_rows(parms.n_tapes, parms.seed), parms.n_collections, parms.max_workers)
+        elif parms.benchmark == "download":
+            benchmark_download(dbpath, synthetic_rows(parms.n_tapes, parms.seed), parms.page_size, parms.max_workers)
+        else:
+            benchmark_scoring(dbpath, synthetic_rows(parms.n_tapes, parms.seed))
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from timemachine import Archivary
+from timemachine import config
+
+
+class DateReader:
+    """Stands in for the controls.date_knob_reader of a player"""
+
+    def __init__(self, archive, date=None):
+        self.archive = archive
+        self.date = date
+
+    def fmtdate(self):
+        return self.date
+
+    def set_archive(self, archive):
+        self.archive = archive
+
+
+class State:
+    """Stands in for the controls.state of a player"""
+
+    def __init__(self, archive, date=None, current=None):
+        self.date_reader = DateReader(archive, date)
+        self.current = current if current is not None else {}
+
+    @property
+    def archive(self):
+        return self.date_reader.archive
+
+    def set_archive(self, archive):
+        self.date_reader.set_archive(archive)
+
+    def get_current(self):
+        return self.current
+
+
+@pytest.fixture
+def optd(monkeypatch):
+    """The options of a Grateful Dead player. config.optd is restored after the test, so the test may change it."""
+    monkeypatch.setattr(config, "optd", {"COLLECTIONS": ["GratefulDead"], "FAVORED_TAPER": {"miller": 3}, "PLAY_LOSSLESS": False})
+    return config.optd
+
+
+@pytest.fixture
+def write_ids(tmp_path):
+    """Writes rows to an ids file of a collection in tmp_path. Returns the iddir."""
+
+    def write(rows, collection="GratefulDead", name="ids_1970.json"):
+        iddir = tmp_path / f"{collection}_ids"
+        iddir.mkdir(exist_ok=True)
+        (iddir / name).write_text(json.dumps(rows))
+        return iddir
+
+    return write
+
+
+@pytest.fixture
+def gd_archive(tmp_path, optd, write_ids):
+    """Builds a GDArchive of the COLLECTIONS option in tmp_path, of rows written to GratefulDead_ids/ids_1970.json if
+    they are given"""
+
+    def build(rows=None, **kwargs):
+        if rows is not None:
+            write_ids(rows)
+        kwargs.setdefault("collection_list", optd["COLLECTIONS"])
+        return Archivary.GDArchive(dbpath=str(tmp_path), **kwargs)
+
+    return build
+
+
+@pytest.fixture
+def gd_archivary(gd_archive):
+    """Builds an Archivary of the GratefulDead GDArchive in tmp_path, which downloads from url"""
+
+    def build(url):
+        aa = Archivary.Archivary.__new__(Archivary.Archivary)
+        aa.collection_list = ["GratefulDead"]
+        aa.archives = [gd_archive(url=url)]
+        aa.tape_dates = aa.get_tape_dates()
+        aa.dates = sorted(aa.tape_dates.keys())
+        return aa
+
+    return build
+
+
+@pytest.fixture
+def player_state():
+    """Builds a stand-in for the state of a player on an archive"""
+    return State
+
+
+@pytest.fixture
+def metadata_writer(monkeypatch):
+    """A MetadataWriter which is only flushed by hand, in place of the shared one"""
+    writer = Archivary.MetadataWriter(delay=60)
+    monkeypatch.setattr(Archivary, "metadata_writer", writer)
+    return writer
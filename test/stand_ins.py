@@ -0,0 +1,206 @@
+"""Stand-ins for archive.org, and synthetic tapes, shared by the tests and test/benchmark.py"""
+import bisect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from timemachine import Archivary
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients drop their idle keep-alive connections
+            super().handle_error(request, client_address)
+
+
+class ScrapeStandIn:
+    """A local stand-in for the archive.org scrape API, for tests and benchmarks.
+
+    Serves the items matching the collection, date and addeddate of the query, in date order, at most page_size
+    at a time with a cursor for the next page, and made-up metadata for any identifier. Cursors are rejected
+    after expire_cursors(). Each request takes latency + item_latency * (items or
+    tracks returned) seconds.
+    """
+
+    def __init__(self, items, page_size=10000, latency=0.0, item_latency=0.0):
+        self.items = sorted(items, key=lambda x: x["date"])
+        self.dates = [x["date"][:10] for x in self.items]
+        self.page_size = page_size
+        self.latency = latency
+        self.item_latency = item_latency
+        self.n_requests = 0
+        self.n_failures = 0  # the next n_failures requests get a 502
+        self.n_items = 0  # items served by queries
+        self.generation = 0
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep connections alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if stand_in.fail():
+                    self.send_error(502)
+                    return
+                if url.path.startswith("/metadata/"):
+                    body = json.dumps(stand_in.metadata(url.path.split("/")[-1])).encode("utf-8")
+                elif url.path == "/services/search/v1/scrape":
+                    parms = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    try:
+                        body = json.dumps(stand_in.query(parms["q"], int(parms["count"]), parms.get("cursor"))).encode("utf-8")
+                    except ValueError:
+                        self.send_error(400)
+                        return
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = StandInServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fail(self):
+        with self.lock:
+            self.n_failures = self.n_failures - 1
+            return self.n_failures >= 0
+
+    def add(self, items):
+        """Add items, as if they were uploaded"""
+        with self.lock:
+            self.items = sorted(self.items + items, key=lambda x: x["date"])
+            self.dates = [x["date"][:10] for x in self.items]
+
+    def expire_cursors(self):
+        self.generation = self.generation + 1
+
+    def query(self, q, count, cursor=None):
+        with self.lock:
+            self.n_requests = self.n_requests + 1
+        offset = 0
+        if cursor is not None:
+            generation, offset = map(int, cursor.split(":"))
+            if generation != self.generation:
+                raise ValueError(f"expired cursor {cursor}")
+        match = re.match(r"collection:(\S+) AND date:\[(\S+) TO (\S+)\](?: AND addeddate:\[(.+) TO (.+)\])?", q)
+        collection, min_date, max_date, min_addeddate, max_addeddate = match.groups()
+        items = [
+            x
+            for x in self.items[bisect.bisect_left(self.dates, min_date) : bisect.bisect_right(self.dates, max_date)]
+            if collection in x["collection"] and (min_addeddate is None or min_addeddate[:10] <= x["addeddate"][:10] <= max_addeddate[:10])
+        ]
+        page = items[offset : offset + min(count, self.page_size)]
+        with self.lock:
+            self.n_items = self.n_items + len(page)
+        time.sleep(self.latency + self.item_latency * len(page))
+        result = {"items": page, "count": len(page), "total": len(items)}
+        if offset + len(page) < len(items):
+            result["cursor"] = f"{self.generation}:{offset + len(page)}"
+        return result
+
+
+    def metadata(self, identifier):
+        """The metadata of a tape, as from archive.org/metadata/{identifier}"""
+        with self.lock:
+            self.n_requests = self.n_requests + 1
+        n_tracks = 5 + len(identifier) % 10
+        time.sleep(self.latency + self.item_latency * n_tracks)
+        return archive_metadata(identifier, n_tracks)
+
+
+def archive_metadata(identifier, n_tracks):
+    """Made-up metadata of a tape, with the derivatives, checksums and reviews of an archive.org/metadata response"""
+    rng = random.Random(identifier)
+
+    def checksums():
+        return {k: "%0*x" % (n, rng.getrandbits(4 * n)) for k, n in [("md5", 32), ("crc32", 8), ("sha1", 40)]}
+
+    files = []
+    for i in range(1, n_tracks + 1):
+        original = f"{identifier}t{i:02d}.flac"
+        length = f"{rng.uniform(60, 1200):.2f}"
+        files.append({"name": original, "title": f"Song number {i}", "track": str(i), "format": "Flac", "source": "original",
+                      "size": "30000000", "length": length, "mtime": "1600000000", "creator": "Grateful Dead", "album": identifier, **checksums()})
+        for name, fmt in [(".mp3", "VBR MP3"), (".ogg", "Ogg Vorbis"), (".png", "Spectrogram"), ("_spectrogram.png", "PNG")]:
+            files.append({"name": original.replace(".flac", name), "format": fmt, "source": "derivative", "original": original,
+                          "size": "3000000", "length": length, "mtime": "1600000100", "height": "0", "width": "0", **checksums()})
+    for name, fmt in [(".ffp", "Flac FingerPrint"), (".txt", "Text"), ("_meta.xml", "Metadata"), ("_files.xml", "Metadata")]:
+        files.append({"name": identifier + name, "format": fmt, "source": "original", "size": "5000", "mtime": "1600000000", **checksums()})
+    reviews = [
+        {"reviewbody": " ".join(rng.choice(["great", "show", "tape", "jam", "sound", "crisp", "the", "best"]) for _ in range(80)),
+         "reviewtitle": "A review", "reviewer": f"reviewer{k}", "reviewdate": "2010-01-01 00:00:00", "stars": "5"}
+        for k in range(rng.randint(0, 8))
+    ]
+    return {
+        "created": 1600000000,
+        "d1": "ia800000.us.archive.org",
+        "dir": f"/7/items/{identifier}",
+        "files": files,
+        "files_count": len(files),
+        "item_size": 400000000,
+        "metadata": {"identifier": identifier, "venue": "Winterland", "coverage": "San Francisco, CA", "creator": "Grateful Dead",
+                     "description": "Set 1 " * 50, "source": "SBD > Reel > DAT > CD", "lineage": "CD > EAC > Flac", "taper": "unknown"},
+        "reviews": reviews,
+        "server": "ia800000.us.archive.org",
+        "uniq": 1234567,
+    }
+
+
+def tape_row(identifier, date, collection="GratefulDead", **fields):
+    """A row in the format of an ids_{period}.json file, of a tape of collection (or of a list of collections), with
+    any other fields"""
+    collections = [collection] if isinstance(collection, str) else list(collection)
+    row = {"identifier": identifier, "date": date, "format": ["VBR MP3"], "collection": collections, "addeddate": "2004-06-23T05:38:42Z"}
+    row.update(fields)
+    return row
+
+
+def synthetic_rows(n_tapes, seed):
+    """Rows in the format of an ids_{period}.json file, for dates from 1965 to 1995"""
+    rng = random.Random(seed)
+    tapers = ["miller", "UltraMatrix", "hanno", "sbd", "aud", "fob", "matrix", "dsbd"]
+    rows = []
+    for i in range(n_tapes):
+        date = f"{rng.randint(1965, 1995)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        row = {
+            "identifier": f"gd{date}.{rng.choice(tapers)}.{i}",
+            "date": f"{date}T00:00:00Z",
+            "format": ["VBR MP3", "Flac"],
+            "collection": ["GratefulDead", "etree"] + (["stream_only"] if rng.random() < 0.2 else []),
+            "addeddate": f"{rng.randint(2003, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T05:38:42Z",
+        }
+        if rng.random() < 0.9:
+            row["downloads"] = rng.randint(0, 100_000)
+        if rng.random() < 0.7:
+            row["avg_rating"] = round(rng.uniform(1, 5), 2)
+            row["num_reviews"] = rng.randint(1, 50)
+        rows.append(row)
+    return rows
+
+
+def period_files(iddir):
+    return {name: sorted(t["identifier"] for t in json.load(open(os.path.join(iddir, name)))) for name in os.listdir(iddir) if Archivary.period_of(name) is not None}
@@ -1,7 +1,11 @@
+import datetime
+import json
 import os
 import time
-from threading import Event
+from concurrent.futures import ProcessPoolExecutor
+from threading import Event, Timer
 
+from test.stand_ins import ScrapeStandIn, archive_metadata, period_files, synthetic_rows, tape_row
 from timemachine import Archivary
 from timemachine import config
 from timemachine import GD
@@ -163,4 +167,854 @@ def test_format_1():
     os.system(f"rm {tape.meta_path}")
     tracks = tape.tracks()
     assert tracks[0].title == "Like A Rolling Stone"
- 
\ No newline at end of file
+ 
+def test_tape_index(tmp_path):
+    iddir = str(tmp_path / "GratefulDead_ids")
+    tapes = [
+        tape_row("gd77-05-08.sbd.hicks.4982", "1977-05-08T00:00:00Z", ["GratefulDead", "etree"], avg_rating=4.8, num_reviews=120, downloads=500000),
+        tape_row("phil1979-01-01", "1979-01-01T00:00:00Z", "PhilLeshandFriends", downloads=10, format=["Flac"], addeddate="2010-01-01T00:00:00Z"),
+    ]
+    downloader = Archivary.IATapeDownloader()
+    downloader.store_metadata(iddir, tapes)
+    downloader.save_indexes()
+    tape_index = Archivary.TapeIndex.load(iddir).refresh()
+    assert len(tape_index) == 2
+    rows = tape_index.select([1970], ["GratefulDead"])
+    assert [tape_index.row_dict(i)["identifier"] for i in rows] == ["gd77-05-08.sbd.hicks.4982"]
+    assert tape_index.row_dict(rows[0])["date"] == "1977-05-08"
+    assert "avg_rating" not in tape_index.row_dict(1)
+    assert tape_index.max_addeddate([1970]) == "2010-01-01T00:00:00Z"
+
+def test_lazy_tapes(optd, gd_archive):
+    optd.update({"FAVORED_TAPER": "miller", "PLAY_LOSSLESS": "false"})
+    tapes = [tape_row(f"gd77-05-08.sbd.taper{i}", "1977-05-08T00:00:00Z", avg_rating=4.0, num_reviews=10, downloads=1000 * i) for i in range(1, 4)]
+    gd = gd_archive(tapes)
+    rows = gd.tape_dates["1977-05-08"]
+    assert all(isinstance(t, Archivary.GDTapeRow) for t in rows)
+    assert rows[0].identifier == "gd77-05-08.sbd.taper3"
+    tape = gd.best_tape("1977-05-08", resort=False)
+    assert isinstance(tape, Archivary.GDTape)
+    assert gd.best_tape("1977-05-08", resort=False) is tape
+
+def test_score_cache(tmp_path, optd, write_ids, gd_archive):
+    optd["FAVORED_TAPER"] = "miller"
+    tapes = [tape_row(f"gd77-05-08.sbd.taper{i}", "1977-05-08T00:00:00Z", avg_rating=4.0, num_reviews=10, downloads=1000 * i) for i in range(1, 4)]
+    write_ids(tapes)
+    meta_path = tmp_path / "1977" / "5" / "gd77-05-08.sbd.taper1.json"
+    meta_path.parent.mkdir(parents=True)
+    files = [{"name": f"gd77-05-08d1t0{i}.mp3", "original": f"gd77-05-08d1t0{i}.flac", "source": "derivative",
+              "format": "VBR MP3", "size": "1000", "title": "Scarlet Begonias"} for i in range(1, 9)]
+    meta_path.write_text(json.dumps({"files": files, "metadata": {"venue": "Barton Hall", "coverage": "Ithaca, NY"}}))
+
+    gd = gd_archive()
+    assert (tmp_path / Archivary.SCORE_CACHE_NAME).exists()
+    assert len(gd.score_cache.get("gd77-05-08.sbd.taper1")) == 4
+    gd = gd_archive()  # scored from the cache
+    row = [t for t in gd.tape_dates["1977-05-08"] if t.identifier == "gd77-05-08.sbd.taper1"][0]
+    assert row._tape is None
+    assert row.compute_score() == row.tape().compute_score()
+
+
+def test_batch_scores(gd_archive):
+    tapes = [
+        tape_row(f"gd77-05-0{i}.sbd.{taper}", f"1977-05-0{i}T00:00:00Z", ["GratefulDead"] + extra, avg_rating=3.5 + i / 10, num_reviews=i, downloads=1000 * i)
+        for i in range(1, 9) for taper, extra in [("miller", []), ("hanno", ["stream_only"])]
+    ]
+    tapes.append(tape_row("gd77-05-08.aud.unknown", "1977-05-08T00:00:00Z"))
+    gd = gd_archive(tapes)
+    assert list(Archivary.batch_scores(gd.tapes)) == [t.compute_score() for t in gd.tapes]
+    for date, date_tapes in gd.tape_dates.items():
+        assert date_tapes == sorted(date_tapes, key=lambda t: t.compute_score(), reverse=True)
+
+
+def test_favored_taper(optd, gd_archive):
+    matcher = Archivary.TaperMatcher((("mill", 1.0), ("miller", 2.0)))
+    assert matcher.points("gd77-05-08.sbd.Miller.1234") == 3.0
+    assert matcher.points("gd77-05-08.sbd.hanno.1234") == 0
+    tapes = [
+        tape_row(f"gd77-05-0{i}.sbd.{taper}", f"1977-05-0{i}T00:00:00Z", avg_rating=4.0, num_reviews=10, downloads=downloads)
+        for i in range(1, 9) for taper, downloads in [("miller", 1000), ("hanno", 2000)]
+    ]
+    gd = gd_archive(tapes)
+    assert gd.tape_dates["1977-05-08"][0].identifier == "gd77-05-08.sbd.miller"
+    assert gd.rerank_favored_tapers() == []
+    optd["FAVORED_TAPER"] = {"miller": 3, "hanno.*": 5}  # tapers are not regular expressions
+    assert gd.rerank_favored_tapers() == []
+    optd["FAVORED_TAPER"] = {"miller": 3, "gd77-05-08.sbd.hanno": 5}
+    assert gd.rerank_favored_tapers() == ["1977-05-08"]
+    assert gd.tape_dates["1977-05-08"][0].identifier == "gd77-05-08.sbd.hanno"
+    assert gd.tape_dates["1977-05-07"][0].identifier == "gd77-05-07.sbd.miller"
+
+
+def test_options_watcher(tmp_path, monkeypatch, optd, gd_archive, player_state):
+    from threading import Lock
+
+    monkeypatch.setattr(config, "OPTIONS_PATH", str(tmp_path / "options.txt"))
+    commands = []
+    monkeypatch.setattr(os, "system", commands.append)
+    (tmp_path / "options.txt").write_text(json.dumps({"COLLECTIONS": "GratefulDead", "FAVORED_TAPER": "miller:3"}))
+    assert "FAVORED_TAPER" not in config.reload_options() and config.optd["FAVORED_TAPER"] == {"miller": 3.0}
+    assert config.reload_options() == set()
+    tapes = [
+        tape_row(f"gd77-05-08.sbd.{taper}", "1977-05-08T00:00:00Z", avg_rating=4.0, num_reviews=10, downloads=downloads)
+        for taper, downloads in [("miller", 1000), ("hanno", 2000)]
+    ]
+    gd = gd_archive(tapes)
+    assert gd.tape_dates["1977-05-08"][0].identifier == "gd77-05-08.sbd.miller"
+    lock = Lock()
+    watcher = Archivary.OptionsWatcher(player_state(gd), 10, Event(), lock=lock)
+    with lock:  # the lock is not taken when the tapers are unchanged
+        assert not watcher.rerank({"FAVORED_TAPER"})
+    (tmp_path / "options.txt").write_text(json.dumps({"COLLECTIONS": "GratefulDead", "FAVORED_TAPER": "hanno:3"}))
+    os.utime(tmp_path / "options.txt", ns=(0, 0))
+    old_optd = config.optd
+    changed = config.reload_options()
+    assert changed == {"FAVORED_TAPER"} and old_optd["FAVORED_TAPER"] == {"miller": 3.0}  # swapped in, not updated
+    assert watcher.rerank(changed)
+    assert gd.tape_dates["1977-05-08"][0].identifier == "gd77-05-08.sbd.hanno" and not lock.locked()
+    assert not watcher.rerank(changed)
+
+    (tmp_path / "options.txt").write_text(json.dumps({"COLLECTIONS": "GratefulDead", "FAVORED_TAPER": "hanno:3", "PLAY_LOSSLESS": "true"}))
+    os.utime(tmp_path / "options.txt", ns=(1, 1))
+    changed = config.reload_options()
+    assert changed == {"PLAY_LOSSLESS"} and gd.score_cache.play_lossless is False
+    assert watcher.rerank(changed) and gd.score_cache.play_lossless is True
+    assert gd.tape_dates["1977-05-08"][0].identifier == "gd77-05-08.sbd.hanno"
+    assert commands == []  # nothing but the options is reloaded
+
+
+def test_set_breaks():
+    sb = Archivary.GDSetBreaks(["GratefulDead"])
+    assert Archivary.GDSetBreaks(["GratefulDead"]).index is sb.index
+    d = sb.get_date("GratefulDead", "1977-05-08")
+    assert d is sb.get_date("GratefulDead", "1977-05-08")
+    assert d.location == ("Barton Hall, Cornell University", "Ithaca", "NY")
+    assert sb.get_date("GratefulDead", "1977-05-10").n_sets == 0
+    index = Archivary.SetBreaksIndex.load()
+    assert index.date_info.keys() == sb.index.date_info.keys()
+    assert [r.song for r in index.artist_dates["GratefulDead"]["1977-05-08"]] == [
+        r.song for r in sb.get_artist_set_dict("GratefulDead")["1977-05-08"]
+    ]
+
+
+def test_year_artists(optd, write_ids, gd_archive):
+    optd.update({"COLLECTIONS": ["georgeblood"], "FAVORED_TAPER": []})
+    for year, artists in [(1930, ["ida", "bessie"]), (1931, ["bessie"]), (1932, ["bessie", "ida"])]:
+        tapes = [
+            tape_row(f"78_song-{i}_{artist}-smith-and-his-orchestra_{i}", f"{year}-0{i % 9 + 1}-01T00:00:00Z", "georgeblood", downloads=i)
+            for i in range(30) for artist in artists
+        ]
+        write_ids(tapes, "georgeblood", f"ids_{year}.json")
+    gb = gd_archive(date_range=[1930, 1932])
+
+    def scan(start_year, end_year):  # the artists of each tape, in the order of tape_dates
+        id_dict = {}
+        for date, date_tapes in gb.tape_dates.items():
+            if start_year <= int(date[:4]) <= end_year:
+                for t in date_tapes:
+                    id_dict.setdefault(Archivary.artist_key(t.identifier), []).append(t)
+        return id_dict
+
+    assert sorted(gb.year_artists(1932, 1930)) == ["bessie smith", "ida smith"]
+    assert gb.year_artists(1930, 1932) == scan(1930, 1932)
+    assert gb.year_artists(1931) == scan(1931, 1931)
+    date = "1931-01-01"
+    gb.tape_dates[date] = gb.tape_dates[date][::-1]
+    gb.update_year_index([date])
+    assert gb.year_artists(1930, 1932) == scan(1930, 1932)
+
+
+def test_year_shards(tmp_path, optd, write_ids):
+    optd.update({"COLLECTIONS": ["georgeblood"], "FAVORED_TAPER": []})
+    for year in [1930, 1931, 1932]:
+        tapes = [
+            tape_row(f"78_song-{i}_{artist}-smith-and-his-orchestra_{year}{i}", f"{year}-0{i % 9 + 1}-01T00:00:00Z", "georgeblood", downloads=i)
+            for i in range(20) for artist in ["ida", "bessie"]
+        ]
+        write_ids(tapes, "georgeblood", f"ids_{year}.json")
+    shards = Archivary.YearShardCache(["georgeblood"], dbpath=str(tmp_path), max_bytes=1)
+    aa = shards.archivary([1930, 1931])
+    expected = Archivary.Archivary(dbpath=str(tmp_path), collection_list=["georgeblood"], date_range=[1930, 1931])
+    assert aa.dates == expected.dates
+    assert {d: [t.identifier for t in v] for d, v in aa.tape_dates.items()} == {
+        d: [t.identifier for t in v] for d, v in expected.tape_dates.items()
+    }
+    assert {k: [t.identifier for t in v] for k, v in aa.year_artists(1930, 1931).items()} == {
+        k: [t.identifier for t in v] for k, v in expected.year_artists(1930, 1931).items()
+    }
+    shard_1931 = shards.shards[1931]
+    assert shards.missing([1931, 1932]) == [1932]
+    aa = shards.archivary([1931, 1932])
+    assert shards.shards[1931] is shard_1931
+    assert list(shards.shards) == [1931, 1932]  # 1930 was dropped to stay within max_bytes
+    assert len(aa.dates) == 18
+
+
+def test_add_remove_collection(tmp_path, optd, write_ids, gd_archive):
+    optd.update({"COLLECTIONS": ["Ida"], "FAVORED_TAPER": []})
+    for n, collection in enumerate(["Ida", "Bessie", "Mamie"]):
+        tapes = [
+            tape_row(f"{collection}{day}-{i}", f"1975-01-{day:02d}", collection, downloads=10 * i + n)
+            for day in range(n + 1, n + 10) for i in range(3)
+        ]
+        write_ids(tapes, collection)
+
+    def ids(aa):
+        return {d: [t.identifier for t in v] for d, v in aa.tape_dates.items()}
+
+    aa = Archivary.Archivary(dbpath=str(tmp_path), collection_list=["Ida"])
+    assert aa.add_collection("Bessie") == [f"1975-01-{day:02d}" for day in range(2, 11)]
+    expected = Archivary.Archivary.from_archives([gd_archive(collection_list=["Ida"]), gd_archive(collection_list=["Bessie"])], ["Ida", "Bessie"])
+    assert ids(aa) == ids(expected)
+    assert aa.dates == expected.dates
+    aa.add_collection("Mamie")
+    assert aa.remove_collection("Bessie") == [f"1975-01-{day:02d}" for day in range(2, 11)]
+    expected = Archivary.Archivary.from_archives([gd_archive(collection_list=["Ida"]), gd_archive(collection_list=["Mamie"])], ["Ida", "Mamie"])
+    assert ids(aa) == ids(expected)
+    assert aa.dates == expected.dates
+    assert aa.collection_list == ["Ida", "Mamie"]
+
+    aa = Archivary.Archivary(dbpath=str(tmp_path), collection_list=["Ida", "Mamie"])
+    aa.remove_collection("Mamie")
+    expected = Archivary.Archivary(dbpath=str(tmp_path), collection_list=["Ida"])
+    assert ids(aa) == ids(expected)
+    assert aa.dates == expected.dates
+    assert aa.archives[0].idpath == [str(tmp_path / "Ida_ids")]
+
+
+def test_parallel_load(monkeypatch, optd, write_ids, gd_archive):
+    optd.update({"COLLECTIONS": ["Ida", "Bessie"], "FAVORED_TAPER": []})
+    for n, collection in enumerate(["Ida", "Bessie"]):
+        for decade in [1970, 1980]:
+            tapes = [
+                tape_row(f"{collection}{decade}-{i}", f"{decade + i % 10}-01-0{i % 9 + 1}", collection, downloads=10 * i + n,
+                         addeddate=f"20{10 + i % 10}-06-23T05:38:42Z")
+                for i in range(40)
+            ]
+            write_ids(tapes, collection, f"ids_{decade}.json")
+
+    pools = []
+
+    class Pool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    def load(workers):
+        monkeypatch.setattr(Archivary.GDArchive, "load_workers", workers)
+        archive = gd_archive(date_range=[1970, 1989])
+        return {d: [t.identifier for t in v] for d, v in archive.tape_dates.items()}, archive.max_addeddates
+
+    monkeypatch.setattr(Archivary, "ProcessPoolExecutor", Pool)
+    assert load(2) == load(1)  # the first load builds the tape indexes in the pool, the second reads them
+    assert len(pools) == 1
+    assert load(2) == load(1)
+    assert len(pools) == 1  # the indexes are current, so no process is started
+
+
+def test_memory_model(tmp_path, optd, write_ids):
+    model = Archivary.TapeMemoryModel(default_bytes_per_tape=500, min_tapes=100)
+    model.record(50, 10_000)
+    assert model.bytes_per_tape == 500
+    model.record(50, 20_000)
+    model.record(10, -5)  # freed memory is not a measurement
+    assert model.bytes_per_tape == 300
+    assert model.budget() > 0
+    optd.update({"COLLECTIONS": ["georgeblood"], "FAVORED_TAPER": []})
+    for year, n_tapes in [(1930, 10), (1931, 20), (1932, 30)]:
+        tapes = [tape_row(f"78_song-{i}_ida-cox_{year}{i}", f"{year}-01-01T00:00:00Z", "georgeblood") for i in range(n_tapes)]
+        iddir = write_ids(tapes, "georgeblood", f"ids_{year}.json")
+    Archivary.TapeIndex.load(str(iddir)).refresh()
+    shards = Archivary.YearShardCache(["georgeblood"], dbpath=str(tmp_path), max_bytes=35 * Archivary.memory_model.bytes_per_tape)
+    assert shards.year_tapes() == {1930: 10, 1931: 20, 1932: 30}
+    assert shards.select_years([1930, 1931, 1932]) in ([1930, 1931], [1932])
+    assert shards.diagnostics()["shards"] == {}
+
+
+def test_fit_date_range(tmp_path, monkeypatch, gd_archive, write_ids):
+    for decade, n_tapes in [(1970, 40), (1980, 40), (1990, 10)]:
+        tapes = [tape_row(f"gd{decade}-{i}", f"{decade + i % 10}-05-08T00:00:00Z") for i in range(n_tapes)]
+        write_ids(tapes, name=f"ids_{decade}.json")
+    assert len(gd_archive(date_range=[1970, 1999]).tapes) == 90  # and the tape index is built
+    model = Archivary.TapeMemoryModel(default_bytes_per_tape=500, min_tapes=10**9)
+    monkeypatch.setattr(model, "budget", lambda loaded_bytes=0: 50 * 500)
+    monkeypatch.setattr(Archivary, "memory_model", model)
+    gd = gd_archive(date_range=[1970, 1999])
+    assert gd.date_range == [1980, 1999]  # the 80s and the 90s fit, the 70s and the 80s don't
+    assert len(gd.tapes) == 50 and gd.dates[0] == "1980-05-08"
+    assert gd.diagnostics()["budget_bytes"] == 50 * 500
+    monkeypatch.setattr(model, "budget", lambda loaded_bytes=0: 10)
+    assert gd_archive(date_range=[1970, 1995]).date_range == [1990, 1995]  # at least the latest period
+
+
+def test_parallel_download(tmp_path):
+    tapes = [
+        tape_row(f"gd{year}-0{month}-01.sbd.{i}", f"{year}-0{month}-01T00:00:00Z", addeddate=f"20{i % 20:02d}-01-01T00:00:00Z")
+        for year in range(1966, 1996, 3) for month in range(1, 10) for i in range(3)
+    ]
+    with ScrapeStandIn(tapes, page_size=7) as stand_in:
+        results = []
+        for max_workers in [1, 4]:
+            iddir = str(tmp_path / f"{max_workers}" / "GratefulDead_ids")
+            downloader = Archivary.IATapeDownloader(stand_in.url, max_workers=max_workers, rate_limiter=Archivary.RateLimiter(None))
+            assert downloader.get_all_tapes(iddir, date_range=[1960, 1999]) == len(tapes)
+            n_requests = stand_in.n_requests
+            assert downloader.get_all_tapes(iddir, min_addeddate="2015-01-01", date_range=[1960, 1999]) == 0
+            assert stand_in.n_requests == n_requests + 1  # an update is not split into windows
+            tape_index = Archivary.TapeIndex.load(iddir).refresh()
+            assert not tape_index.dirty  # the index was saved with the files
+            results.append(sorted(tape_index.identifier(i) for i in range(len(tape_index))))
+        assert results[0] == results[1] == sorted(t["identifier"] for t in tapes)
+
+    rate_limiter = Archivary.RateLimiter(50)
+    start = time.time()
+    for _ in range(6):
+        rate_limiter.wait()
+    assert time.time() - start >= 0.1
+
+
+def test_async_download(tmp_path):
+    rows = synthetic_rows(300, 2)
+    set_data = Archivary.GDSetBreaks(["GratefulDead"])
+    results = {}
+    with ScrapeStandIn(rows, page_size=40) as stand_in:
+        for backend, aiohttp in [("requests", None), ("aiohttp", Archivary.aiohttp)]:
+            saved_aiohttp, Archivary.aiohttp = Archivary.aiohttp, aiohttp
+            try:
+                iddir = str(tmp_path / backend / "GratefulDead_ids")
+                downloader = Archivary.IATapeDownloader(stand_in.url, rate_limiter=Archivary.RateLimiter(None))
+                assert downloader.get_all_tapes(iddir, date_range=[1960, 1999]) == len(rows)
+                tapes = [Archivary.GDTape(str(tmp_path / backend), row, set_data, ["GratefulDead"]) for row in rows[:20]]
+                for tape in tapes:
+                    tape.url_metadata = f"{stand_in.url}/metadata/{tape.identifier}"
+                tapes[0].url_metadata = f"{stand_in.url}/missing/{tapes[0].identifier}"
+                assert Archivary.fetch_metadata(tapes) == 1
+            finally:
+                Archivary.aiohttp = saved_aiohttp
+            assert all(tape.meta_loaded for tape in tapes[1:])
+            results[backend] = (period_files(iddir), [[t.title for t in tape.tracks()] for tape in tapes[1:]])
+    assert results["requests"] == results["aiohttp"]
+
+
+def test_http_client(tmp_path):
+    client = Archivary.HttpClient(pool_size=2, retry=Archivary.RetryPolicy(n_retries=2, backoff=0.01))
+    with ScrapeStandIn([]) as stand_in:
+        host = stand_in.url.split("//")[1]
+        for i in range(5):
+            assert client.get(f"{stand_in.url}/metadata/gd77-05-08.{i}").status_code == 200
+        stats = client.stats()[host]
+        assert stats["requests"] == 5 and stats["connections"] == 1 and stats["reused"] == 4
+
+        stand_in.n_failures = 2
+        assert client.get(f"{stand_in.url}/metadata/gd77-05-08.sbd").status_code == 200
+        stand_in.n_failures = 3
+        assert client.get(f"{stand_in.url}/metadata/gd77-05-08.sbd").status_code == 502
+        stats = client.stats()[host]
+        assert stats["requests"] == 11 and stats["retries"] == 4
+
+        if Archivary.aiohttp is not None:
+            backend = client.async_backend()
+
+            async def get_all():
+                return await Archivary.asyncio.gather(*[backend.get_json(f"{stand_in.url}/metadata/gd77-05-08.{i}") for i in range(10)])
+
+            assert all(status == 200 and "files" in j for status, j in backend.run(get_all()))
+            async_stats = client.stats()[host]
+            assert async_stats["requests"] == 21 and async_stats["connections"] - stats["connections"] <= client.pool_size
+            backend.close()
+
+
+def test_circuit_breaker(tmp_path, monkeypatch):
+    rate_limiter = Archivary.RateLimiter(20, burst=5)
+    start = time.time()
+    for _ in range(5):
+        rate_limiter.wait()
+    assert time.time() - start < 0.05  # a burst
+    for _ in range(4):
+        rate_limiter.wait()
+    assert time.time() - start >= 0.2
+
+    client = Archivary.HttpClient(retry=Archivary.RetryPolicy(n_retries=0), failure_threshold=2, reset_timeout=0.5)
+    rows = synthetic_rows(2, 3)
+    tapes = [Archivary.GDTape(str(tmp_path), row, Archivary.GDSetBreaks(["GratefulDead"]), ["GratefulDead"]) for row in rows]
+    monkeypatch.setattr(Archivary, "http_client", client)
+    with ScrapeStandIn([]) as stand_in:
+        host = stand_in.url.split("//")[1]
+        for tape in tapes:
+            tape.url_metadata = f"{stand_in.url}/metadata/{tape.identifier}"
+        tapes[0].get_metadata()  # cached
+
+        stand_in.n_failures = 2
+        for _ in range(2):
+            assert client.get(stand_in.url + "/metadata/x").status_code == 502
+        assert client.stats()[host]["circuit"] == "open"
+        n_requests = stand_in.n_requests
+        start = time.time()
+        try:
+            tapes[1].get_metadata()
+            assert False, "the circuit should be open"
+        except Archivary.CircuitOpenError:
+            pass
+        assert time.time() - start < 0.1 and stand_in.n_requests == n_requests
+        tapes[0].meta_loaded = False
+        tapes[0].get_metadata()  # from the cache
+        assert tapes[0].meta_loaded and stand_in.n_requests == n_requests
+
+        time.sleep(0.5)
+        assert client.stats()[host]["circuit"] == "half-open"
+        tapes[1].get_metadata()  # the trial request closes the circuit
+        assert tapes[1].meta_loaded and client.stats()[host]["circuit"] == "closed"
+
+
+def test_reload_checkpoint(tmp_path):
+    class Interrupted(Exception):
+        pass
+
+    class FlakyDownloader(Archivary.IATapeDownloader):
+        """Fails after writing n_pages pages"""
+
+        def __init__(self, *args, n_pages=3, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.n_pages = n_pages
+
+        def window_writer(self, *args, **kwargs):
+            writer, cursor = super().window_writer(*args, **kwargs)
+            write = writer.write
+
+            def flaky_write(tapes):
+                self.n_pages = self.n_pages - 1
+                if self.n_pages < 0:
+                    raise Interrupted()
+                return write(tapes)
+
+            writer.write = flaky_write
+            return writer, cursor
+
+    rows = synthetic_rows(300, 4)
+    iddir = str(tmp_path / "GratefulDead_ids")
+    date_range = [1960, 1999]
+    with ScrapeStandIn(rows[:100], page_size=20) as stand_in:
+        Archivary.IATapeDownloader(stand_in.url, max_workers=1, rate_limiter=Archivary.RateLimiter(None)).get_all_tapes(iddir, date_range=date_range)
+    old_files = period_files(iddir)
+
+    with ScrapeStandIn(rows, page_size=20) as stand_in:
+        downloader = FlakyDownloader(stand_in.url, max_workers=1, n_pages=0, rate_limiter=Archivary.RateLimiter(None))
+        try:
+            downloader.reload_all_tapes(iddir, date_range=date_range)
+            assert False, "the reload should be interrupted"
+        except Interrupted:
+            pass
+        assert not os.path.exists(os.path.dirname(Archivary.staging_path(iddir)))  # there was nothing to resume
+
+        downloader = FlakyDownloader(stand_in.url, max_workers=1, rate_limiter=Archivary.RateLimiter(None))
+        try:
+            downloader.reload_all_tapes(iddir, date_range=date_range)
+            assert False, "the reload should be interrupted"
+        except Interrupted:
+            pass
+        assert period_files(iddir) == old_files  # the old tapes are still there
+        checkpoint = Archivary.DownloadCheckpoint.load(Archivary.staging_path(iddir), date_range)
+        assert checkpoint is not None and not checkpoint.complete()
+        assert Archivary.DownloadCheckpoint.load(Archivary.staging_path(iddir), [1970, 1979]) is None
+
+        n_requests = stand_in.n_requests
+        downloader = Archivary.IATapeDownloader(stand_in.url, max_workers=1, rate_limiter=Archivary.RateLimiter(None))
+        downloader.reload_all_tapes(iddir, date_range=date_range)
+        n_resumed = stand_in.n_requests - n_requests
+        downloader.reload_all_tapes(iddir, date_range=date_range)
+        assert n_resumed < stand_in.n_requests - n_requests - n_resumed  # the resumed reload did not start over
+
+    assert not os.path.exists(os.path.dirname(Archivary.staging_path(iddir))) and not os.path.exists(iddir + ".old")
+    new_files = period_files(iddir)
+    assert sorted(i for ids in new_files.values() for i in ids) == sorted(row["identifier"] for row in rows)
+    tape_index = Archivary.TapeIndex.load(iddir)
+    assert len(tape_index) == len(rows) and not tape_index.refresh().dirty
+
+    os.rename(iddir, iddir + ".old")  # as if interrupted in the middle of the swap
+    Archivary.recover_reload(iddir)
+    assert period_files(iddir) == new_files and not os.path.exists(iddir + ".old")
+
+
+def test_cursor_scrape(tmp_path):
+    rows = synthetic_rows(200, 5)
+    ids = sorted(row["identifier"] for row in rows)
+    date_range = [1960, 1999]
+
+    def all_ids(iddir):
+        assert not [name for name in os.listdir(iddir) if name.endswith(".part")]
+        return sorted(i for file_ids in period_files(iddir).values() for i in file_ids)
+
+    with ScrapeStandIn(rows, page_size=15) as stand_in:
+        downloader = Archivary.IATapeDownloader(stand_in.url, max_workers=2, rate_limiter=Archivary.RateLimiter(None))
+        iddir = str(tmp_path / "etree_ids")
+        assert downloader.get_all_tapes(iddir, date_range=date_range) == len(rows)
+        assert stand_in.n_items == len(rows)  # no tape was downloaded twice
+        assert all_ids(iddir) == ids and len(Archivary.TapeIndex.load(iddir)) == len(rows)
+
+        for expire in [False, True]:
+            # a checkpointed download, interrupted after the first page of the 1970s
+            iddir = str(tmp_path / f"{expire}" / "GratefulDead_ids")
+            os.makedirs(iddir)
+            windows, max_date = downloader.date_windows(iddir, date_range)
+            checkpoint = Archivary.DownloadCheckpoint(iddir, date_range, windows, max_date)
+            lo, hi = windows[1]
+            writer, cursor = downloader.window_writer(iddir)
+            tapes, cursor = next(downloader.pages(lo, hi, collection="GratefulDead"))
+            writer.write(tapes)
+            checkpoint.progress(lo, hi, tapes[-1]["date"][:10], cursor, writer.state())
+            writer.write(tapes)  # a page written after the checkpoint was saved
+            if expire:
+                stand_in.expire_cursors()
+
+            n_items = stand_in.n_items
+            downloader.get_all_tapes(iddir, date_range=date_range, checkpoint=checkpoint)
+            assert checkpoint.complete() and all_ids(iddir) == ids
+            assert stand_in.n_items - n_items == len(rows) - (0 if expire else len(tapes))
+
+
+def test_journal(tmp_path):
+    rows = synthetic_rows(60, 6)
+    iddir = str(tmp_path / "GratefulDead_ids")
+    downloader = Archivary.IATapeDownloader("http://localhost", rate_limiter=Archivary.RateLimiter(None))
+    journal = Archivary.Journal(iddir)
+
+    assert downloader.store_metadata(iddir, rows[:40]) == 40
+    assert period_files(iddir) == {} and len(journal.rows()) == 40
+    downloader.save_indexes()
+    tape_index = Archivary.TapeIndex.load(iddir)
+    assert len(tape_index) == 40 and not tape_index.refresh().dirty
+    assert len(tape_index.select([1970])) == len([row for row in rows[:40] if row["date"][:3] == "197"])
+    assert journal.compact() == ["ids_1960.json", "ids_1970.json", "ids_1980.json", "ids_1990.json"]
+    assert not os.path.exists(journal.path)
+
+    files = period_files(iddir)
+    mtimes = {name: os.stat(os.path.join(iddir, name)).st_mtime_ns for name in files}
+    changed = dict(rows[45], downloads=123456789)
+    assert downloader.store_metadata(iddir, rows[30:60]) == 20  # only the new tapes are journaled
+    assert len(journal.rows()) == 20
+    size = journal.size()
+    assert downloader.store_metadata(iddir, rows[30:60]) == 0 and journal.size() == size
+    with open(journal.path, "a") as f:
+        f.write('[1970, {"identifier": "torn')  # as if interrupted
+    assert downloader.store_metadata(iddir, [changed]) == 0 and len(journal.rows()) == 20
+    edited = dict(rows[5], avg_rating=1.5)  # a tape in the period files
+    assert downloader.store_metadata(iddir, [edited]) == 0 and len(journal.rows()) == 21
+    assert period_files(iddir) == files and {name: os.stat(os.path.join(iddir, name)).st_mtime_ns for name in files} == mtimes
+    downloader.save_indexes()
+    tape_index = Archivary.TapeIndex.load(iddir)
+    assert len(tape_index.select()) == 60 and not tape_index.refresh().dirty
+    assert [tape_index.downloads[i] for i in tape_index.select() if tape_index.identifier(i) == changed["identifier"]] == [123456789]
+    assert [tape_index.avg_rating[i] for i in tape_index.select() if tape_index.identifier(i) == edited["identifier"]] == [1.5]
+    stored = Archivary.BaseTapeDownloader.stored_rows(iddir)  # read once, and kept up to date
+    assert stored is Archivary.BaseTapeDownloader.stored_rows(iddir) and len(stored) == 60
+
+    Archivary.Journal.MAX_SIZE, max_size = 0, Archivary.Journal.MAX_SIZE
+    try:
+        downloader.store_metadata(iddir, [dict(changed, downloads=1)])  # compacts the journal
+    finally:
+        Archivary.Journal.MAX_SIZE = max_size
+    assert not os.path.exists(journal.path)
+    assert sorted(i for ids in period_files(iddir).values() for i in ids) == sorted(row["identifier"] for row in rows)
+    downloader.save_indexes()
+    tape_index = Archivary.TapeIndex.load(iddir)
+    assert len(tape_index) == 60 and not tape_index.refresh().dirty
+    assert [tape_index.downloads[i] for i in range(len(tape_index)) if tape_index.identifier(i) == changed["identifier"]] == [1]
+
+
+def test_incremental_update(gd_archive, gd_archivary):
+    rows = synthetic_rows(220, 7)
+    for row in rows:
+        row["addeddate"] = "2020-01-01T00:00:00Z"
+    new_rows = rows[200:]
+    for row in new_rows:
+        row["addeddate"] = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    new_rows[0]["date"] = "1999-05-05T00:00:00Z"  # a new date
+    new_rows[1]["date"] = rows[0]["date"]  # a date with tapes
+
+    def tape_dates(aa):
+        return {date: [t.identifier for t in tapes] for date, tapes in aa.tape_dates.items()}
+
+    with ScrapeStandIn(rows[:200]) as stand_in:
+        aa = gd_archivary(stand_in.url)
+        archive = aa.archives[0]
+        tapes = list(archive.tapes)
+        stand_in.add(new_rows)
+        aa.load_archive(reload_ids=False, with_latest=True)
+
+        assert archive.tapes[:200] == tapes  # the tapes were not reloaded
+        assert len(archive.tapes) == 220 and "1999-05-05" in aa.dates and aa.dates == sorted(aa.tape_dates.keys())
+        loaded = gd_archive(url=stand_in.url)
+        assert tape_dates(aa) == tape_dates(loaded) and aa.dates == loaded.dates
+        n_requests = stand_in.n_requests
+        aa.load_archive(reload_ids=False, with_latest=True)  # nothing new
+        assert len(archive.tapes) == 220 and stand_in.n_requests > n_requests
+
+
+def test_updater_swap(optd, gd_archivary, player_state):
+    from threading import Lock
+
+    optd["AUTO_UPDATE_ARCHIVE"] = True
+    rows = synthetic_rows(120, 8)
+    for i, row in enumerate(rows):
+        row["addeddate"] = "2020-01-01T00:00:00Z" if i < 100 else datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    with ScrapeStandIn(rows[:100]) as stand_in:
+        aa = gd_archivary(stand_in.url)
+        tape_dates = {date: list(tapes) for date, tapes in aa.tape_dates.items()}
+        downloader = aa.archives[0].downloader
+        get_all_tapes = downloader.get_all_tapes
+        lock = Lock()
+        updater = Archivary.Archivary_Updater(player_state(aa), 3600, Event(), lock=lock)
+        stand_in.add(rows[100:])
+
+        def failing_get_all_tapes(*args, **kwargs):
+            raise Exception("Download", "failed")
+
+        downloader.get_all_tapes = failing_get_all_tapes
+        try:
+            updater.update()
+            assert False, "the update should fail"
+        except Exception as e:
+            assert e.args == ("Download", "failed")
+        assert updater.state.archive is aa and aa.tape_dates == tape_dates and len(aa.archives[0].tapes) == 100
+
+        def unlocked_get_all_tapes(*args, **kwargs):
+            assert lock.acquire(blocking=False), "the lock is held while downloading"
+            lock.release()
+            return get_all_tapes(*args, **kwargs)
+
+        downloader.get_all_tapes = unlocked_get_all_tapes
+        updater.update()
+        updated = updater.state.archive
+        assert updater.state.date_reader.archive is updated
+        assert updated is not aa and updater.pending is None and not lock.locked()
+        assert aa.tape_dates == tape_dates and len(aa.archives[0].tapes) == 100 and len(aa.dates) == len(tape_dates)
+        assert len(updated.archives[0].tapes) == 120
+        assert sorted(t.identifier for tapes in updated.tape_dates.values() for t in tapes) == sorted(row["identifier"] for row in rows)
+        assert updated.dates == sorted(updated.tape_dates.keys())
+
+
+def test_metadata_prefetch(tmp_path, optd, write_ids, player_state):
+    rows = synthetic_rows(400, 9)
+    for decade in [1960, 1970, 1980, 1990]:
+        write_ids([row for row in rows if row["date"][:3] == str(decade)[:3]], name=f"ids_{decade}.json")
+    aa = Archivary.Archivary(dbpath=str(tmp_path), collection_list=["GratefulDead"])
+
+    with ScrapeStandIn(rows) as stand_in:
+        fetched = []
+
+        class Prefetcher(Archivary.MetadataPrefetcher):
+            def fetch(self, tapes, staged=None):
+                fetched.append([t.identifier for t in tapes])
+                for t in tapes:
+                    t.url_metadata = f"{stand_in.url}/metadata/{t.identifier}"
+                return super().fetch(tapes, staged)
+
+        date = aa.dates[50]
+        reader = player_state(aa, date).date_reader
+        prefetcher = Prefetcher(reader, Event(), k=3, n_neighbours=2)
+        plan = [date] + [aa.dates[i] for i in [51, 49, 52, 48]]
+        assert prefetcher.plan(aa, date) == plan
+        assert prefetcher.plan(aa, "1800-01-01") == aa.dates[:2]
+        assert prefetcher.prefetch(aa, date)
+        assert fetched == [[t.identifier for t in aa.tape_dates[d][:3]] for d in plan]
+        assert prefetcher.missing_tapes(aa, date) == []
+        n_requests = stand_in.n_requests
+        tapes = aa.resort_tape_date(date)  # reads the cached metadata of the top tapes
+        assert stand_in.n_requests == n_requests and all(t.meta_loaded for t in tapes[:3])
+
+        fetched.clear()
+
+        def knob_moves(tapes, staged=None):
+            fetched.append([t.identifier for t in tapes])
+            reader.date = aa.dates[10]
+
+        prefetcher.fetch = knob_moves
+        reader.date = aa.dates[100]
+        assert not prefetcher.prefetch(aa, aa.dates[100])
+        assert fetched == [[t.identifier for t in aa.tape_dates[aa.dates[100]][:3]]]  # the rest of the plan is dropped
+
+        stand_in.latency = 1.0  # the knobs move while the downloads are in flight
+        fetched.clear()
+        prefetcher = Prefetcher(reader, Event(), k=3, n_neighbours=0, interval=0.01)
+        reader.date = aa.dates[150]
+        timer = Timer(0.1, setattr, (reader, "date", aa.dates[10]))
+        timer.start()
+        start = time.time()
+        prefetched = prefetcher.prefetch(aa, aa.dates[150])
+        assert len(fetched) == 1
+        if Archivary.async_backend() is not None:  # without aiohttp, the download in flight is left to finish
+            assert not prefetched and time.time() - start < 0.5 and prefetcher.in_flight.cancelled()
+            assert not any(Archivary.metadata_cached(t.meta_path) for t in aa.tape_dates[aa.dates[150]][:3])
+        timer.join()
+        stand_in.latency = 0.0
+
+        stopped = Event()
+        prefetcher = Prefetcher(reader, stopped, k=2, n_neighbours=1, interval=0.01)
+        prefetcher.start()
+        for _ in range(500):
+            if prefetcher.done == (aa, aa.dates[10]):
+                break
+            time.sleep(0.01)
+        stopped.set()
+        prefetcher.join()
+        assert prefetcher.done == (aa, aa.dates[10])
+        assert all(Archivary.metadata_cached(t.meta_path) for d in aa.dates[9:12] for t in aa.tape_dates[d][:2])
+
+
+def test_resort_deadline(gd_archive):
+    from concurrent.futures import ThreadPoolExecutor
+
+    rows = synthetic_rows(20, 10)
+    for i, row in enumerate(rows):
+        row["date"] = "1977-05-08T00:00:00Z" if i % 2 == 0 else "1977-05-09T00:00:00Z"
+    gd = gd_archive(rows)
+    gd.resort_deadline = 0.2
+    date, other_date = "1977-05-08", "1977-05-09"
+    with ScrapeStandIn(rows, latency=1.0) as stand_in:
+        for t in gd.tapes:
+            t.url_metadata = f"{stand_in.url}/metadata/{t.identifier}"
+        start = time.perf_counter()
+        tapes = gd.resort_tape_date(date)
+        assert time.perf_counter() - start < 0.9  # the metadata is late
+        assert sorted(t.identifier for t in tapes) == sorted(row["identifier"] for row in rows[::2])
+        refined = gd.provisional[date]
+        assert not refined.done()
+        gd.resort_tape_date(date)  # selected again while the tapes are loading
+        assert gd.provisional[date] is not refined
+        refined = gd.provisional[date]
+        order = [t.identifier for t in refined.result(timeout=10)]
+        assert stand_in.n_requests == 3  # the late downloads were not repeated
+        assert all(t.meta_loaded for t in gd.tape_dates[date][:3])
+        assert [t.identifier for t in gd.tape_dates[date]] == order  # the refined order is applied
+        assert order == [t.identifier for t in gd.resort_tape_date(date)]
+        assert date not in gd.provisional and len(gd.loading) == 0
+
+        other_tapes = gd.tape_dates[other_date]
+        gd.resort_tape_date(other_date)
+        refined = gd.provisional[other_date]
+        gd.resort_tape_date(date)  # another date is selected before the metadata arrives
+        assert other_date not in gd.provisional
+        refined.result(timeout=10)
+        assert gd.tape_dates[other_date] is other_tapes  # the stale order was dropped
+        assert stand_in.n_requests == 6
+
+        t = gd.tape_dates[other_date][3].tape()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            loads = [executor.submit(t.tracks) for _ in range(3)]
+            assert len({len(f.result(timeout=10)) for f in loads}) == 1
+        assert stand_in.n_requests == 7  # the tape's metadata was loaded once
+
+
+def test_metadata_cache_migration(tmp_path, optd):
+    row = synthetic_rows(1, 11)[0]
+    set_data = Archivary.GDSetBreaks(["GratefulDead"])
+    legacy = Archivary.GDTape(str(tmp_path), row, set_data, ["GratefulDead"])
+    page_meta = archive_metadata(legacy.identifier, 12)
+    legacy.load_metadata(page_meta, write=False)
+
+    legacy_path = legacy.meta_path[: -len(Archivary.METADATA_SUFFIX)] + Archivary.LEGACY_METADATA_SUFFIX
+    os.makedirs(os.path.dirname(legacy_path))
+    with open(legacy_path, "w") as f:
+        json.dump(page_meta, f, indent=2)
+    n_files, legacy_bytes, n_bytes = Archivary.migrate_metadata_cache(str(tmp_path))
+    assert n_files == 1 and n_bytes < legacy_bytes / 10
+    assert not os.path.exists(legacy_path) and os.path.exists(legacy.meta_path)
+    assert Archivary.migrate_metadata_cache(str(tmp_path)) == (0, 0, 0)
+
+    tape = Archivary.GDTape(str(tmp_path), row, set_data, ["GratefulDead"])
+    tape.get_metadata(only_if_cached=True)
+    assert tape.meta_loaded
+    assert [(t.title, t.files) for t in tape.tracks()] == [(t.title, t.files) for t in legacy.tracks()]
+    assert tape.venue() == legacy.venue()
+
+
+def test_metadata_eviction(tmp_path, write_ids, gd_archive, player_state):
+    rows = synthetic_rows(10, 12)
+    iddir = write_ids(rows)
+    for row in rows:
+        path = Archivary.metadata_path(str(tmp_path), row["date"], row["identifier"])
+        Archivary.write_cached_metadata(path, Archivary.slim_ia_metadata(archive_metadata(row["identifier"], 10)))
+    gd = gd_archive()
+    cache = Archivary.MetadataCache.for_dbpath(str(tmp_path))
+    assert len(cache.entries) == 10
+
+    tapes = [t.tape() for d in gd.tape_dates.values() for t in d]
+    order = [t.identifier for t in tapes]  # the first is the oldest access
+    for tape in tapes:
+        tape.get_metadata()
+        assert gd.score_cache.get(tape.identifier) is not None
+        time.sleep(0.01)
+    total = cache.total_bytes()
+    assert cache.evict(total) == (0, 0)
+    pinned = {order[0]}
+    n_files, n_bytes = cache.evict(total // 2, pinned)
+    assert n_files > 0 and cache.total_bytes() <= 0.9 * (total // 2)
+    evicted = [i for i in order if i not in cache.entries]
+    assert evicted == order[1 : 1 + n_files]  # least-recently-used first, except the pinned tape
+    for tape in tapes:
+        if tape.identifier in evicted:
+            assert not os.path.exists(tape.meta_path) and gd.score_cache.get(tape.identifier) is None
+    assert all(os.path.exists(tape.meta_path) for tape in tapes if tape.identifier in cache.entries)
+    assert (iddir / "ids_1970.json").exists()
+
+    Archivary.MetadataCache.caches.clear()  # the index was saved
+    assert Archivary.MetadataCache.for_dbpath(str(tmp_path)).entries == cache.entries
+
+    date = datetime.datetime.strptime(rows[-1]["date"][:10], "%Y-%m-%d")
+    state = player_state(gd, current={"DATE": date, "STAGED_DATE": None, "TAPE_ID": order[0]})
+    evictor = Archivary.MetadataEvictor(state, 600, Event(), quota_mb=0)
+    assert evictor.pinned() >= {order[0]} | {t.identifier for t in gd.tape_dates[rows[-1]["date"][:10]]}
+    evictor.evict()
+    cache = Archivary.MetadataCache.for_dbpath(str(tmp_path))
+    assert set(cache.entries) == evictor.pinned() & set(order)
+
+
+def test_metadata_write_back(tmp_path, optd, metadata_writer):
+    rows = synthetic_rows(2, 13)
+    set_data = Archivary.GDSetBreaks(["GratefulDead"])
+    cached, downloaded = [Archivary.GDTape(str(tmp_path), row, set_data, ["GratefulDead"]) for row in rows]
+    Archivary.write_cached_metadata(cached.meta_path, Archivary.slim_ia_metadata(archive_metadata(cached.identifier, 8)))
+    os.utime(cached.meta_path, ns=(0, 0))
+    cached.get_metadata()
+    assert cached.meta_loaded and len(cached.tracks()) > 0
+    assert os.stat(cached.meta_path).st_mtime_ns == 0 and not metadata_writer.is_pending(cached.meta_path)
+
+    with ScrapeStandIn(rows) as stand_in:
+        downloaded.url_metadata = f"{stand_in.url}/metadata/{downloaded.identifier}"
+        downloaded.get_metadata()
+    assert downloaded.meta_loaded and metadata_writer.is_pending(downloaded.meta_path)
+    assert not os.path.exists(downloaded.meta_path)
+    again = Archivary.GDTape(str(tmp_path), rows[1], set_data, ["GratefulDead"])
+    again.get_metadata(only_if_cached=True)  # from the queue
+    assert [t.title for t in again.tracks()] == [t.title for t in downloaded.tracks()]
+    assert metadata_writer.flush() == 1 and metadata_writer.flush() == 0
+    assert os.path.exists(downloaded.meta_path) and not metadata_writer.is_pending(downloaded.meta_path)
+    score_cache = Archivary.TapeScoreCache.for_dbpath(str(tmp_path))
+    assert score_cache.get(downloaded.identifier) == [os.stat(downloaded.meta_path).st_mtime_ns]
+    assert downloaded.identifier in Archivary.MetadataCache.for_dbpath(str(tmp_path)).entries
+
+
+def test_prefetched_scores(gd_archive, metadata_writer):
+    rows = synthetic_rows(20, 14)
+    for row in rows:
+        row["date"] = "1977-05-08T00:00:00Z"
+    gd = gd_archive(rows)
+    date = "1977-05-08"
+    with ScrapeStandIn(rows) as stand_in:
+        tapes = [t.detached_tape() for t in gd.tape_dates[date][:5]]  # as the MetadataPrefetcher does
+        for t in tapes:
+            t.url_metadata = f"{stand_in.url}/metadata/{t.identifier}"
+        assert Archivary.fetch_metadata(tapes) == 0
+    assert all(metadata_writer.is_pending(t.meta_path) for t in tapes)
+
+    def scores():
+        rows = [Archivary.GDTapeRow(gd, t.table, t.row) for t in gd.tape_dates[date]]  # not built into GDTapes
+        return list(Archivary.batch_scores(rows)), [t.tape().compute_score() for t in rows]
+
+    batch, computed = scores()
+    assert batch == computed and any(gd.score_cache.get(t.identifier) == [0] for t in tapes)
+    metadata_writer.flush()
+    batch, computed = scores()
+    assert batch == computed
+    assert all(gd.score_cache.lookup(t.identifier, t.meta_path) is not None for t in tapes)
@@ -15,31 +15,60 @@
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import abc
+import asyncio
+import atexit
+import bisect
 import codecs
+import copy
 import csv
 import datetime
 import difflib
+import gzip
+import heapq
 import json
 import logging
 import math
 import os
+import pickle
+import psutil
 import random
 import re
 import requests
+import shutil
 import string
+import struct
+import sys
 import tempfile
 import time
-from threading import Event, Lock, Thread
-
-from operator import methodcaller
+import types
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from threading import Event, Lock, RLock, Thread
+
+from operator import itemgetter, methodcaller
 from tenacity import retry
 from tenacity.stop import stop_after_delay
 from typing import Callable, Optional
+from urllib.parse import urlsplit
 
 import pkg_resources
 from timemachine import config
 from timemachine import utils
 
+try:
+    import numpy as np
+except ImportError:  # tapes are then scored one at a time
+    np = None
+
+try:
+    import aiofiles
+    import aiohttp
+except ImportError:  # downloads then use requests, one at a time
+    aiohttp = None
+
 logging.basicConfig(
     format="%(asctime)s.%(msecs)03d %(levelname)s: %(name)s %(message)s",
     level=logging.INFO,
@@ -82,50 +111,1024 @@ def to_decade(datestring):
     return 10 * divmod(to_date(datestring[:10]).year, 10)[0]
 
 
+def date_windows(min_date, max_date, years):
+    """Split the dates from min_date to max_date into windows of years years, aligned on multiples of years.
+    Returns a list of (min_date, max_date) strings."""
+    windows = []
+    year = int(min_date[:4])
+    while year <= int(max_date[:4]):
+        end_year = year - year % years + years - 1
+        windows.append((max(min_date, f"{year}-01-01"), min(max_date, f"{end_year}-12-31")))
+        year = end_year + 1
+    return windows
+
+
+TAPE_INDEX_NAME = "tape_index.bin"
+TAPE_INDEX_MAGIC = b"TMTI"
+TAPE_INDEX_VERSION = 1
+JOURNAL_NAME = "journal.jsonl"
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def period_of(filename):
+    """Return the period (year or decade) of an ids_{period}.json file or a journal/{period} source of a TapeIndex,
+    or None if it isn't one"""
+    match = re.match(rf"^(?:ids_(\d+)\.json|{re.escape(JOURNAL_NAME)}/(\d+))$", filename)
+    return int(match.group(1) or match.group(2)) if match else None
+
+
+def date_to_int(datestring):
+    if isinstance(datestring, list):  # handle one bad case on 2009.01.10
+        datestring = datestring[0]
+    return int(datestring[:4] + datestring[5:7] + datestring[8:10])
+
+
+def int_to_date(dateint):
+    year, monthday = divmod(dateint, 10000)
+    return f"{year:04d}-{monthday // 100:02d}-{monthday % 100:02d}"
+
+
+def addeddate_to_int(addeddate):
+    if addeddate.startswith("0000"):
+        addeddate = "1990-01-01T00:00:00Z"
+    return int((datetime.datetime.fromisoformat(addeddate[:19]) - EPOCH).total_seconds())
+
+
+def int_to_addeddate(seconds):
+    return (EPOCH + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class TapeIndex:
+    """A compact, versioned binary index of the tapes in an {collection}_ids folder.
+
+    The ids_{period}.json files remain the source of truth. The index keeps the fields needed to build
+    tapes in array-backed columns, with the rows of each source file stored contiguously, so that
+    loading an archive doesn't need to parse the json. Files which have changed since they were
+    indexed (by mtime and size) are re-parsed when the index is refreshed.
+    The rows of the Journal are indexed as a source for each of their periods, named journal.jsonl/{period}.
+    A journal row supersedes the row of the same tape in a period file, which select leaves out.
+    """
+
+    # column name, array typecode
+    COLUMNS = [
+        ("date", "i"),  # yyyymmdd
+        ("avg_rating", "d"),  # nan if missing
+        ("downloads", "q"),  # -1 if missing
+        ("num_reviews", "i"),  # -1 if missing
+        ("addeddate", "q"),  # seconds since epoch, -1 if missing
+        ("id_offsets", "I"),  # n_rows + 1 offsets into id_blob
+        ("id_blob", "B"),  # utf-8 identifiers
+        ("coll_offsets", "I"),  # n_rows + 1 offsets into coll_ids
+        ("coll_ids", "I"),  # indices into self.collections
+        ("fmt_offsets", "I"),  # n_rows + 1 offsets into fmt_ids
+        ("fmt_ids", "H"),  # indices into self.formats
+    ]
+
+    def __init__(self, iddir):
+        self.iddir = iddir
+        self.path = os.path.join(iddir, TAPE_INDEX_NAME)
+        self.sources = []  # list of {"name", "mtime_ns", "size", "n_rows"}, in row order
+        self.collections = []
+        self.formats = []
+        self._collection_ids = {}
+        self._format_ids = {}
+        self._derived = {}  # columns computed from the stored ones, see stream_only_column
+        self.dirty = False
+        self._clear_columns()
+
+    def __repr__(self):
+        return f"TapeIndex of {self.iddir}: {len(self)} tapes from {len(self.sources)} files"
+
+    def __len__(self):
+        return len(self.id_offsets) - 1
+
+    def _clear_columns(self):
+        self._derived = {}
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode))
+        for name in ["id_offsets", "coll_offsets", "fmt_offsets"]:
+            getattr(self, name).append(0)
+
+    def _intern(self, value, table, ids):
+        if value not in ids:
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    def _append_row(self, row):
+        self._derived = {}
+        self.date.append(date_to_int(row["date"]))
+        self.avg_rating.append(float(row.get("avg_rating", math.nan)))
+        self.downloads.append(int(row.get("downloads", -1)))
+        self.num_reviews.append(int(row.get("num_reviews", -1)))
+        self.addeddate.append(addeddate_to_int(row["addeddate"]) if "addeddate" in row else -1)
+        self.id_blob.frombytes(row["identifier"].encode("utf-8"))
+        self.id_offsets.append(len(self.id_blob))
+        collections = row.get("collection", [])
+        collections = [collections] if isinstance(collections, str) else collections
+        for c in collections:
+            self.coll_ids.append(self._intern(c, self.collections, self._collection_ids))
+        self.coll_offsets.append(len(self.coll_ids))
+        formats = row.get("format", [])
+        formats = [formats] if isinstance(formats, str) else formats
+        for f in formats:
+            self.fmt_ids.append(self._intern(f, self.formats, self._format_ids))
+        self.fmt_offsets.append(len(self.fmt_ids))
+
+    def _source_ranges(self):
+        start = 0
+        for source in self.sources:
+            yield source, start, start + source["n_rows"]
+            start = start + source["n_rows"]
+
+    def _replace_sources(self, new_sources, removed=()):
+        """Rebuild the columns, keeping the rows of unchanged sources and parsing the rows of new ones.
+
+        new_sources: dict of source name -> (stat_result, rows) for files which must be (re-)indexed.
+        removed: names of sources whose rows should be dropped.
+        """
+        old = {name: getattr(self, name) for name, _ in self.COLUMNS}
+        dropped = set(new_sources) | set(removed)
+        kept = [(s, start, end) for s, start, end in self._source_ranges() if s["name"] not in dropped]
+        self._clear_columns()
+        sources = []
+        for source, start, end in kept:
+            id_start, id_end = old["id_offsets"][start], old["id_offsets"][end]
+            coll_start, coll_end = old["coll_offsets"][start], old["coll_offsets"][end]
+            fmt_start, fmt_end = old["fmt_offsets"][start], old["fmt_offsets"][end]
+            for name in ["date", "avg_rating", "downloads", "num_reviews", "addeddate"]:
+                getattr(self, name).extend(old[name][start:end])
+            id_base, coll_base, fmt_base = len(self.id_blob), len(self.coll_ids), len(self.fmt_ids)
+            self.id_offsets.extend(x - id_start + id_base for x in old["id_offsets"][start + 1 : end + 1])
+            self.coll_offsets.extend(x - coll_start + coll_base for x in old["coll_offsets"][start + 1 : end + 1])
+            self.fmt_offsets.extend(x - fmt_start + fmt_base for x in old["fmt_offsets"][start + 1 : end + 1])
+            self.id_blob.extend(old["id_blob"][id_start:id_end])
+            self.coll_ids.extend(old["coll_ids"][coll_start:coll_end])
+            self.fmt_ids.extend(old["fmt_ids"][fmt_start:fmt_end])
+            sources.append(source)
+        for name, (stat, rows) in sorted(new_sources.items()):
+            for row in rows:
+                self._append_row(row)
+            sources.append({"name": name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "n_rows": len(rows)})
+        self.sources = sources
+        self.dirty = True
+
+    @classmethod
+    def load(cls, iddir):
+        """Load the index of iddir from disk. Returns an empty index if there is none, or it is unreadable."""
+        index = cls(iddir)
+        if not os.path.exists(index.path):
+            return index
+        try:
+            with open(index.path, "rb") as f:
+                magic, version, header_len = struct.unpack("<4sHI", f.read(10))
+                if magic != TAPE_INDEX_MAGIC or version != TAPE_INDEX_VERSION:
+                    logger.info(f"Ignoring tape index {index.path} with version {version}")
+                    return cls(iddir)
+                header = json.loads(f.read(header_len).decode("utf-8"))
+                if header["byteorder"] != sys.byteorder:
+                    return cls(iddir)
+                for name, typecode, itemsize, count in header["columns"]:
+                    column = array(typecode)
+                    if column.itemsize != itemsize:
+                        return cls(iddir)
+                    column.fromfile(f, count)
+                    setattr(index, name, column)
+            index.sources = header["sources"]
+            index.collections = header["collections"]
+            index.formats = header["formats"]
+            index._collection_ids = {c: i for i, c in enumerate(index.collections)}
+            index._format_ids = {f: i for i, f in enumerate(index.formats)}
+        except Exception as e:
+            logger.warning(f"Failed to read tape index {index.path}: {e}")
+            return cls(iddir)
+        return index
+
+    @staticmethod
+    def load_sources(iddir):
+        """The sources of the index of iddir, without reading the columns. [] if there is no readable index."""
+        try:
+            with open(os.path.join(iddir, TAPE_INDEX_NAME), "rb") as f:
+                magic, version, header_len = struct.unpack("<4sHI", f.read(10))
+                if magic != TAPE_INDEX_MAGIC or version != TAPE_INDEX_VERSION:
+                    return []
+                return json.loads(f.read(header_len).decode("utf-8"))["sources"]
+        except Exception:
+            return []
+
+    def save(self):
+        header = {
+            "byteorder": sys.byteorder,
+            "sources": self.sources,
+            "collections": self.collections,
+            "formats": self.formats,
+            "columns": [[name, typecode, array(typecode).itemsize, len(getattr(self, name))] for name, typecode in self.COLUMNS],
+        }
+        header = json.dumps(header).encode("utf-8")
+        tmpfile = None
+        try:
+            fd, tmpfile = tempfile.mkstemp(".bin", dir=self.iddir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(struct.pack("<4sHI", TAPE_INDEX_MAGIC, TAPE_INDEX_VERSION, len(header)))
+                f.write(header)
+                for name, _ in self.COLUMNS:
+                    getattr(self, name).tofile(f)
+            os.rename(tmpfile, self.path)
+            self.dirty = False
+        except Exception as e:
+            logger.warning(f"Failed to write tape index {self.path}: {e}")
+            if tmpfile and os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
+    @staticmethod
+    def unchanged(source, stat):
+        """True if the file of source is unchanged since it was indexed"""
+        return source is not None and source["mtime_ns"] == stat.st_mtime_ns and source["size"] == stat.st_size
+
+    @staticmethod
+    def scan_files(iddir):
+        """The stats of the ids_{period}.json files of iddir, and of its journal (None if there is none)"""
+        on_disk = {}
+        journal = None
+        for entry in os.scandir(iddir):
+            if period_of(entry.name) is not None:
+                on_disk[entry.name] = entry.stat()
+            elif entry.name == JOURNAL_NAME:
+                journal = entry.stat()
+        return on_disk, journal
+
+    @classmethod
+    def is_current(cls, iddir):
+        """True if the index of iddir is up to date with its files, so that refresh would parse no json. Only the
+        header of the index is read."""
+        if not os.path.isdir(iddir):
+            return True
+        on_disk, journal = cls.scan_files(iddir)
+        indexed = {s["name"]: s for s in cls.load_sources(iddir)}
+        journal_sources = [indexed[name] for name in indexed if name.startswith(f"{JOURNAL_NAME}/")]
+        if journal is not None and not (journal_sources and all(cls.unchanged(source, journal) for source in journal_sources)):
+            return False
+        return all(cls.unchanged(indexed.get(name), stat) for name, stat in on_disk.items())
+
+    def refresh(self):
+        """Re-index any ids_{period}.json files, and the journal, which have changed since they were indexed, and
+        save."""
+        if not os.path.isdir(self.iddir):
+            return self
+        on_disk, journal = self.scan_files(self.iddir)
+        stale = {}
+        indexed = {s["name"]: s for s in self.sources}
+        for name, stat in on_disk.items():
+            if not self.unchanged(indexed.get(name), stat):
+                logger.debug(f"re-indexing {name} in {self.iddir}")
+                stale[name] = (stat, json.load(open(os.path.join(self.iddir, name), "r")))
+        journal_sources = [name for name in indexed if name.startswith(f"{JOURNAL_NAME}/")]
+        if journal is not None and (
+            len(journal_sources) == 0 or not all(self.unchanged(indexed[name], journal) for name in journal_sources)
+        ):
+            logger.debug(f"re-indexing {JOURNAL_NAME} in {self.iddir}")
+            journal_sources = []
+            for period, rows in Journal(self.iddir).period_rows().items():
+                stale[f"{JOURNAL_NAME}/{period}"] = (journal, rows)
+                journal_sources.append(f"{JOURNAL_NAME}/{period}")
+        elif journal is None:
+            journal_sources = []
+        removed = [name for name in indexed if name not in on_disk and name not in journal_sources]
+        if stale or removed:
+            self._replace_sources(stale, removed)
+        if self.dirty:
+            self.save()
+        return self
+
+    def update_sources(self, sources):
+        """Replace the rows of source files, a dict of name: rows written to the file"""
+        self._replace_sources({name: (os.stat(os.path.join(self.iddir, name)), rows) for name, rows in sources.items()})
+
+    def select(self, periods=None, collection_list=None):
+        """Return the row numbers from sources in periods, with any collection in collection_list"""
+        wanted = None
+        if collection_list is not None:
+            wanted = set(self._collection_ids[c] for c in collection_list if c in self._collection_ids)
+        rows = array("I")
+        coll_offsets, coll_ids = self.coll_offsets, self.coll_ids
+        superseded = self.superseded_rows()
+        for source, start, end in self._source_ranges():
+            if periods is not None and period_of(source["name"]) not in periods:
+                continue
+            if wanted is None and len(superseded) == 0:
+                rows.extend(range(start, end))
+                continue
+            for i in range(start, end):
+                if i in superseded:
+                    continue
+                if wanted is None or not wanted.isdisjoint(coll_ids[coll_offsets[i] : coll_offsets[i + 1]]):
+                    rows.append(i)
+        return rows
+
+    def superseded_rows(self):
+        """The set of rows of period files whose tapes have a newer row in the journal"""
+        if "superseded" not in self._derived:
+            journaled = set()
+            period_ranges = []
+            for source, start, end in self._source_ranges():
+                if source["name"].startswith(f"{JOURNAL_NAME}/"):
+                    journaled.update(self.identifier(i) for i in range(start, end))
+                else:
+                    period_ranges.append((start, end))
+            superseded = set()
+            if len(journaled) > 0:
+                for start, end in period_ranges:
+                    superseded.update(i for i in range(start, end) if self.identifier(i) in journaled)
+            self._derived["superseded"] = superseded
+        return self._derived["superseded"]
+
+    def max_addeddate(self, periods=None):
+        """The latest addeddate of tapes in sources within periods, as a string"""
+        latest = [
+            max(self.addeddate[start:end])
+            for source, start, end in self._source_ranges()
+            if end > start and (periods is None or period_of(source["name"]) in periods)
+        ]
+        return int_to_addeddate(max(latest)) if len(latest) > 0 else None
+
+    def identifier(self, i):
+        return self.id_blob[self.id_offsets[i] : self.id_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def collection(self, i):
+        return [self.collections[c] for c in self.coll_ids[self.coll_offsets[i] : self.coll_offsets[i + 1]]]
+
+    def format(self, i):
+        return [self.formats[f] for f in self.fmt_ids[self.fmt_offsets[i] : self.fmt_offsets[i + 1]]]
+
+    @classmethod
+    def from_rows(cls, iddir, rows):
+        """Build an in-memory index (with no source files) from a list of raw json rows"""
+        tape_index = cls(iddir)
+        for row in rows:
+            tape_index._append_row(row)
+        return tape_index
+
+    def take(self, rows):
+        """Return a new in-memory index holding only the given row numbers, in that order"""
+        subset = TapeIndex(self.iddir)
+        subset.collections, subset._collection_ids = self.collections, self._collection_ids
+        subset.formats, subset._format_ids = self.formats, self._format_ids
+        for name in ["date", "avg_rating", "downloads", "num_reviews", "addeddate"]:
+            column = getattr(self, name)
+            setattr(subset, name, array(column.typecode, [column[i] for i in rows]))
+        for offsets_name, values_name in [("id_offsets", "id_blob"), ("coll_offsets", "coll_ids"), ("fmt_offsets", "fmt_ids")]:
+            offsets, values = getattr(self, offsets_name), getattr(self, values_name)
+            new_offsets, new_values = getattr(subset, offsets_name), getattr(subset, values_name)
+            for i in rows:
+                new_values.extend(values[offsets[i] : offsets[i + 1]])
+                new_offsets.append(len(new_values))
+        return subset
+
+    def column(self, name):
+        """A numpy view of a stored column"""
+        values = getattr(self, name)
+        return np.frombuffer(values, dtype=values.typecode) if len(values) > 0 else np.zeros(0, dtype=values.typecode)
+
+    def stream_only_column(self):
+        """A numpy boolean column, True for tapes in the stream_only collection"""
+        if "stream_only" not in self._derived:
+            stream_only = np.zeros(len(self), dtype=bool)
+            stream_id = self._collection_ids.get("stream_only")
+            if stream_id is not None:
+                offsets = self.column("coll_offsets").astype(np.int64)
+                n_stream = np.concatenate([[0], np.cumsum(self.column("coll_ids") == stream_id)])
+                stream_only = (n_stream[offsets[1:]] - n_stream[offsets[:-1]]) > 0
+            self._derived["stream_only"] = stream_only
+        return self._derived["stream_only"]
+
+    def taper_points_column(self, matcher):
+        """A numpy column of the FAVORED_TAPER points of each tape, for a TaperMatcher"""
+        if self._derived.get("taper_points", (None,))[0] != matcher.tapers:
+            taper_points = np.zeros(len(self))
+            if matcher.regex is not None:
+                text = self.id_blob.tobytes().decode("utf-8")
+                if text.isascii():
+                    # Search all of the identifiers at once. A match which runs into the next identifier only
+                    # costs an extra check.
+                    starts = np.array([m.start() for m in matcher.regex.finditer(text.lower())], dtype=np.int64)
+                    offsets = self.column("id_offsets").astype(np.int64)
+                    candidates = np.unique(np.searchsorted(offsets, starts, side="right") - 1).tolist()
+                else:
+                    candidates = range(len(self))
+                for i in candidates:
+                    taper_points[i] = matcher.points(self.identifier(i))
+            self._derived["taper_points"] = (matcher.tapers, taper_points)
+        return self._derived["taper_points"][1]
+
+    def row_dict(self, i):
+        """Return row i in the form of the raw json of an ids_{period}.json file"""
+        d = {
+            "identifier": self.identifier(i),
+            "date": int_to_date(self.date[i]),
+            "collection": self.collection(i),
+            "format": self.format(i),
+        }
+        if not math.isnan(self.avg_rating[i]):
+            d["avg_rating"] = self.avg_rating[i]
+        if self.downloads[i] >= 0:
+            d["downloads"] = self.downloads[i]
+        if self.num_reviews[i] >= 0:
+            d["num_reviews"] = self.num_reviews[i]
+        if self.addeddate[i] >= 0:
+            d["addeddate"] = int_to_addeddate(self.addeddate[i])
+        return d
+
+
+def refresh_tape_index(iddir):
+    """Refresh the index of iddir, and save it. A module function, so that it can run in a process pool."""
+    TapeIndex.load(iddir).refresh()
+
+
+def read_tape_index(iddir, periods, collection_list):
+    """The tapes of collection_list in periods from the index of iddir, refreshed, as a TapeIndex, and the
+    latest addeddate of all of the tapes in periods."""
+    tape_index = TapeIndex.load(iddir).refresh()
+    max_addeddate = tape_index.max_addeddate(periods)  # before filtering the collections
+    tapes = tape_index.take(tape_index.select(periods, collection_list))
+    return (tapes, max_addeddate if len(tapes) > 0 else None)
+
+
+METADATA_SUFFIX = ".json.gz"
+LEGACY_METADATA_SUFFIX = ".json"
+PLAYABLE_FORMATS = ["Flac", "Shorten", "Ogg Vorbis", "VBR MP3", "MP3"]  # with PLAY_LOSSLESS, see BaseTape
+IA_FILE_FIELDS = ["name", "title", "track", "format", "source", "original", "size"]
+PHISHIN_TRACK_FIELDS = ["set", "venue_name", "venue_location", "title", "position", "duration", "mp3", "updated_at"]
+
+
+def metadata_path(dbpath, date, identifier):
+    """The path of the cached metadata of a tape, dbpath/year/month/identifier.json.gz"""
+    date = to_date(date).date()
+    return os.path.join(dbpath, str(date.year), str(date.month), identifier + METADATA_SUFFIX)
+
+
+def slim_ia_metadata(page_meta):
+    """The parts of an archive.org/metadata response which a GDTape uses: the playable files, the originals they
+    were made from, the created time and the venue."""
+    slim = {k: page_meta[k] for k in ["created"] if k in page_meta}
+    if "metadata" in page_meta:
+        slim["metadata"] = {k: v for k, v in page_meta["metadata"].items() if k in ["venue", "coverage"]}
+    if "files" in page_meta:  # without files, the tape is removed from the archive
+        playable = [f for f in page_meta["files"] if f.get("format") in PLAYABLE_FORMATS]
+        originals = {f["original"] for f in playable if "original" in f}
+        slim["files"] = [
+            {k: v for k, v in f.items() if k in IA_FILE_FIELDS}
+            for f in page_meta["files"]
+            if f.get("format") in PLAYABLE_FORMATS or (f.get("source") == "original" and f.get("name") in originals)
+        ]
+    return slim
+
+
+def slim_phishin_metadata(page_meta):
+    """The parts of a phish.in show which a PhishinTape uses"""
+    data = page_meta["data"]
+    return {
+        "total_pages": page_meta["total_pages"],
+        "data": {
+            "date": data.get("date"),
+            "tracks": [{k: v for k, v in track.items() if k in PHISHIN_TRACK_FIELDS} for track in data["tracks"]],
+        },
+    }
+
+
+def encode_metadata(page_meta):
+    return gzip.compress(json.dumps(page_meta, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_metadata(data):
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+def encode_local_metadata(page_meta):
+    """The metadata.json of a tape in a local archive, which is meant to be read and edited by the user"""
+    return json.dumps(page_meta, indent=2).encode("utf-8")
+
+
+def write_atomic(path, data):
+    """Write the bytes data to path through a tmpfile in the same folder, so that path is never partly written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmpfile = tempfile.mkstemp(".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.rename(tmpfile, path)
+    except Exception:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+
+
+def write_cached_metadata(path, page_meta):
+    """Write slimmed metadata to path, compressed, through a tmpfile"""
+    write_atomic(path, encode_metadata(page_meta))
+
+
+class MetadataWriter:
+    """Writes tape metadata in the background, so that loading a tape never waits for the disk.
+
+    write queues the metadata of a path, replacing any older metadata queued for it, and a daemon thread writes
+    the queue in batches, a delay after the first write of a batch, each file atomically. Until a file is
+    written, its metadata is served by get, which read_cached_metadata consults before the disk. The queue is
+    flushed at exit. Metadata queued with a dbpath is noted in its TapeScoreCache, so that the tape is scored
+    from the queue and then from the file, and it is touched in its MetadataCache when it is written.
+    """
+
+    def __init__(self, delay: float = 1.0) -> None:
+        self.delay = delay
+        self.pending = OrderedDict()  # path -> (page_meta, encode, dbpath)
+        self.lock = Lock()
+        self.write_lock = Lock()  # held while a batch is written
+        self.wake = Event()
+        self.thread = None
+        self.n_written = 0
+
+    def __repr__(self):
+        return f"MetadataWriter with {len(self.pending)} pending, {self.n_written} written"
+
+    def write(self, path, page_meta, encode=encode_metadata, dbpath=None):
+        if dbpath is not None:
+            TapeScoreCache.for_dbpath(dbpath).queued(os.path.basename(path)[: -len(METADATA_SUFFIX)])
+        with self.lock:
+            self.pending[path] = (page_meta, encode, dbpath)
+            self.pending.move_to_end(path)
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+        self.wake.set()
+
+    def get(self, path):
+        """The metadata queued for path, or None"""
+        item = self.pending.get(path)
+        return item[0] if item is not None else None
+
+    def is_pending(self, path):
+        return path in self.pending
+
+    def flush(self):
+        """Write everything which is queued. Returns the number of files written."""
+        n_written = 0
+        dbpaths = set()
+        with self.write_lock:
+            with self.lock:
+                batch = list(self.pending.items())
+            for path, item in batch:
+                page_meta, encode, dbpath = item
+                try:
+                    write_atomic(path, encode(page_meta))
+                    n_written = n_written + 1
+                    if dbpath is not None:
+                        identifier = os.path.basename(path)[: -len(METADATA_SUFFIX)]
+                        TapeScoreCache.for_dbpath(dbpath).written(identifier, os.stat(path).st_mtime_ns)
+                        MetadataCache.for_dbpath(dbpath).touch(path, written=True)
+                        dbpaths.add(dbpath)
+                except Exception as e:
+                    logger.warning(f"Failed to write metadata {path}: {e}")
+                with self.lock:
+                    if self.pending.get(path) is item:  # not queued again while we wrote it
+                        del self.pending[path]
+            for dbpath in dbpaths:
+                TapeScoreCache.for_dbpath(dbpath).save()
+            self.n_written = self.n_written + n_written
+        if n_written > 0:
+            logger.debug(f"Wrote {n_written} metadata files")
+        return n_written
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.delay)  # gather a batch
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception(e)
+
+
+metadata_writer = MetadataWriter()
+
+
+def metadata_cached(path):
+    """True if the metadata at path is on disk, or queued to be written"""
+    return metadata_writer.is_pending(path) or os.path.exists(path)
+
+
+def read_cached_metadata(path, slim):
+    """The metadata cached at path, or queued to be written there. If it is still in the legacy format, the raw
+    response as indented json next to path, it is slimmed with slim and moved to path."""
+    page_meta = metadata_writer.get(path)
+    if page_meta is not None:
+        return page_meta
+    try:
+        with open(path, "rb") as f:
+            return decode_metadata(f.read())
+    except FileNotFoundError:
+        legacy_path = path[: -len(METADATA_SUFFIX)] + LEGACY_METADATA_SUFFIX
+        if not os.path.exists(legacy_path):
+            raise
+        page_meta = slim(json.load(open(legacy_path, "r")))
+        write_cached_metadata(path, page_meta)
+        os.remove(legacy_path)
+        return page_meta
+
+
+def metadata_files(dbpath, suffix=METADATA_SUFFIX):
+    """The os.DirEntry of each file named *suffix in the metadata cached under dbpath/year/month"""
+    if not os.path.isdir(dbpath):
+        return
+    for year_dir in os.scandir(dbpath):
+        if not (year_dir.is_dir() and year_dir.name.isdigit()):
+            continue
+        for month_dir in os.scandir(year_dir.path):
+            if not (month_dir.is_dir() and month_dir.name.isdigit()):
+                continue
+            for entry in os.scandir(month_dir.path):
+                if entry.name.endswith(suffix):
+                    yield entry
+
+
+def migrate_metadata_cache(dbpath):
+    """Convert the metadata cached under dbpath/year/month in the legacy format to the slim, compressed format.
+    Unreadable files are removed, to be downloaded again. Returns the number of files, and their bytes before and
+    after."""
+    n_files, legacy_bytes, n_bytes = 0, 0, 0
+    for entry in metadata_files(dbpath, LEGACY_METADATA_SUFFIX):
+        identifier = entry.name[: -len(LEGACY_METADATA_SUFFIX)]
+        path = os.path.join(os.path.dirname(entry.path), identifier + METADATA_SUFFIX)
+        slim = slim_phishin_metadata if identifier.startswith("phishin_") else slim_ia_metadata
+        legacy_bytes = legacy_bytes + entry.stat().st_size
+        try:
+            if not os.path.exists(path):
+                read_cached_metadata(path, slim)
+            else:
+                os.remove(entry.path)
+            n_bytes = n_bytes + os.path.getsize(path)
+        except Exception as e:
+            logger.warning(f"Removing unreadable metadata {entry.path}: {e}")
+            os.remove(entry.path)
+        n_files = n_files + 1
+    if n_files > 0:
+        logger.info(f"Migrated {n_files} metadata files in {dbpath} from {legacy_bytes} to {n_bytes} bytes")
+    return (n_files, legacy_bytes, n_bytes)
+
+
+SCORE_CACHE_NAME = "score_cache.json"
+SCORE_CACHE_VERSION = 2
+
+
+class TapeScoreCache:
+    """A persistent cache of the parts of GDTape scores which come from the tape's cached metadata.
+
+    Entries are keyed by identifier, and exist only for tapes with metadata in dbpath:
+        [mtime_ns, removed, title_points, track_points]  -- scored
+        [mtime_ns]  -- metadata present, but not (or no longer) scored
+
+    An entry is invalidated by the mtime of the metadata file, which is checked whenever a GDTape is
+    scored, and all entries are invalidated when PLAY_LOSSLESS changes. FAVORED_TAPER points are not
+    part of the entries, so changing the tapers never invalidates them. Invalidated entries are
+    re-scored lazily. The first time the cache is used, dbpath is scanned for metadata files, and any in the
+    legacy format are migrated.
+    """
+
+    caches = {}
+
+    @classmethod
+    def for_dbpath(cls, dbpath):
+        if dbpath not in cls.caches:
+            cls.caches[dbpath] = cls(dbpath)
+        return cls.caches[dbpath]
+
+    def __init__(self, dbpath):
+        self.dbpath = dbpath
+        self.path = os.path.join(dbpath, SCORE_CACHE_NAME)
+        self.entries = {}
+        self.play_lossless = None
+        self.dirty = False
+        self.lock = Lock()
+        self.load()
+
+    def __repr__(self):
+        return f"TapeScoreCache of {self.dbpath} with {len(self.entries)} entries"
+
+    def load(self):
+        try:
+            data = json.load(open(self.path, "r"))
+            if data["version"] != SCORE_CACHE_VERSION:
+                raise ValueError(f"score cache version {data['version']}")
+            self.entries = data["entries"]
+            self.play_lossless = data["play_lossless"]
+        except Exception as e:
+            if os.path.exists(self.path):
+                logger.warning(f"Failed to read score cache {self.path}: {e}")
+            self.scan()
+        self.check_options()
+
+    def scan(self):
+        """Find all metadata files under dbpath/year/month, first migrating any in the legacy format"""
+        logger.info(f"Scanning {self.dbpath} for cached metadata")
+        migrate_metadata_cache(self.dbpath)
+        self.entries = {
+            entry.name[: -len(METADATA_SUFFIX)]: [entry.stat().st_mtime_ns] for entry in metadata_files(self.dbpath)
+        }
+        self.dirty = True
+
+    def check_options(self):
+        play_lossless = bool(config.optd.get("PLAY_LOSSLESS", False))
+        if play_lossless != self.play_lossless:
+            with self.lock:
+                self.entries = {k: v[:1] for k, v in self.entries.items()}
+            self.play_lossless = play_lossless
+            self.dirty = True
+
+    def get(self, identifier):
+        return self.entries.get(identifier)
+
+    def put(self, identifier, mtime_ns, points):
+        self.entries[identifier] = [mtime_ns] + list(points)
+        self.dirty = True
+
+    def discard(self, identifier):
+        if self.entries.pop(identifier, None) is not None:
+            self.dirty = True
+
+    def queued(self, identifier):
+        """Note that the metadata of a tape is queued to be written. Until it is, the tape is scored from the queue."""
+        self.entries[identifier] = [0]
+        self.dirty = True
+
+    def written(self, identifier, mtime_ns):
+        """Note that the metadata of a tape was written. Its entry is kept only if it is for this very file."""
+        entry = self.entries.get(identifier)
+        if entry is None or entry[0] != mtime_ns:
+            self.entries[identifier] = [mtime_ns]
+            self.dirty = True
+
+    def lookup(self, identifier, meta_path):
+        """Return the scored entry of a tape if it is still valid for the metadata file. Touches the disk."""
+        entry = self.entries.get(identifier)
+        if entry is None or len(entry) == 1:
+            return None
+        try:
+            mtime_ns = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            self.discard(identifier)
+            return None
+        return entry if entry[0] == mtime_ns else None
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            data = {"version": SCORE_CACHE_VERSION, "play_lossless": self.play_lossless, "entries": dict(self.entries)}
+            self.dirty = False
+        try:
+            write_atomic(self.path, json.dumps(data).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Failed to write score cache {self.path}: {e}")
+
+
+METADATA_INDEX_NAME = "metadata_index.json"
+METADATA_INDEX_VERSION = 1
+METADATA_CACHE_MB = 500  # the default quota, see the METADATA_CACHE_MB option
+
+
+class MetadataCache:
+    """The access-time index of the tape metadata cached under dbpath/year/month, for evicting it to a quota.
+
+    Entries are keyed by identifier: [path relative to dbpath, size in bytes, access time]. Tapes touch their
+    entry whenever their metadata is read or written, since file atimes are not kept on noatime mounts. The
+    index is built from the metadata files the first time it is used, with their mtimes as the access times.
+
+    evict removes the least-recently-used files which are not pinned, until the cache is back under the quota.
+    Only the metadata files are removed -- never the _ids folders -- and evicted tapes are discarded from the
+    TapeScoreCache, so that they are scored again when their metadata is downloaded again.
+    """
+
+    caches = {}
+
+    @classmethod
+    def for_dbpath(cls, dbpath):
+        if dbpath not in cls.caches:
+            cls.caches[dbpath] = cls(dbpath)
+        return cls.caches[dbpath]
+
+    def __init__(self, dbpath):
+        self.dbpath = dbpath
+        self.path = os.path.join(dbpath, METADATA_INDEX_NAME)
+        self.entries = {}
+        self.dirty = False
+        self.lock = Lock()
+        self.load()
+
+    def __repr__(self):
+        return f"MetadataCache of {self.dbpath} with {len(self.entries)} files, {self.total_bytes()} bytes"
+
+    def load(self):
+        try:
+            data = json.load(open(self.path, "r"))
+            if data["version"] != METADATA_INDEX_VERSION:
+                raise ValueError(f"metadata index version {data['version']}")
+            self.entries = data["entries"]
+        except Exception as e:
+            if os.path.exists(self.path):
+                logger.warning(f"Failed to read metadata index {self.path}: {e}")
+            self.scan()
+
+    def scan(self):
+        """Index all metadata files under dbpath/year/month"""
+        entries = {}
+        for entry in metadata_files(self.dbpath):
+            stat = entry.stat()
+            relpath = os.path.relpath(entry.path, self.dbpath)
+            entries[entry.name[: -len(METADATA_SUFFIX)]] = [relpath, stat.st_size, stat.st_mtime]
+        with self.lock:
+            self.entries = entries
+            self.dirty = True
+
+    def touch(self, meta_path, written=False):
+        """Record an access to the metadata at meta_path. The size is read when the file is new or written."""
+        identifier = os.path.basename(meta_path)[: -len(METADATA_SUFFIX)]
+        entry = self.entries.get(identifier)
+        if entry is None or written:
+            try:
+                size = os.path.getsize(meta_path)
+            except FileNotFoundError:
+                return
+            entry = [os.path.relpath(meta_path, self.dbpath), size, time.time()]
+        else:
+            entry = [entry[0], entry[1], time.time()]
+        with self.lock:
+            self.entries[identifier] = entry
+            self.dirty = True
+
+    def total_bytes(self):
+        return sum(entry[1] for entry in list(self.entries.values()))
+
+    def evict(self, quota, pinned=(), low_water=0.9):
+        """If the cache is over quota bytes, remove the least-recently-used metadata files whose identifiers are
+        not pinned, until it is under low_water of the quota. Returns the number of files and bytes evicted."""
+        with self.lock:
+            order = sorted(self.entries.items(), key=lambda item: item[1][2])
+        total = sum(entry[1] for _, entry in order)
+        n_files, n_bytes = 0, 0
+        if total > quota:
+            score_cache = TapeScoreCache.for_dbpath(self.dbpath)
+            months = set()
+            for identifier, entry in order:
+                if total <= quota * low_water:
+                    break
+                if identifier in pinned:
+                    continue
+                path = os.path.join(self.dbpath, entry[0])
+                with self.lock:
+                    if self.entries.get(identifier) != entry:  # touched since we sorted
+                        continue
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"Failed to evict metadata {path}: {e}")
+                        continue
+                    del self.entries[identifier]
+                    self.dirty = True
+                score_cache.discard(identifier)
+                months.add(os.path.dirname(path))
+                total = total - entry[1]
+                n_files = n_files + 1
+                n_bytes = n_bytes + entry[1]
+            for month_dir in months:
+                try:
+                    os.rmdir(month_dir)  # only if it is empty
+                except OSError:
+                    pass
+            score_cache.save()
+            logger.info(f"Evicted {n_files} metadata files, {n_bytes} bytes, from {self.dbpath}. {total} bytes remain")
+        self.save()
+        return (n_files, n_bytes)
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            data = {"version": METADATA_INDEX_VERSION, "entries": dict(self.entries)}
+            self.dirty = False
+        try:
+            write_atomic(self.path, json.dumps(data).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Failed to write metadata index {self.path}: {e}")
+
+
 class BaseTapeDownloader(abc.ABC):
     """Abstract base class for a tape downloader.
 
     Use one of the subclasses: IATapeDownloader or PhishinTapeDownloader.
     """
 
+    deltas = None  # iddir: {identifier: row} of the stores being tracked, see track_delta
+    delta_lock = Lock()
+    stored = {}  # iddir: {identifier: fingerprint} of the rows stored in iddir, see stored_rows
+
     def store_metadata(self, iddir, tapes, period_func=to_decade):
-        # Store the tapes json data into files by period
+        """Store the tapes json data by period, appending the tapes which are new or have changed to the Journal of
+        iddir. The journal is compacted into the period files when it grows beyond Journal.MAX_SIZE.
+        Returns the number of tapes added."""
         n_tapes_added = 0
         os.makedirs(iddir, exist_ok=True)
+        journal = Journal(iddir)
+        with journal.lock:
+            stored = self.stored_rows(iddir)
+            new_rows = []
+            for period, tapes_from_period in self.by_period(tapes, period_func):
+                for tape in tapes_from_period:
+                    identifier = tape["identifier"]
+                    fingerprint = row_fingerprint(tape)
+                    if identifier not in stored:
+                        n_tapes_added = n_tapes_added + 1
+                    elif stored[identifier] == fingerprint:
+                        continue
+                    stored[identifier] = fingerprint
+                    new_rows.append((period, tape))
+            if len(new_rows) > 0:
+                journal.append(new_rows)
+                self.record_delta(iddir, [row for _, row in new_rows])
+                logger.info(f"added {n_tapes_added} tapes, journaled {len(new_rows)} rows to {journal.path}")
+                self.update_index(iddir, JOURNAL_NAME, None)
+                if journal.size() > Journal.MAX_SIZE:
+                    for name in journal.compact():
+                        self.update_index(iddir, name, None)
+        return n_tapes_added
+
+    async def async_store_metadata(self, iddir, tapes, period_func=to_decade):
+        """store_metadata in a worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.store_metadata, iddir, tapes, period_func)
+
+    @classmethod
+    def stored_rows(cls, iddir):
+        """A dict of identifier: fingerprint of the rows stored in the period files and journal of iddir. The files
+        are read the first time, and store_metadata keeps the dict up to date as it journals rows."""
+        with Journal.lock:
+            if iddir not in cls.stored:
+                fingerprints = {}
+                names = sorted(os.listdir(iddir)) if os.path.isdir(iddir) else []
+                for name in names:
+                    if name.startswith("ids_") and name.endswith(".json"):
+                        for row in json.load(open(os.path.join(iddir, name), "r")):
+                            fingerprints[row["identifier"]] = row_fingerprint(row)
+                for _, row in Journal(iddir).rows():
+                    fingerprints[row["identifier"]] = row_fingerprint(row)
+                cls.stored[iddir] = fingerprints
+            return cls.stored[iddir]
+
+    @classmethod
+    def forget_stored(cls, iddir):
+        """Called when the files of iddir are replaced other than by store_metadata"""
+        with Journal.lock:
+            cls.stored.pop(iddir, None)
+
+    def track_delta(self, iddir):
+        """Collect the rows which are stored in iddir from now on, until take_delta"""
+        with self.delta_lock:
+            if self.deltas is None:
+                self.deltas = {}
+            self.deltas[iddir] = {}
+
+    def record_delta(self, iddir, rows):
+        """Called with the rows of new or changed tapes as they are stored"""
+        with self.delta_lock:
+            if self.deltas is not None and iddir in self.deltas:
+                self.deltas[iddir].update((row["identifier"], row) for row in rows)
+
+    def take_delta(self, iddir):
+        """The rows stored in iddir since track_delta, the latest of each identifier"""
+        with self.delta_lock:
+            delta = self.deltas.pop(iddir, {}) if self.deltas is not None else {}
+        return list(delta.values())
+
+    @staticmethod
+    def by_period(tapes, period_func):
         periods = sorted(list(set([period_func(t["date"]) for t in tapes])))
         logger.debug(f"storing metadata {periods}")
+        return [(period, [t for t in tapes if period_func(t["date"]) == period]) for period in periods]
 
-        for period in periods:
-            orig_tapes = []
-            outpath = os.path.join(iddir, f"ids_{period}.json")
-            if os.path.exists(outpath):
-                orig_tapes = json.load(open(outpath, "r"))
-            tapes_from_period = [t for t in tapes if period_func(t["date"]) == period]
-            new_ids = [x["identifier"] for x in tapes_from_period]
-            period_tapes = [x for x in orig_tapes if not x["identifier"] in new_ids] + tapes_from_period
-            n_period_tapes_added = len(period_tapes) - len(orig_tapes)
-            n_tapes_added = n_tapes_added + n_period_tapes_added
-            if (
-                n_period_tapes_added > 0
-            ):  # NOTE This condition prevents updates for _everything_ unless there are new tapes.
-                logger.info(f"Writing {len(period_tapes)} tapes to {outpath}")
-                try:
-                    tmpfile = tempfile.mkstemp(".json")[1]
-                    json.dump(period_tapes, open(tmpfile, "w"), indent=2)
-                    os.rename(tmpfile, outpath)
-                    logger.debug(f"renamed {tmpfile} to {outpath}")
-                except Exception:
-                    logger.debug(f"removing {tmpfile}")
-                    os.remove(tmpfile)
-        if n_tapes_added > 0:
-            logger.info(f"added {n_tapes_added} tapes by period")
-        return n_tapes_added
+    def update_index(self, iddir, filename, period_tapes):
+        """Called after a period file, or the journal, has been written. Downloaders which keep a TapeIndex update it
+        here. period_tapes is None when the rows were not kept, as by the Journal and PeriodWriter."""
+        pass
 
     @abc.abstractmethod
     def get_all_tapes(self, iddir, min_addeddate=None, date_range=None):
         """Get a list of all tapes."""
         pass
 
+    async def async_get_all_tapes(self, iddir, min_addeddate=None, date_range=None):
+        """get_all_tapes on the event loop. Downloaders without an asyncio backend run get_all_tapes in a thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_all_tapes, iddir, min_addeddate, date_range)
+
     @abc.abstractmethod
     def get_all_collection_names(self):
         """Get a list of all tapes."""
@@ -133,6 +1136,103 @@ class BaseTapeDownloader(abc.ABC):
 
 
 
+def row_fingerprint(row):
+    """A hash of the contents of a tape's row, to tell if it has changed"""
+    return hash(json.dumps(row, sort_keys=True))
+
+
+def merge_period_tapes(orig_tapes, tapes_from_period):
+    """The tapes of a period file, with tapes_from_period replacing any of the same identifier"""
+    new_ids = set(x["identifier"] for x in tapes_from_period)
+    return [x for x in orig_tapes if not x["identifier"] in new_ids] + tapes_from_period
+
+
+def write_rows(path, rows):
+    """Write the rows of a period file, one per line, through a tmpfile"""
+    tmpfile = None
+    try:
+        fd, tmpfile = tempfile.mkstemp(".json", dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            f.write("[\n" + ",\n".join(json.dumps(row) for row in rows) + "\n]\n")
+        os.rename(tmpfile, path)
+        logger.debug(f"renamed {tmpfile} to {path}")
+    except Exception:
+        logger.debug(f"removing {tmpfile}")
+        if tmpfile and os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+
+
+class Journal:
+    """An append-only journal of the tapes stored in an {collection}_ids folder since its period files were written.
+
+    Each line is the json [period, row] of a tape which was new, or had changed. A row supersedes any earlier
+    row with the same identifier. The rows are indexed along with the period files, and compact() merges them
+    into the period files, so that an update only writes its new rows.
+    """
+
+    MAX_SIZE = 1 << 20  # bytes, beyond which store_metadata compacts the journal
+    lock = RLock()  # for the writers of all journals
+
+    def __init__(self, iddir):
+        self.iddir = iddir
+        self.path = os.path.join(iddir, JOURNAL_NAME)
+
+    def __repr__(self):
+        return f"Journal {self.path}"
+
+    def rows(self):
+        """The latest (period, row) of each identifier in the journal"""
+        if not os.path.exists(self.path):
+            return []
+        latest = {}
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    period, row = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping a torn line of {self.path}")
+                    continue
+                latest[row["identifier"]] = (period, row)
+        return list(latest.values())
+
+    def period_rows(self):
+        """A dict of period: rows of the journal"""
+        period_rows = {}
+        for period, row in self.rows():
+            period_rows.setdefault(period, []).append(row)
+        return period_rows
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, period_rows):
+        """Append a list of (period, row), and sync it to disk"""
+        text = "".join(json.dumps([period, row]) + "\n" for period, row in period_rows)
+        with self.lock, open(self.path, "ab+") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":  # the last write was torn
+                    text = "\n" + text
+            f.write(text.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Merge the journal into the period files, and remove it. Returns the names of the files written."""
+        names = []
+        with self.lock:
+            for period, rows in sorted(self.period_rows().items()):
+                path = os.path.join(self.iddir, f"ids_{period}.json")
+                orig_tapes = json.load(open(path, "r")) if os.path.exists(path) else []
+                write_rows(path, merge_period_tapes(orig_tapes, rows))
+                names.append(os.path.basename(path))
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        logger.info(f"compacted {self.path} into {len(names)} files")
+        return names
+
+
 def remove_none(lis):
     return [a for a in lis if a is not None]
 
@@ -152,39 +1252,14 @@ class Archivary:
         #     self.reload_ids = True
         #     collection_list.remove('rElOaD')
         self.collection_list = collection_list
-        self.archives = []
-        phishin_archive = None
-        ia_archive = None
-        local_archive = None
+        self.dbpath = dbpath
+        self.date_range = date_range
+        self.local_home = local_home
         ia_collections = [x for x in self.collection_list if ((x != "Phish") and (not x.startswith("Local_")))]
         local_collections = [x for x in self.collection_list if x.startswith("Local_")]
-
-        local_mode = utils.get_local_mode()
-
-        if ("Phish" in self.collection_list) & (local_mode < 3):
-            try:
-                phishin_archive = PhishinArchive(dbpath=dbpath, reload_ids=reload_ids, with_latest=with_latest)
-            except Exception:
-                pass
-        if len(local_collections) > 0:
-            if utils.is_writable(local_home):
-                local_archive = LocalArchive(collection_list=local_collections, url=f"file://{local_home}")
-            else:
-                logger.error(f"Unable to initialize the local archive. {local_home} not writable")
-        if (len(ia_collections) > 0) & (local_mode < 3):
-            ia_archive = GDArchive(
-                dbpath=dbpath,
-                reload_ids=reload_ids,
-                with_latest=with_latest,
-                collection_list=ia_collections,
-                date_range=date_range,
-            )
-
-        if (local_archive is not None) and len(local_archive.dates) == 0: # eg, if the USB stick is not plugged in!
-            local_archive = None
-
-        if (ia_archive is not None) and len(ia_archive.dates) == 0: # eg, if the only collection doesn't exist
-            ia_archive = None
+        phishin_archive = self.new_archive(["Phish"], reload_ids, with_latest) if "Phish" in self.collection_list else None
+        local_archive = self.new_archive(local_collections, reload_ids, with_latest)
+        ia_archive = self.new_archive(ia_collections, reload_ids, with_latest)
         self.archives = remove_none([ia_archive, phishin_archive,local_archive])
         if len(self.archives) == 0:
             logger.warning(f"All archives for collections {collection_list} are empty -- check the system!")
@@ -194,6 +1269,67 @@ class Archivary:
             self.tape_dates = self.get_tape_dates()
             self.dates = sorted(self.tape_dates.keys())
 
+    def new_archive(self, collection_list, reload_ids=False, with_latest=False):
+        """An archive of collection_list, which are all of the same kind: Phish, Local_ or archive.org collections.
+        Returns None if the archive can't be loaded, or has no tapes."""
+        if len(collection_list) == 0:
+            return None
+        local_mode = utils.get_local_mode()
+        archive = None
+        if collection_list == ["Phish"]:
+            if local_mode < 3:
+                try:
+                    archive = PhishinArchive(dbpath=self.dbpath, reload_ids=reload_ids, with_latest=with_latest)
+                except Exception:
+                    pass
+        elif collection_list[0].startswith("Local_"):
+            if utils.is_writable(self.local_home):
+                archive = LocalArchive(collection_list=collection_list, url=f"file://{self.local_home}")
+                if len(archive.dates) == 0:  # eg, if the USB stick is not plugged in!
+                    archive = None
+            else:
+                logger.error(f"Unable to initialize the local archive. {self.local_home} not writable")
+        elif local_mode < 3:
+            archive = GDArchive(
+                dbpath=self.dbpath,
+                reload_ids=reload_ids,
+                with_latest=with_latest,
+                collection_list=collection_list,
+                date_range=self.date_range,
+            )
+            if len(archive.dates) == 0:  # eg, if the only collection doesn't exist
+                archive = None
+        return archive
+
+    @classmethod
+    def from_archives(cls, archives, collection_list, dbpath=os.path.join(ROOT_DIR, "metadata")):
+        """An Archivary of archives which are already loaded, eg from a YearShardCache"""
+        archivary = cls.__new__(cls)
+        archivary.collection_list = collection_list
+        archivary.dbpath = dbpath
+        archivary.date_range = sorted({year for a in archives for year in (a.date_range or [])}) or None
+        archivary.local_home = os.path.join(os.getenv("HOME"), "archive")
+        archivary.archives = archives
+        if len(archives) == 0:
+            archivary.tape_dates = {}
+        elif len(archives) == 1:
+            archivary.tape_dates = archives[0].tape_dates
+        else:
+            archivary.tape_dates = archivary.get_tape_dates()
+        archivary.dates = sorted(archivary.tape_dates.keys())
+        return archivary
+
+    def clone(self):
+        """A copy which can be loaded or updated without changing this Archivary. The tapes are shared."""
+        archivary = copy.copy(self)
+        archivary.archives = [a.clone() for a in self.archives]
+        if len(archivary.archives) == 1:
+            archivary.tape_dates = archivary.archives[0].tape_dates
+        else:
+            archivary.tape_dates = dict(self.tape_dates)
+        archivary.dates = list(self.dates)
+        return archivary
+
     def year_list(self):
         t = [a.year_list() for a in self.archives]
         yl = sorted(set([item for sublist in t for item in sublist]))
@@ -207,7 +1343,7 @@ class Archivary:
         #    bt = remove_none([a.best_tape(date, resort) for a in self.archives])
         # else:
         bt = self.tape_dates[date]
-        return bt[0]
+        return materialize(bt[0])
 
     def tape_at_time(self, then_time, default_start):
         tat = remove_none([a.tape_at_time(then_time, default_start) for a in self.archives])
@@ -244,6 +1380,8 @@ class Archivary:
     def get_tape_dates(self, sort_across=True):  # Archivary
         _ = [a.get_tape_dates() for a in self.archives]
         td = self.archives[0].tape_dates
+        if len(self.archives) > 1:
+            td = {date: list(tapes) for date, tapes in td.items()}  # the archive's own dates are updated in place
         for a in self.archives[1:]:
             logger.info(f"getting tapes from {a}")
             for date, tapes in a.tape_dates.items():
@@ -251,7 +1389,7 @@ class Archivary:
                     for t in tapes:
                         td[date].append(t)
                 else:
-                    td[date] = tapes
+                    td[date] = list(tapes)
         if (not sort_across) or (len(self.archives) == 1):
             return td
         td = {date: self.sort_across_collection(tapes) for date, tapes in td.items()}
@@ -265,9 +1403,45 @@ class Archivary:
         bt = flatten(bt)
         bt = list(dict.fromkeys(bt))
         bt = self.sort_across_collection(bt)
+        if len(self.archives) > 1:
+            for a in self.archives:
+                refined = getattr(a, "provisional", {}).get(date)
+                if refined is not None:  # the archive's order is applied to its tape_dates in the background
+                    refined.add_done_callback(lambda f, date=date: self.merge_tape_date(date))
         return bt
 
+    def merge_tape_date(self, date):
+        """Merge the tapes of date from the archives again, after their order has changed"""
+        self.tape_dates[date] = self.sort_across_collection(flatten([a.tape_dates.get(date, []) for a in self.archives]))
+
+    def drop_provisional(self, keep=None):
+        for a in self.archives:
+            if isinstance(a, GDArchive):
+                a.drop_provisional(keep)
+
+    def rerank_favored_tapers(self):
+        """Re-rank the dates whose best tapes may have changed with the FAVORED_TAPER option"""
+        dates = sorted(set(flatten([a.rerank_favored_tapers() for a in self.archives if isinstance(a, GDArchive)])))
+        for date in dates:
+            tapes = self.tape_dates[date]
+            tapes = [tapes[i] for i in rank_tapes(tapes)]
+            self.tape_dates[date] = tapes if len(self.archives) == 1 else self.sort_across_collection(tapes)
+        return dates
+
+    def rescore(self):
+        """Score and rank all of the tapes again, after the PLAY_LOSSLESS option changed"""
+        for a in self.archives:
+            if isinstance(a, GDArchive):
+                a.rescore()
+        self.tape_dates = self.get_tape_dates()
+        self.dates = sorted(self.tape_dates.keys())
+
     def load_archive(self, reload_ids, with_latest):
+        if with_latest and not reload_ids and all(isinstance(a, GDArchive) and len(a.tapes) > 0 for a in self.archives):
+            dates = sorted(set(flatten([a.update_archive() for a in self.archives])))
+            self.update_dates(dates)
+            logger.info(f"Archivary updated {len(dates)} dates")
+            return
         logger.info("Loading Archivary")
         for a in self.archives:
             logger.info(f"Archivary loading {a.archive_type}")
@@ -277,6 +1451,75 @@ class Archivary:
         self.tape_dates = self.get_tape_dates()
         self.dates = sorted(self.tape_dates.keys())
 
+    def update_dates(self, dates):
+        """Regroup the tapes of dates, after the archives changed them in place. Dates left without tapes are dropped."""
+        for date in dates:
+            tapes = flatten([a.tape_dates[date] for a in self.archives if date in a.tape_dates])
+            i = bisect.bisect_left(self.dates, date)
+            found = i < len(self.dates) and self.dates[i] == date
+            if len(tapes) == 0:
+                self.tape_dates.pop(date, None)
+                if found:
+                    del self.dates[i]
+                continue
+            self.tape_dates[date] = tapes if len(self.archives) == 1 else self.sort_across_collection(tapes)
+            if not found:
+                self.dates.insert(i, date)
+
+    def add_collection(self, collection, reload_ids=False, with_latest=False):
+        """Load the tapes of one more collection, without reloading the collections already in the Archivary.
+        Only the dates of the new collection are regrouped. Returns the dates which changed."""
+        if collection in self.collection_list:
+            return []
+        self.collection_list = self.collection_list + [collection]  # the list may be shared, eg with config.optd
+        archive = self.new_archive([collection], reload_ids, with_latest)
+        if archive is None:
+            logger.warning(f"No tapes for collection {collection}")
+            return []
+        archive.tape_dates = archive.get_tape_dates()  # ranked, as in an Archivary
+        if len(self.archives) == 0:
+            self.archives = [archive]
+            self.tape_dates = archive.tape_dates
+            self.dates = list(archive.dates)
+            return list(self.dates)
+        if len(self.archives) == 1:  # tape_dates were the archive's own, which are updated in place
+            self.tape_dates = {date: list(tapes) for date, tapes in self.tape_dates.items()}
+        self.archives.append(archive)
+        dates = sorted(archive.tape_dates.keys())
+        self.update_dates(dates)
+        logger.info(f"Added collection {collection}, {len(archive.tapes)} tapes on {len(dates)} dates")
+        return dates
+
+    def remove_collection(self, collection):
+        """Drop the tapes of a collection, without reloading the other collections. An archive of only that
+        collection is dropped, and the tapes of the collection are removed from an archive of several collections.
+        Only the dates of the collection are regrouped. Returns the dates which changed."""
+        if collection not in self.collection_list:
+            return []
+        self.collection_list = [c for c in self.collection_list if c != collection]
+        dates = set()
+        archives = []
+        for a in self.archives:
+            if collection not in a.collection_list:
+                archives.append(a)
+            elif len(a.collection_list) == 1:
+                dates.update(a.tape_dates.keys())
+            else:
+                dates.update(a.drop_collection(collection))
+                if len(a.dates) > 0:
+                    archives.append(a)
+        self.archives = archives
+        if len(self.archives) == 0:
+            self.tape_dates = {}
+            self.dates = []
+        elif len(self.archives) == 1:
+            self.tape_dates = self.archives[0].tape_dates
+            self.dates = sorted(self.tape_dates.keys())
+        else:
+            self.update_dates(sorted(dates))
+        logger.info(f"Removed collection {collection} from {len(dates)} dates")
+        return sorted(dates)
+
     def year_artists(self, start_year, end_year=None):
         for a in self.archives:
             tmp = a.year_artists(start_year, end_year)
@@ -353,6 +1596,35 @@ class BaseArchive(abc.ABC):
         self.idpath = [os.path.join(self.dbpath, f"{x}_ids") for x in self.collection_list]
         return self.idpath
 
+    def clone(self):
+        """A copy which can be loaded or updated without changing this archive. The tapes are shared."""
+        archive = copy.copy(self)
+        archive.tapes = list(self.tapes)
+        archive.tape_dates = dict(self.tape_dates)
+        archive.dates = list(self.dates)
+        return archive
+
+    def drop_collection(self, collection):
+        """Remove a collection from the archive, with its tapes which are in none of the other collections.
+        Returns the dates which changed."""
+        self.collection_list = [c for c in self.collection_list if c != collection]
+        self.build_idpath()
+        keep = {c.replace("Local_", "") for c in self.collection_list}
+        dates = []
+        for date, tapes in list(self.tape_dates.items()):
+            kept = [t for t in tapes if any(c in t.collection for c in keep)]
+            if len(kept) == len(tapes):
+                continue
+            dates.append(date)
+            if len(kept) > 0:
+                self.tape_dates[date] = kept
+            else:
+                del self.tape_dates[date]
+        if len(dates) > 0:
+            self.tapes = [t for t in self.tapes if any(c in t.collection for c in keep)]
+            self.dates = sorted(self.tape_dates.keys())
+        return dates
+
     def tape_at_date(self, dt, which_tape=0):
         then_date = dt.date()
         then = then_date.strftime("%Y-%m-%d")
@@ -477,6 +1749,10 @@ class BaseTape(abc.ABC):
             self.get_metadata()
         return self._tracks[n - 1]
 
+    async def async_get_metadata(self):
+        """get_metadata on the event loop. Tapes without an asyncio download run get_metadata in a thread."""
+        await asyncio.get_running_loop().run_in_executor(None, self.get_metadata)
+
     @abc.abstractmethod
     def stream_only(self):
         pass
@@ -509,7 +1785,7 @@ class BaseTrack:
 
 
 class PhishinTapeDownloader(BaseTapeDownloader):
-    """Synchronous Phishin Tape Downloader"""
+    """Phishin Tape Downloader, which runs on the AsyncBackend when aiohttp is installed"""
 
     def __init__(self, url="https://phish.in", collection_list="Phish"):
         self.url = url
@@ -535,6 +1811,9 @@ class PhishinTapeDownloader(BaseTapeDownloader):
         """Get a list of all Phish.in shows
         Write all tapes to a folder by time period
         """
+        backend = async_backend()
+        if backend is not None:
+            return backend.run(self.async_get_all_tapes(iddir, min_addeddate, date_range))
         per_page = self.parms["per_page"]
 
         # No need to update if we already have a show from today.
@@ -550,42 +1829,665 @@ class PhishinTapeDownloader(BaseTapeDownloader):
         logger.debug(f"total rows {total} on {total_pages} pages")
         current_page = json_resp["page"]
 
-        shows = self.extract_show_data(json_resp)
-        self.store_metadata(iddir, shows)
+        shows = self.extract_show_data(json_resp)
+        self.store_metadata(iddir, shows)
+
+        # If min_addeddate is not None, then check that the earliest update on this page is after the latest show we already had.
+        while (current_page < total_pages) if min_addeddate is None else (shows[-1]["date"] > min_addeddate):
+            r = self.get_page(current_page + 1, per_page)
+            json_resp = r.json()
+            shows = self.extract_show_data(json_resp)
+            self.store_metadata(iddir, shows)
+            current_page = json_resp["page"]
+        return total
+
+    async def async_get_all_tapes(self, iddir, min_addeddate=None, date_range=None):
+        """get_all_tapes with aiohttp. When all pages are wanted, they are fetched concurrently once the first page
+        gives their number, and stored as they arrive."""
+        per_page = self.parms["per_page"]
+        if min_addeddate is not None:
+            if to_date(min_addeddate) == datetime.datetime.today().date():
+                return
+            per_page = 50
+        json_resp = await self.async_get_page(1, per_page)
+        total = json_resp["total_entries"]
+        total_pages = json_resp["total_pages"]
+        logger.debug(f"total rows {total} on {total_pages} pages")
+        current_page = json_resp["page"]
+
+        shows = self.extract_show_data(json_resp)
+        await self.async_store_metadata(iddir, shows)
+
+        if min_addeddate is None:
+            pages = [asyncio.ensure_future(self.async_get_page(page_no, per_page)) for page_no in range(current_page + 1, total_pages + 1)]
+            try:
+                for page in asyncio.as_completed(pages):
+                    await self.async_store_metadata(iddir, self.extract_show_data(await page))
+            except BaseException:
+                for page in pages:
+                    page.cancel()
+                raise
+            return total
+
+        # Whether to get the next page depends on this one.
+        while shows[-1]["date"] > min_addeddate:
+            json_resp = await self.async_get_page(current_page + 1, per_page)
+            shows = self.extract_show_data(json_resp)
+            await self.async_store_metadata(iddir, shows)
+            current_page = json_resp["page"]
+        return total
+
+    def get_page(self, page_no, per_page=None):
+        """Get one page of shows information.
+        Returns a list of dictionaries of tape information
+        """
+        parms = self.parms.copy()
+        parms["page"] = page_no
+        if isinstance(per_page, int):
+            parms["per_page"] = per_page
+        r = http_client.get(self.api, params=parms, headers=self.headers)
+        logger.debug(f"url is {r.url}")
+        if r.status_code != 200:
+            logger.error(f"Error {r.status_code} collecting data")
+            raise Exception("Download", "Error {} collection".format(r.status_code))
+        return r
+
+    async def async_get_page(self, page_no, per_page=None):
+        """get_page with aiohttp. Returns the json of the page."""
+        parms = self.parms.copy()
+        parms["page"] = page_no
+        if isinstance(per_page, int):
+            parms["per_page"] = per_page
+        status, json_resp = await async_backend().get_json(self.api, params=parms, headers=self.headers)
+        if status != 200 or json_resp is None:
+            logger.error(f"Error {status} collecting data")
+            raise Exception("Download", f"Error {status} collection")
+        return json_resp
+
+    def get_all_collection_names(self):
+        return ["Phish"]
+
+class RateLimiter:
+    """A token bucket, shared by any number of threads and tasks.
+
+    Requests are let through at requests_per_second on average, with bursts of up to burst requests after a
+    quiet spell. With requests_per_second None, requests are not limited.
+    """
+
+    def __init__(self, requests_per_second, burst=1):
+        self.rate = requests_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.last_time = time.monotonic()
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"RateLimiter {self.rate if self.rate else 'unlimited'} per second, bursts of {self.burst}"
+
+    def _reserve(self):
+        """Take a token, and return how long to wait until it is due"""
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate) - 1
+            self.last_time = now
+            return -self.tokens / self.rate
+
+    def wait(self):
+        wait_time = self._reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def async_wait(self):
+        wait_time = self._reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request to a host whose CircuitBreaker is open"""
+
+
+class CircuitBreaker:
+    """Stops the requests to a host which is down.
+
+    After failure_threshold requests in a row fail to connect or get a 5xx status, the circuit opens: requests fail
+    fast with CircuitOpenError for reset_timeout seconds. Then one trial request is let through, which closes the
+    circuit if it succeeds, and re-opens it otherwise.
+    """
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=60.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.n_failures = 0
+        self.opened_time = None
+        self.trial_time = None
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"CircuitBreaker {self.host} {self.state}"
+
+    @property
+    def state(self):
+        if self.opened_time is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_time >= self.reset_timeout else "open"
+
+    def before_request(self):
+        """Raises CircuitOpenError unless a request may be made"""
+        with self.lock:
+            if self.opened_time is None:
+                return
+            now = time.monotonic()
+            # one trial at a time, unless a trial never finished
+            if now - self.opened_time < self.reset_timeout or (self.trial_time is not None and now - self.trial_time < self.reset_timeout):
+                raise CircuitOpenError(f"{self.host} is not responding")
+            self.trial_time = now
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_time is not None:
+                logger.info(f"{self.host} is responding again")
+            self.n_failures = 0
+            self.opened_time = None
+            self.trial_time = None
+
+    def record_failure(self):
+        with self.lock:
+            self.n_failures = self.n_failures + 1
+            if self.trial_time is not None or (self.opened_time is None and self.n_failures >= self.failure_threshold):
+                logger.warning(f"{self.host} is not responding. Failing fast for {self.reset_timeout} seconds")
+                self.opened_time = time.monotonic()
+            self.trial_time = None
+
+
+SCRAPE_REQUESTS_PER_SECOND = 5
+scrape_rate_limiter = RateLimiter(SCRAPE_REQUESTS_PER_SECOND)  # shared by all IATapeDownloaders
+
+
+class RetryPolicy:
+    """How often, and after how long, a request is retried when it fails to connect or gets one of the statuses"""
+
+    def __init__(self, n_retries=2, backoff=1.0, statuses=(502, 503, 504)):
+        self.n_retries = n_retries
+        self.backoff = backoff
+        self.statuses = statuses
+
+    def __repr__(self):
+        return f"RetryPolicy {self.n_retries} retries, {self.backoff}s backoff, on {self.statuses}"
+
+    def delay(self, n_tries):
+        return self.backoff * n_tries
+
+
+DEFAULT_RETRY = RetryPolicy()
+SCRAPE_RETRY = RetryPolicy(n_retries=5, backoff=5.0)  # the scrape API is slow to recover
+
+
+class HostStats:
+    """Request counters of one host"""
+
+    def __init__(self):
+        self.n_requests = 0
+        self.n_connections = 0
+        self.n_retries = 0
+        self.n_errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"HostStats {self.as_dict()}"
+
+    def record(self, latency, retry=False, error=False, new_connections=0):
+        with self.lock:
+            self.n_requests = self.n_requests + 1
+            self.n_retries = self.n_retries + retry
+            self.n_errors = self.n_errors + error
+            self.n_connections = self.n_connections + new_connections
+            self.total_latency = self.total_latency + latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self):
+        return {
+            "requests": self.n_requests,
+            "connections": self.n_connections,
+            "reused": max(0, self.n_requests - self.n_connections),
+            "retries": self.n_retries,
+            "errors": self.n_errors,
+            "mean_latency": self.total_latency / self.n_requests if self.n_requests else 0.0,
+            "max_latency": self.max_latency,
+        }
+
+
+class HttpClient:
+    """The HTTP client of all archive.org and phish.in traffic.
+
+    Connections are kept alive and pooled, up to pool_size per host, with pools for the n_hosts most recently used
+    hosts (archive.org, phish.in and their download servers). Requests time out after timeout = (connect, read)
+    seconds, and are retried according to a RetryPolicy. All requests share the rate_limiter, and each host has a
+    CircuitBreaker. stats() has the request, connection and latency counters and the circuit state of each host.
+    Requests are made with requests, or with aiohttp on the AsyncBackend.
+    """
+
+    def __init__(
+        self, pool_size=8, n_hosts=4, timeout=(10, 60), retry=DEFAULT_RETRY, rate_limiter=None, failure_threshold=5, reset_timeout=60.0
+    ):
+        self.pool_size = pool_size
+        self.n_hosts = n_hosts
+        self.timeout = timeout
+        self.retry = retry
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(None)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hosts = {}
+        self.breakers = {}
+        self.lock = Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=n_hosts, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool_connections = {}
+        self._backend = None
+
+    def __repr__(self):
+        return f"HttpClient pool of {self.pool_size} per host for {self.n_hosts} hosts, timeout {self.timeout}, {self.retry}"
+
+    def host(self, url):
+        """The HostStats and the CircuitBreaker of the host of url"""
+        host = urlsplit(str(url)).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostStats()
+                self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            return self.hosts[host], self.breakers[host]
+
+    def stats(self):
+        with self.lock:
+            return {host: dict(stats.as_dict(), circuit=self.breakers[host].state) for host, stats in self.hosts.items()}
+
+    def get(self, url, params=None, headers=None, retry=None, rate_limiter=None):
+        """GET with requests. Returns the last response, raising only if the last try failed to connect.
+        Raises CircuitOpenError without waiting if the host is not responding."""
+        retry = self.retry if retry is None else retry
+        stats, breaker = self.host(url)
+        for n_tries in range(retry.n_retries + 1):
+            if n_tries > 0:
+                logger.warning(f"trying to pull data for {n_tries} time")
+                time.sleep(retry.delay(n_tries))
+            breaker.before_request()
+            self.rate_limiter.wait()
+            if rate_limiter is not None:
+                rate_limiter.wait()
+            start = time.monotonic()
+            try:
+                r = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                stats.record(time.monotonic() - start, retry=n_tries > 0, error=True)
+                breaker.record_failure()
+                if n_tries == retry.n_retries:
+                    raise
+                logger.warning(f"{e.__class__.__name__} getting {url}")
+                continue
+            stats.record(time.monotonic() - start, retry=n_tries > 0, new_connections=self.new_connections(url))
+            if r.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if r.status_code not in retry.statuses:
+                break
+        logger.debug(f"url is {r.url}")
+        return r
+
+    def new_connections(self, url):
+        """The number of connections urllib3 has opened to the host of url since the last call"""
+        host = urlsplit(url)
+        try:
+            pools = self.session.get_adapter(url).poolmanager.pools
+            pools = [pools.get(key) for key in pools.keys()]
+            n_connections = sum(pool.num_connections for pool in pools if pool is not None and pool.host == host.hostname)
+        except Exception:
+            return 0
+        with self.lock:
+            n_new = n_connections - self.pool_connections.get(host.netloc, 0)
+            self.pool_connections[host.netloc] = n_connections
+        return max(0, n_new)
+
+    def async_backend(self):
+        """The AsyncBackend of this client, or None if aiohttp is not installed"""
+        if aiohttp is None:
+            return None
+        with self.lock:
+            if self._backend is None:
+                self._backend = AsyncBackend(self)
+                atexit.register(self._backend.close)
+        return self._backend
+
+
+class AsyncBackend:
+    """Runs downloads on an asyncio event loop in a daemon thread, with one aiohttp session.
+
+    The session is configured by the HttpClient, and at most pool_size requests are in flight at once, whoever makes
+    them. Synchronous code calls run(coroutine), which blocks until the coroutine is done. It must not be called from
+    the loop itself.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, name="AsyncBackend", daemon=True)
+        self.thread.start()
+        self._session = None
+        self._semaphore = None
+
+    def __repr__(self):
+        return f"AsyncBackend of {self.client}"
+
+    def submit(self, coroutine):
+        """Schedule the coroutine on the loop. Returns a concurrent.futures.Future, whose cancel() cancels it."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        return self.submit(coroutine).result()
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            client = self.client
+
+            async def on_connection_create_end(session, context, params):
+                context.trace_request_ctx.new_connections = 1
+
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(on_connection_create_end)
+            connect, read = client.timeout
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=client.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+                trace_configs=[trace_config],
+            )
+            self._semaphore = asyncio.Semaphore(client.pool_size)
+        return self._session
+
+    async def get_json(self, url, params=None, headers=None, retry=None, rate_limiter=None):
+        """Returns the status and the json of the response. The json is None unless the status is 200.
+        Raises only if the last try failed to connect, or with CircuitOpenError if the host is not responding."""
+        session = self.session()
+        retry = self.client.retry if retry is None else retry
+        stats, breaker = self.client.host(url)
+        async with self._semaphore:
+            for n_tries in range(retry.n_retries + 1):
+                if n_tries > 0:
+                    logger.warning(f"trying to pull data for {n_tries} time")
+                    await asyncio.sleep(retry.delay(n_tries))
+                breaker.before_request()
+                await self.client.rate_limiter.async_wait()
+                if rate_limiter is not None:
+                    await rate_limiter.async_wait()
+                start = time.monotonic()
+                trace = types.SimpleNamespace(new_connections=0)
+                try:
+                    async with session.get(url, params=params, headers=headers, trace_request_ctx=trace) as r:
+                        logger.debug(f"url is {r.url}")
+                        if r.status != 200:
+                            json_resp = None
+                        else:
+                            try:
+                                json_resp = await r.json(content_type=None)
+                            except ValueError:
+                                logger.warning(f"Json Error {r.url}")
+                                json_resp = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    stats.record(time.monotonic() - start, retry=n_tries > 0, error=True)
+                    breaker.record_failure()
+                    if n_tries == retry.n_retries:
+                        raise
+                    logger.warning(f"{e.__class__.__name__} getting {url}")
+                    continue
+                stats.record(time.monotonic() - start, retry=n_tries > 0, new_connections=trace.new_connections)
+                if r.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if r.status not in retry.statuses:
+                    break
+        return r.status, json_resp
+
+    def close(self):
+        if self._session is not None:
+            self.run(self._session.close())
+
+
+REQUESTS_PER_SECOND = 10
+http_client = HttpClient(rate_limiter=RateLimiter(REQUESTS_PER_SECOND, burst=20))
+
+
+def async_backend():
+    """The AsyncBackend shared by all downloads, or None if aiohttp is not installed"""
+    return http_client.async_backend()
+
+
+async def async_read_cached_metadata(path, slim):
+    """read_cached_metadata with aiofiles"""
+    try:
+        async with aiofiles.open(path, "rb") as f:
+            return decode_metadata(await f.read())
+    except FileNotFoundError:
+        return await asyncio.get_running_loop().run_in_executor(None, read_cached_metadata, path, slim)
+
+
+class DownloadCheckpoint:
+    """The progress of a download into a staging folder, saved to the folder as each page is stored.
+
+    Each window (min_date, max_date) of the date_range records the date of the last tape stored, the cursor of
+    the next page, the state of its PeriodWriter and whether it is done, so that an interrupted download can
+    resume where it left off.
+    """
+
+    NAME = "checkpoint.json"
+
+    def __init__(self, iddir, date_range, windows, max_date):
+        self.path = os.path.join(iddir, self.NAME)
+        self.date_range = date_range
+        self.max_date = max_date
+        self.windows = {f"{lo}/{hi}": {"last_date": None, "cursor": None, "part": None, "done": False} for lo, hi in windows}
+        self.lock = Lock()
+
+    def __repr__(self):
+        n_done = len([w for w in self.windows.values() if w["done"]])
+        return f"DownloadCheckpoint {self.path}: {n_done} of {len(self.windows)} windows done"
+
+    @classmethod
+    def load(cls, iddir, date_range):
+        """The checkpoint of a download of date_range into iddir, or None"""
+        try:
+            saved = json.load(open(os.path.join(iddir, cls.NAME), "r"))
+        except Exception:
+            return None
+        if saved["date_range"] != json.loads(json.dumps(date_range)):
+            return None
+        checkpoint = cls(iddir, date_range, [], saved["max_date"])
+        checkpoint.windows = saved["windows"]
+        return checkpoint
+
+    def pending(self):
+        """The (min_date, max_date, window) of the windows which are not done"""
+        pending = []
+        for key, window in self.windows.items():
+            if not window["done"]:
+                lo, hi = key.split("/")
+                pending.append((lo, hi, window))
+        return pending
+
+    def complete(self):
+        return len(self.pending()) == 0
+
+    def started(self):
+        """True if a page was stored, so that the download is worth resuming"""
+        return any(w["done"] or w["last_date"] is not None or w["part"] is not None for w in self.windows.values())
+
+    def progress(self, min_date, max_date, last_date=None, cursor=None, part=None, done=False):
+        with self.lock:
+            window = self.windows[f"{min_date}/{max_date}"]
+            if last_date is not None:
+                window["last_date"] = last_date
+            window["cursor"], window["part"] = cursor, part
+            window["done"] = window["done"] or done
+            self.save()
+
+    def save(self):
+        try:
+            data = {"date_range": self.date_range, "max_date": self.max_date, "windows": self.windows}
+            write_atomic(self.path, json.dumps(data).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Failed to write checkpoint {self.path}: {e}")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def staging_path(iddir):
+    """Where a reload of iddir is downloaded. The folder has the same name, as it determines the periods of the files"""
+    return os.path.join(os.path.dirname(iddir), "staging", os.path.basename(iddir))
+
+
+def remove_staging(staging):
+    """Remove a staging folder, and the folder of the staging folders once it is empty"""
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(staging))
+    except OSError:  # another reload is staged there
+        pass
+
+
+def recover_reload(iddir):
+    """Finish or undo the swap of a reload which was interrupted between its two renames"""
+    old = f"{iddir}.old"
+    if not os.path.exists(old):
+        return
+    BaseTapeDownloader.forget_stored(iddir)
+    if not os.path.exists(iddir):
+        staging = staging_path(iddir)
+        complete = os.path.isdir(staging) and not os.path.exists(os.path.join(staging, DownloadCheckpoint.NAME))
+        os.rename(staging if complete else old, iddir)
+        if complete:
+            remove_staging(staging)
+        logger.info(f"Recovered {iddir} from {staging if complete else old}")
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def swap_in(staging, iddir):
+    """Replace iddir by staging. If this is interrupted, recover_reload finishes it."""
+    BaseTapeDownloader.forget_stored(iddir)
+    BaseTapeDownloader.forget_stored(staging)
+    old = f"{iddir}.old"
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    if os.path.exists(iddir):
+        os.rename(iddir, old)
+    os.rename(staging, iddir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class CursorExpired(Exception):
+    """The scrape API rejected the cursor of a download which is being resumed"""
+
+
+class PeriodWriter:
+    """Writes the pages of a download, in date order, to the ids_{period}.json files of iddir.
+
+    The tapes of a period with no file are appended to ids_{period}.json.part as each page arrives, and the file
+    is renamed into place when the download moves on to the next period, so only a page is held in memory.
+    The tapes of a period which has a file are merged into it with store_metadata.
+    state is where the part file is, so that a checkpointed download can resume it.
+    """
+
+    def __init__(self, downloader, iddir, period_func, state=None):
+        self.downloader = downloader
+        self.iddir = iddir
+        self.period_func = period_func
+        self.period = None
+        self.n_rows = 0
+        self.size = 0
+        self.resumed = state is not None and self._resume(state)
+
+    def _resume(self, state):
+        part = self.part_path(state["period"])
+        if not os.path.exists(part) or os.path.getsize(part) < state["size"]:
+            logger.warning(f"Cannot resume {part} from {state}")
+            return False
+        with open(part, "r+b") as f:
+            f.truncate(state["size"])  # drop a page written after the state was saved
+        self.period, self.n_rows, self.size = state["period"], state["n_rows"], state["size"]
+        return True
 
-        # If min_addeddate is not None, then check that the earliest update on this page is after the latest show we already had.
-        while (current_page < total_pages) if min_addeddate is None else (shows[-1]["date"] > min_addeddate):
-            r = self.get_page(current_page + 1, per_page)
-            json_resp = r.json()
-            shows = self.extract_show_data(json_resp)
-            self.store_metadata(iddir, shows)
-            current_page = json_resp["page"]
-        return total
+    def part_path(self, period):
+        return os.path.join(self.iddir, f"ids_{period}.json.part")
 
-    def get_page(self, page_no, per_page=None):
-        """Get one page of shows information.
-        Returns a list of dictionaries of tape information
-        """
-        parms = self.parms.copy()
-        parms["page"] = page_no
-        if isinstance(per_page, int):
-            parms["per_page"] = per_page
-        r = requests.get(self.api, headers=self.headers, params=parms)
-        logger.debug(f"url is {r.url}")
-        if r.status_code != 200:
-            logger.error(f"Error {r.status_code} collecting data")
-            raise Exception("Download", "Error {} collection".format(r.status_code))
-        return r
+    def state(self):
+        return None if self.period is None else {"period": self.period, "n_rows": self.n_rows, "size": self.size}
+
+    def write(self, tapes):
+        """Write a page of tapes. Returns the number of tapes added."""
+        n_tapes_added = 0
+        os.makedirs(self.iddir, exist_ok=True)
+        for period, tapes_from_period in self.downloader.by_period(tapes, self.period_func):
+            if period != self.period:
+                self.finish()
+                if os.path.exists(os.path.join(self.iddir, f"ids_{period}.json")):
+                    n_tapes_added = n_tapes_added + self.downloader.store_metadata(self.iddir, tapes_from_period, self.period_func)
+                    continue
+            n_tapes_added = n_tapes_added + self._append(period, tapes_from_period)
+        return n_tapes_added
+
+    def _append(self, period, tapes):
+        data = ((",\n" if self.n_rows > 0 else "[\n") + ",\n".join(json.dumps(t) for t in tapes)).encode("utf-8")
+        with open(self.part_path(period), "ab" if self.n_rows > 0 else "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.period = period
+        self.n_rows = self.n_rows + len(tapes)
+        self.size = self.size + len(data)
+        self.downloader.record_delta(self.iddir, tapes)
+        return len(tapes)
+
+    def finish(self):
+        """Close the part file of the current period, and rename it into place"""
+        if self.period is None:
+            return
+        part = self.part_path(self.period)
+        outpath = os.path.join(self.iddir, f"ids_{self.period}.json")
+        with open(part, "ab") as f:
+            f.write(b"\n]\n")
+        os.rename(part, outpath)
+        logger.info(f"Wrote {self.n_rows} tapes to {outpath}")
+        self.downloader.update_index(self.iddir, os.path.basename(outpath), None)
+        self.period, self.n_rows, self.size = None, 0, 0
+
+    def reset(self):
+        """Discard the part file of the current period"""
+        if self.period is not None and os.path.exists(self.part_path(self.period)):
+            os.remove(self.part_path(self.period))
+        self.period, self.n_rows, self.size = None, 0, 0
 
-    def get_all_collection_names(self):
-        return ["Phish"]
 
 class IATapeDownloader(BaseTapeDownloader):
-    """Synchronous Grateful Dead Tape Downloader"""
+    """Grateful Dead Tape Downloader
+
+    A date range is downloaded in windows of a year or decade (the periods of the ids files), max_workers at a
+    time. Requests are spaced out by rate_limiter, which by default is shared by all downloaders.
+    The downloads run on the AsyncBackend when aiohttp is installed, else on a pool of threads.
+    """
 
-    def __init__(self, url="https://archive.org", collection_list="etree"):
+    def __init__(self, url="https://archive.org", collection_list="etree", max_workers=4, rate_limiter=None):
         self.url = url
         self.collection_list = collection_list
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter if rate_limiter is not None else scrape_rate_limiter
+        self.store_lock = RLock()
         self.api = f"{self.url}/services/search/v1/scrape"
         fields = [
             "identifier",
@@ -604,6 +2506,7 @@ class IATapeDownloader(BaseTapeDownloader):
             "addeddate",
         ]
         sorts = ["date asc", "avg_rating desc", "num_favorites desc", "downloads desc"]
+        self.tape_indexes = {}
         self.parms = {
             "debug": "false",
             "xvar": "production",
@@ -613,6 +2516,20 @@ class IATapeDownloader(BaseTapeDownloader):
             "fields": ",".join(fields),
         }
 
+    def update_index(self, iddir, filename, period_tapes):
+        """Keep the TapeIndex of iddir in step with the period files. The index is updated by save_indexes, once
+        for all of the files written."""
+        with self.store_lock:
+            self.tape_indexes.setdefault(iddir, {})[filename] = period_tapes
+
+    def save_indexes(self):
+        with self.store_lock:
+            updates, self.tape_indexes = self.tape_indexes, {}
+        for iddir, sources in updates.items():
+            tape_index = TapeIndex.load(iddir)
+            tape_index.update_sources({name: rows for name, rows in sources.items() if rows is not None})
+            tape_index.refresh()  # the streamed files and the journal are read back from disk
+
     def get_all_collection_names(self):
         collection_path = os.path.join(os.getenv("HOME"), ".etree_collection_names.json")
         if not os.path.exists(collection_path):
@@ -637,7 +2554,7 @@ class IATapeDownloader(BaseTapeDownloader):
             "fields": "identifier, item_count,collection_size,downloads,num_favorites",
             "q": "collection:etree AND mediatype:collection",
         }
-        r = requests.get(self.api, params=parms)
+        r = http_client.get(self.api, params=parms)
         logger.debug(f"url is {r.url}")
         if r.status_code != 200:
             logger.error(f"Error {r.status_code} collecting data")
@@ -661,21 +2578,131 @@ class IATapeDownloader(BaseTapeDownloader):
         logger.info(f"saved {current_rows} collection names to {collection_path}")
         return j
 
-    def get_all_tapes(self, iddir, min_addeddate=None, date_range=None, collection=None):
+    def get_all_tapes(self, iddir, min_addeddate=None, date_range=None, collection=None, checkpoint=None):
         """Get a list of all tapes.  Write all tapes to a folder by time period
         Args:
             iddir (str) : path where id's metadata will be written
             min_addeddate (str, optional): Only get data which was added after this date. Default None
             date_range ([list of 2 ints or strings]): start and end year. Only tapes within this range will be retrieved
+            checkpoint (DownloadCheckpoint, optional): Only download its pending windows, recording their progress.
         Returns:
             int : Number of tapes retrieved.
+        Each window of the date range is paged through with the scrape API's cursor, and each page is written as
+        it arrives. With max_workers > 1, the windows of a full download are downloaded in parallel. An update
+        (with min_addeddate) is a single window, since few tapes are added between updates.
         """
-        current_rows = 0
-        n_tapes_added = 0
-        n_tapes_total = 0
-        tapes = []
-        yearly_collections = ["etree", "georgeblood"]  # should this be in config?
+        backend = async_backend()
+        if backend is not None:
+            return backend.run(self.async_get_all_tapes(iddir, min_addeddate, date_range, collection, checkpoint))
+        collection = collection if collection is not None else os.path.basename(iddir).replace("_ids", "")
+        windows, max_date = self.download_windows(iddir, date_range, self.max_workers > 1 and min_addeddate is None, checkpoint)
+        groups = self.group_windows(iddir, windows)
+
+        try:
+            if self.max_workers <= 1 or len(groups) == 1:
+                return sum(self._get_windows(iddir, group, min_addeddate, collection, max_date) for group in groups)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._get_windows, iddir, group, min_addeddate, collection, max_date) for group in groups]
+                try:
+                    return sum(future.result() for future in as_completed(futures))
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            self.save_indexes()
+
+    async def async_get_all_tapes(self, iddir, min_addeddate=None, date_range=None, collection=None, checkpoint=None):
+        """get_all_tapes with aiohttp. max_workers windows are downloaded at a time, each page being written as it
+        arrives. An update (with min_addeddate) is a single window."""
+        collection = collection if collection is not None else os.path.basename(iddir).replace("_ids", "")
+        windows, max_date = self.download_windows(iddir, date_range, min_addeddate is None, checkpoint)
+        workers = asyncio.Semaphore(max(1, self.max_workers))
+
+        async def get_group(group):
+            async with workers:
+                n_tapes = 0
+                for lo, hi, progress, resume in group:
+                    n_tapes += await self._async_get_all_tapes(iddir, lo, hi, min_addeddate, collection, max_date, progress, resume)
+                return n_tapes
+
+        tasks = [asyncio.ensure_future(get_group(group)) for group in self.group_windows(iddir, windows)]
+        try:
+            return sum(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self.save_indexes)
+
+    def reload_all_tapes(self, iddir, date_range=None, collection=None):
+        """Download all of the tapes of date_range again, replacing those in iddir.
+
+        The tapes are downloaded into a staging folder next to iddir, with a DownloadCheckpoint. If the reload is
+        interrupted, the next reload of the same date_range resumes from the checkpoint, which is only kept if a
+        page was stored. iddir is only replaced
+        when the download is complete, so it is usable throughout.
+        Returns:
+            int : Number of tapes retrieved.
+        """
+        recover_reload(iddir)
+        staging = staging_path(iddir)
+        checkpoint = DownloadCheckpoint.load(staging, date_range)
+        if checkpoint is None:
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            windows, max_date = self.date_windows(iddir, date_range, split=True)
+            checkpoint = DownloadCheckpoint(staging, date_range, windows, max_date)
+            checkpoint.save()
+        else:
+            logger.info(f"Resuming the reload of {iddir}: {checkpoint}")
         collection = collection if collection is not None else os.path.basename(iddir).replace("_ids", "")
+        try:
+            n_tapes = self.get_all_tapes(staging, date_range=date_range, collection=collection, checkpoint=checkpoint)
+        except Exception:
+            if not checkpoint.started():  # there is nothing to resume from
+                remove_staging(staging)
+            raise
+        if not checkpoint.complete():
+            raise Exception("Download", f"Reload of {iddir} is not complete: {checkpoint}")
+        checkpoint.remove()
+        swap_in(staging, iddir)
+        remove_staging(staging)
+        logger.info(f"Reloaded {iddir}")
+        return n_tapes
+
+    def download_windows(self, iddir, date_range, split, checkpoint=None):
+        """The (min_date, max_date, progress, resume) of the windows to download, and the max_date of the
+        date_range. progress records the progress of a window in the checkpoint, if any, and resume is where the
+        checkpoint left off."""
+        if checkpoint is None:
+            windows, max_date = self.date_windows(iddir, date_range, split)
+            return [(lo, hi, None, None) for lo, hi in windows], max_date
+        return [(lo, hi, partial(checkpoint.progress, lo, hi), resume) for lo, hi, resume in checkpoint.pending()], checkpoint.max_date
+
+    def group_windows(self, iddir, windows):
+        """Group the windows which share a period file. The windows of a group are downloaded one after the other."""
+        period_func = self.period_func(iddir)
+        groups = []
+        last_period = None
+        for window in sorted(windows, key=lambda w: w[0]):
+            if groups and period_func(window[0]) <= last_period:
+                groups[-1].append(window)
+            else:
+                groups.append([window])
+            last_period = max(period_func(window[1]), period_func(window[0]) if last_period is None else last_period)
+        return groups
+
+    def period_func(self, iddir):
+        """The period of the ids files of iddir: years for the yearly collections, else decades"""
+        yearly_collections = ["etree", "georgeblood"]  # should this be in config?
+        return to_year if os.path.basename(iddir).replace("_ids", "") in yearly_collections else to_decade
+
+    def date_windows(self, iddir, date_range, split=True):
+        """The (min_date, max_date) windows of a date_range, and its max_date. With split, the windows are the
+        periods of the ids files: years for the yearly collections, else decades."""
+        yearly = self.period_func(iddir) is to_year
 
         if not date_range:
             min_date = "1880-01-01"
@@ -684,36 +2711,90 @@ class IATapeDownloader(BaseTapeDownloader):
             min_date = f"{date_range[0]}-01-01"
             max_date = f"{date_range[1]}-12-31"
         elif len(date_range) > 2:
-            result_list = [self.get_all_tapes(iddir, min_addeddate, x) for x in date_range]
-            return sum(result_list)
+            return [(f"{x}-01-01", f"{x}-12-31") for x in date_range], f"{max(date_range)}-12-31"
         elif len(date_range) == 1:
             min_date = f"{date_range[0]}-01-01"
             max_date = f"{date_range[0]}-12-31"
+        windows = date_windows(min_date, max_date, 1 if yearly else 10) if split else [(min_date, max_date)]
+        return windows, max_date
+
+    def window_writer(self, iddir, resume=None):
+        """A PeriodWriter for a window, and the cursor to start from. resume is the checkpoint of the window."""
+        resume = resume or {}
+        writer = PeriodWriter(self, iddir, self.period_func(iddir), resume.get("part"))
+        cursor = resume.get("cursor") if writer.resumed or resume.get("part") is None else None
+        return writer, cursor
+
+    def _get_windows(self, iddir, windows, min_addeddate, collection, max_addeddate):
+        return sum(
+            self._get_all_tapes(iddir, lo, hi, min_addeddate, collection, max_addeddate, progress, resume) for lo, hi, progress, resume in windows
+        )
 
-        r = self._get_piece(min_date, max_date, min_addeddate, collection=collection)
-        j = r.json()
-        total = j["total"]
-        logger.debug(f"total rows {total}")
-        current_rows += j["count"]
-        tapes = j["items"]
-
-        period_func = to_year if os.path.basename(iddir).replace("_ids", "") in yearly_collections else to_decade
-        logger.debug("Loading tapes")
-        n_tapes_added = self.store_metadata(iddir, tapes, period_func=period_func)
-        n_tapes_total = n_tapes_added
+    def _get_all_tapes(self, iddir, min_date, max_date, min_addeddate, collection, max_addeddate=None, progress=None, resume=None):
+        """Write the tapes of a window to iddir, page by page. resume is the checkpoint of the window, if any.
+        Returns the number of tapes added."""
+        writer, cursor = self.window_writer(iddir, resume)
+        n_tapes_total = 0
+        try:
+            for tapes, cursor in self.pages(min_date, max_date, min_addeddate, collection, max_addeddate, cursor):
+                n_tapes_total = n_tapes_total + writer.write(tapes)
+                if cursor is None:
+                    writer.finish()  # so that a resumed download can't append the last page again
+                if progress is not None:
+                    progress(tapes[-1]["date"][:10] if tapes else None, cursor, writer.state())
+        except CursorExpired as e:
+            if resume is None:
+                raise
+            logger.warning(f"{e}. Downloading {min_date} to {max_date} from the start")
+            writer.reset()
+            return self._get_all_tapes(iddir, min_date, max_date, min_addeddate, collection, max_addeddate, progress)
+        if progress is not None:
+            progress(done=True)
+        return n_tapes_total
 
-        while (current_rows < 1.25 * total) and n_tapes_added > 0:
-            logger.debug("in while loop")
-            min_date_field = tapes[-1]["date"]
-            min_date = min_date_field[:10]  # Should we subtract some days for overlap?
-            r = self._get_piece(min_date, max_date, min_addeddate, collection=collection)
-            j = r.json()
-            current_rows += j["count"]
-            tapes = j["items"]
-            n_tapes_added = self.store_metadata(iddir, tapes, period_func=period_func)
-            n_tapes_total = n_tapes_total + n_tapes_added
+    async def _async_get_all_tapes(self, iddir, min_date, max_date, min_addeddate, collection, max_addeddate=None, progress=None, resume=None):
+        """_get_all_tapes with aiohttp. The pages are written in a thread."""
+        loop = asyncio.get_running_loop()
+        writer, cursor = self.window_writer(iddir, resume)
+        n_tapes_total = 0
+        try:
+            async for tapes, cursor in self.async_pages(min_date, max_date, min_addeddate, collection, max_addeddate, cursor):
+                n_tapes_total = n_tapes_total + await loop.run_in_executor(None, writer.write, tapes)
+                if cursor is None:
+                    await loop.run_in_executor(None, writer.finish)
+                if progress is not None:
+                    progress(tapes[-1]["date"][:10] if tapes else None, cursor, writer.state())
+        except CursorExpired as e:
+            if resume is None:
+                raise
+            logger.warning(f"{e}. Downloading {min_date} to {max_date} from the start")
+            writer.reset()
+            return await self._async_get_all_tapes(iddir, min_date, max_date, min_addeddate, collection, max_addeddate, progress)
+        if progress is not None:
+            progress(done=True)
         return n_tapes_total
 
+    def pages(self, min_date, max_date, min_addeddate=None, collection=None, max_addeddate=None, cursor=None):
+        """Generate the (tapes, cursor) of each page of a query, starting from cursor. cursor is that of the next
+        page, None after the last page, so that no tape is downloaded twice."""
+        while True:
+            j = self._get_piece(min_date, max_date, min_addeddate, collection=collection, max_addeddate=max_addeddate, cursor=cursor).json()
+            cursor = j.get("cursor")
+            logger.debug(f"page of {j['count']} rows of {j.get('total')}")
+            yield j["items"], cursor
+            if cursor is None:
+                return
+
+    async def async_pages(self, min_date, max_date, min_addeddate=None, collection=None, max_addeddate=None, cursor=None):
+        """pages with aiohttp"""
+        while True:
+            j = await self._async_get_piece(min_date, max_date, min_addeddate, collection=collection, max_addeddate=max_addeddate, cursor=cursor)
+            cursor = j.get("cursor")
+            logger.debug(f"page of {j['count']} rows of {j.get('total')}")
+            yield j["items"], cursor
+            if cursor is None:
+                return
+
     def get_tapes(self, years):
         """Get a list of tapes.
             years: List of years to download tapes for
@@ -751,43 +2832,45 @@ class IATapeDownloader(BaseTapeDownloader):
             tapes.extend(j["items"])
         return tapes
 
-    def _get_piece(self, min_date, max_date, min_addeddate=None, collection=None):
+    def _get_piece(self, min_date, max_date, min_addeddate=None, collection=None, max_addeddate=None, cursor=None):
         """Get one chunk of a year's tape information.
         Returns a list of dictionaries of tape information
         """
         parms = self.parms.copy()
-        n_tries = 0
-        need_retry = False
-        collection = self.collection_list if collection is None else collection
-        if min_addeddate is None:
-            query = f"collection:{collection} AND date:[{min_date} TO {max_date}]"
-        else:
-            # max_addeddate = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-            query = f"collection:{collection} AND date:[{min_date} TO {max_date}] AND addeddate:[{min_addeddate} TO {max_date}]"
-        parms["q"] = query
-        try:
-            r = requests.get(self.api, params=parms)
-        except Exception as e:
-            logger.exception(e)
-            need_retry = True
-        while need_retry or r.status_code == 502 and n_tries < 5:
-            n_tries = n_tries + 1
-            logger.warning(f"trying to pull data for {n_tries} time")
-            if n_tries > 4:
-                need_retry = False
-            time.sleep(5 * n_tries)
-            try:
-                r = requests.get(self.api, params=parms)
-            except Exception as e:
-                logger.exception(e)
-
-        logger.debug(f"url is {r.url}")
+        parms["q"] = self.query(min_date, max_date, min_addeddate, collection, max_addeddate)
+        if cursor is not None:
+            parms["cursor"] = cursor
+        r = http_client.get(self.api, params=parms, retry=SCRAPE_RETRY, rate_limiter=self.rate_limiter)
         if r.status_code != 200:
             logger.error(f"Error {r.status_code} collecting data")
+            if cursor is not None and 400 <= r.status_code < 500:
+                raise CursorExpired(f"Cursor rejected with error {r.status_code}")
             raise Exception("Download", f"Error {r.status_code} collection")
             # ChunkedEncodingError:
         return r
 
+    async def _async_get_piece(self, min_date, max_date, min_addeddate=None, collection=None, max_addeddate=None, cursor=None):
+        """_get_piece with aiohttp. Returns the json of the piece."""
+        parms = self.parms.copy()
+        parms["q"] = self.query(min_date, max_date, min_addeddate, collection, max_addeddate)
+        if cursor is not None:
+            parms["cursor"] = cursor
+        status, j = await async_backend().get_json(self.api, params=parms, retry=SCRAPE_RETRY, rate_limiter=self.rate_limiter)
+        if status != 200 or j is None:
+            logger.error(f"Error {status} collecting data")
+            if cursor is not None and 400 <= status < 500:
+                raise CursorExpired(f"Cursor rejected with error {status}")
+            raise Exception("Download", f"Error {status} collection")
+        return j
+
+    def query(self, min_date, max_date, min_addeddate=None, collection=None, max_addeddate=None):
+        collection = self.collection_list if collection is None else collection
+        max_addeddate = max_date if max_addeddate is None else max_addeddate
+        if min_addeddate is None:
+            return f"collection:{collection} AND date:[{min_date} TO {max_date}]"
+        # max_addeddate = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+        return f"collection:{collection} AND date:[{min_date} TO {max_date}] AND addeddate:[{min_addeddate} TO {max_addeddate}]"
+
     def _get_chunk(self, year, cursor=None):
         """Get one chunk of a year's tape information.
 
@@ -803,7 +2886,7 @@ class IATapeDownloader(BaseTapeDownloader):
             parms["cursor"] = cursor
         query = f"collection:{self.collection_list} AND year:{year}"
         parms["q"] = query
-        r = requests.get(self.api, params=parms)
+        r = http_client.get(self.api, params=parms)
         logger.debug(f"url is {r.url}")
         if r.status_code != 200:
             logger.error(f"Error {r.status_code} collecting data")
@@ -911,8 +2994,12 @@ class PhishinArchive(BaseArchive):
         if with_latest:
             max_showdate = max(self.tape_dates.keys())
             logger.debug(f"Refreshing Tapes\nmax showdate {max_showdate}")
-            n_tapes = self.downloader.get_all_tapes(self.idpath, max_showdate)
-            if n_tapes > 0:
+            try:
+                n_tapes = self.downloader.get_all_tapes(self.idpath, max_showdate)
+            except CircuitOpenError as e:
+                logger.warning(f"Not refreshing tapes: {e}")
+                n_tapes = 0
+            if n_tapes and n_tapes > 0:
                 logger.debug(f"Phish.in Loaded {n_tapes} new tapes from archive")
         else:
             if len(self.tapes) > 0:  # The tapes have already been written, and nothing was added
@@ -937,6 +3024,7 @@ class PhishinArchive(BaseArchive):
                     chunk = json.load(open(os.path.join(self.idpath, filename), "r"))
                     # chunk = [t for t in chunk if any(x in self.collection_list for x in t['collection'])]
                     tapes.extend(chunk)
+            tapes = merge_period_tapes(tapes, [row for _, row in Journal(self.idpath).rows()])
         else:
             tapes = json.load(open(self.idpath, "r"))
             # addeddates.append(max([x['addeddate'] for x in tapes]))
@@ -986,8 +3074,7 @@ class PhishinTape(BaseTape):
         self.collection = ["Phish"]
         self.artist = "Phish"
         delattr(self, "id")
-        date = to_date(self.date).date()
-        self.meta_path = os.path.join(self.dbpath, str(date.year), str(date.month), self.identifier + ".json")
+        self.meta_path = metadata_path(self.dbpath, self.date, self.identifier)
         self.url_metadata = "https://phish.in/api/v1/shows/" + self.date
         try:
             self.apikey = open(os.path.join(os.getenv("HOME"), ".phishinkey"), "r").read().rstrip()
@@ -1009,27 +3096,18 @@ class PhishinTape(BaseTape):
     def get_metadata(self, only_if_cached=False):
         if self.meta_loaded:
             return
-        if only_if_cached and not os.path.exists(self.meta_path):
+        if only_if_cached and not metadata_cached(self.meta_path):
             return
         self._tracks = []
         try:  # I used to check if file exists, but it may also be corrupt, so this is safer.
-            page_meta = json.load(open(self.meta_path, "r"))
+            page_meta = read_cached_metadata(self.meta_path, slim_phishin_metadata)
+            MetadataCache.for_dbpath(self.dbpath).touch(self.meta_path)
         except Exception:
-            parms = self.parms.copy()
-            parms["page"] = 1
-            r = requests.get(self.url_metadata, headers=self.headers)
-            logger.debug(f"url is {r.url}")
-            if r.status_code != 200:
-                logger.warning(f"error pulling data for {self.identifier}")
-                raise Exception("Download", f"Error {r.status_code} url {self.url_metadata}")
-            try:
-                page_meta = r.json()
-            except ValueError:
-                logger.warning(f"Json Error {r.url}")
-                return None
-            except Exception:
-                logger.warning("Error getting metadata (json?)")
+            page_meta = self.download_metadata()
+            if page_meta is None:
                 return None
+            page_meta = slim_phishin_metadata(page_meta)
+            metadata_writer.write(self.meta_path, page_meta, dbpath=self.dbpath)
 
         if page_meta["total_pages"] > 1:
             logger.warning(
@@ -1046,8 +3124,6 @@ class PhishinTape(BaseTape):
                 current_set = set_name
             self._tracks.append(PhishinTrack(track_data, self.identifier))
 
-        os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
-        json.dump(page_meta, open(self.meta_path, "w"),indent=2)
         self.meta_loaded = True
         # return page_meta
         for track in self._tracks:
@@ -1056,6 +3132,30 @@ class PhishinTape(BaseTape):
             track.title = re.sub(r"(.flac)|(.mp3)|(.ogg)$", "", track.title).strip()
         return
 
+    def download_metadata(self):
+        """Download the metadata from phish.in. Returns None if it is not json."""
+        backend = async_backend()
+        if backend is not None:
+            return backend.run(self.async_download_metadata())
+        r = http_client.get(self.url_metadata, headers=self.headers)
+        logger.debug(f"url is {r.url}")
+        if r.status_code != 200:
+            logger.warning(f"error pulling data for {self.identifier}")
+            raise Exception("Download", f"Error {r.status_code} url {self.url_metadata}")
+        try:
+            return r.json()
+        except ValueError:
+            logger.warning(f"Json Error {r.url}")
+        except Exception:
+            logger.warning("Error getting metadata (json?)")
+
+    async def async_download_metadata(self):
+        status, page_meta = await async_backend().get_json(self.url_metadata, headers=self.headers)
+        if status != 200:
+            logger.warning(f"error pulling data for {self.identifier}")
+            raise Exception("Download", f"Error {status} url {self.url_metadata}")
+        return page_meta
+
 
 class PhishinTrack(BaseTrack):
     """A track from a Phishin recording"""
@@ -1198,15 +3298,18 @@ class LocalTape(BaseTape):
     def get_metadata(self, only_if_cached=False):
         if self.meta_loaded:
             return
-        if only_if_cached and not os.path.exists(self.meta_path):
+        if only_if_cached and not metadata_cached(self.meta_path):
             return
         self._tracks = []
-        if os.path.exists(self.meta_path):
+        page_meta = metadata_writer.get(self.meta_path)
+        changed = False  # only created or completed metadata is written
+        if page_meta is None and os.path.exists(self.meta_path):
             page_meta = json.load(open(self.meta_path, "r"))
-        else:  # I used to check if file exists, but it may also be corrupt, so this is safer.
+        elif page_meta is None:  # I used to check if file exists, but it may also be corrupt, so this is safer.
             logger.warning(f"creating metadata for {self.identifier} in {self.meta_path}")
             try:
                 page_meta = self.create_metadata()
+                changed = True
             except Exception as e:
                 logger.warning(e)
 
@@ -1220,6 +3323,7 @@ class LocalTape(BaseTape):
             track_meta["venue"] = {}
             track_meta["venue"]["venue_name"] = self.venue_name
             track_meta["venue"]["venue_location"] = self.venue_location
+            changed = True
         else:
             self.venue_name = track_meta["venue"].get("venue_name","Unknown")
             self.venue_location = track_meta["venue"].get("venue_location","Unknown")
@@ -1232,8 +3336,8 @@ class LocalTape(BaseTape):
                 current_set = set_name
             self._tracks.append(LocalTrack(track_data, self.identifier))
 
-        os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
-        json.dump(page_meta, open(self.meta_path, "w"),indent=2)
+        if changed:
+            metadata_writer.write(self.meta_path, page_meta, encode=encode_local_metadata)
         self.meta_loaded = True
         # return page_meta
         for track in self._tracks:
@@ -1376,11 +3480,7 @@ class LocalTape(BaseTape):
                 for i,audio_file in enumerate(audio_files):
                     page_meta["data"]["tracks"].append({"position":i+1,"set":set_num,"path":audio_file,"title":titles[i]})
 
-        try:
-            json.dump(page_meta,open(path,'w'),indent=2)
-            logger.info(f"Metadata written to {path}")
-        except Exception:
-            logger.warning(f"Failed to write metadata to {path}")
+        logger.info(f"Metadata for {path} created")
         return page_meta
 
 
@@ -1425,6 +3525,11 @@ class LocalTrack(BaseTrack):
 class GDArchive(BaseArchive):
     """The Grateful Dead Collection on Archive.org"""
 
+    load_workers = min(4, os.cpu_count() or 1)  # processes reading the tapes of several collections, see load_all_current_tapes
+    resort_k = 3  # tapes whose tracks are loaded by resort_tape_date
+    resort_deadline = 3.0  # seconds resort_tape_date waits for their metadata
+    resort_workers = 4  # threads loading the tracks of resort_tape_date, including those which are late
+
     def __init__(
         self,
         url="https://archive.org",
@@ -1447,29 +3552,232 @@ class GDArchive(BaseArchive):
         super().__init__(url, dbpath, reload_ids, with_latest, collection_list, date_range)
         self.archive_type = "Internet Archive"
         self.set_data = GDSetBreaks(self.collection_list)
+        self.score_cache = TapeScoreCache.for_dbpath(self.dbpath)
+        self.favored_tapers = None  # the FAVORED_TAPER option when the tapes were ranked
+        self.year_index = None  # see build_year_index
         self.date_range = date_range
+        self.memory_budget = None  # the bytes which the tapes could take when they were loaded, see fit_date_range
+        self.max_addeddates = {}  # meta_path: the latest addeddate of its tapes
+        self.provisional = {}  # date: Future of the order of its tapes, see resort_tape_date
+        self.loading = {}  # identifier: Future of the loading of its tracks, see resort_tape_date. Shared by clones.
+        self.resort_executor = ThreadPoolExecutor(max_workers=self.resort_workers, thread_name_prefix="resort")
+        self.resort_lock = Lock()
         self.load_archive(reload_ids, with_latest)
 
     def load_archive(self, reload_ids=False, with_latest=False):
+        if with_latest and not reload_ids and len(self.tapes) > 0:
+            self.update_archive()
+            return
+        self.fit_date_range()
+        rss = memory_model.rss()
         self.tapes = self.load_tapes(reload_ids, with_latest)
+        self.loaded_bytes = memory_model.rss() - rss
+        memory_model.record(len(self.tapes), self.loaded_bytes)
+        self.rescore()
+
+    def period_tapes(self):  # IA
+        """The number of tapes in each period (year or decade) of the ids files, from the headers of the tape
+        indexes, and the last year of each period"""
+        period_tapes = {}
+        last_years = {}
+        for meta_path in self.idpath:
+            yearly = isinstance(self.downloader, IATapeDownloader) and self.downloader.period_func(meta_path) is to_year
+            for source in TapeIndex.load_sources(meta_path):
+                period = period_of(source["name"])
+                if period is None:
+                    continue
+                period_tapes[period] = period_tapes.get(period, 0) + source["n_rows"]
+                last_years[period] = max(last_years.get(period, period), period if yearly else period + 9)
+        return period_tapes, last_years
+
+    def fit_date_range(self):  # IA
+        """Narrow the date_range to the longest run of its periods whose tapes fit in the memory budget, the latest
+        if there are several. The tapes of each period are estimated from the tape indexes with the memory_model,
+        so the date_range is left as it is if none of its periods are indexed yet. Returns the date_range."""
+        years = list(self.years_to_load())
+        period_tapes, last_years = self.period_tapes()
+        periods = sorted(period for period in period_tapes if period in years)
+        loaded_bytes = len(self.tapes) * memory_model.bytes_per_tape  # these are dropped when the new tapes are loaded
+        self.memory_budget = memory_model.budget(loaded_bytes)
+        estimates = [period_tapes[period] * memory_model.bytes_per_tape for period in periods]
+        if sum(estimates) <= self.memory_budget:
+            return self.date_range
+        best = (len(periods) - 1, len(periods) - 1)  # at least the latest period
+        lo = 0
+        total = 0
+        for hi, estimate in enumerate(estimates):
+            total = total + estimate
+            while total > self.memory_budget and lo < hi:
+                total = total - estimates[lo]
+                lo = lo + 1
+            if total <= self.memory_budget and hi - lo >= best[1] - best[0]:
+                best = (lo, hi)
+        first, last = periods[best[0]], min(last_years[periods[best[1]]], max(years))
+        if best[1] + 1 < len(periods):
+            last = min(last, periods[best[1] + 1] - 1)
+        logger.warning(
+            f"The tapes of {years[0]}-{years[-1]} would take {sum(estimates):.0f} bytes, more than the budget of "
+            f"{self.memory_budget} bytes. Loading {first}-{last}"
+        )
+        self.date_range = [first, last] if len(self.date_range) <= 2 else [year for year in years if first <= year <= last]
+        return self.date_range
+
+    def diagnostics(self):  # IA
+        """The memory budget and the measured bytes of the loaded tapes, with the memory model"""
+        return {
+            "date_range": self.date_range,
+            "budget_bytes": self.memory_budget,
+            "tapes": len(self.tapes),
+            "measured_bytes": getattr(self, "loaded_bytes", None),
+            "memory_model": memory_model.diagnostics(),
+        }
+
+    def rescore(self):  # IA
+        """Score and rank all of the tapes, with the current PLAY_LOSSLESS option"""
         sort_within = True
         if "georgeblood" in self.collection_list:
             sort_within = False
+        self.score_cache.check_options()
         self.tape_dates = self.get_tape_dates(sort_within=sort_within)
         self.dates = sorted(self.tape_dates.keys())
+        self.score_cache.save()
+
+    def get_tape_dates(self, sort_within=True):  # IA
+        """Group the tapes by date. When sorting, all of the tapes are scored at once by batch_scores"""
+        self.year_index = None
+        if sort_within:
+            self.favored_tapers = favored_taper_matcher().tapers
+        if not sort_within or np is None or len(self.tapes) == 0:
+            return super().get_tape_dates(sort_within)
+        try:
+            scores = batch_scores(self.tapes)
+        except Exception as e:
+            logger.exception(f"{e}")
+            logger.warning("Failed to score tapes as a batch")
+            return super().get_tape_dates(sort_within)
+        date_ints = [t.table.date[t.row] if isinstance(t, GDTapeRow) else date_to_int(t.date) for t in self.tapes]
+        order = np.lexsort((-scores, np.array(date_ints)))
+        date_lists = {date: [] for date in dict.fromkeys(date_ints)}  # dates in order of their first tape
+        for i in order.tolist():
+            date_lists[date_ints[i]].append(self.tapes[i])
+        self.tape_dates = {int_to_date(date): tapes for date, tapes in date_lists.items()}
+        return self.tape_dates
+
+    def rerank_favored_tapers(self):  # IA
+        """Re-rank the dates with a tape whose FAVORED_TAPER points changed since the tapes were ranked.
+        Returns the re-ranked dates."""
+        matcher = favored_taper_matcher()
+        if self.favored_tapers is None or matcher.tapers == self.favored_tapers:
+            return []
+        old_matcher = TaperMatcher(self.favored_tapers)
+        self.favored_tapers = matcher.tapers
+        if np is None:
+            changed = {t.date for t in self.tapes if old_matcher.points(t.identifier) != matcher.points(t.identifier)}
+        else:
+            changed = set()
+            tables = {id(t.table): t.table for t in self.tapes}
+            for table in tables.values():
+                old_points = table.taper_points_column(old_matcher)
+                rows = np.flatnonzero(table.taper_points_column(matcher) != old_points)
+                changed.update(int_to_date(table.date[i]) for i in rows.tolist())
+        dates = sorted(changed.intersection(self.tape_dates.keys()))
+        for date in dates:
+            tapes = self.tape_dates[date]
+            self.tape_dates[date] = [tapes[i] for i in rank_tapes(tapes)]
+        self.update_year_index(dates)
+        logger.info(f"FAVORED_TAPER changed, re-ranked {len(dates)} dates")
+        return dates
 
     def resort_tape_date(self, date):  # IA
-        """archive.org version of this method"""
+        """archive.org version of this method.
+
+        The tracks of the first resort_k tapes are loaded concurrently, to decrease the score of those without
+        titles, waiting at most resort_deadline seconds. Tapes whose metadata is late are ranked by their cached or
+        base score, and the order is provisional: provisional[date] is then a Future of the order once all of the
+        metadata has arrived. When it does, the order is applied to tape_dates[date], unless another date has been
+        selected since, or the knobs have moved on (see drop_provisional).
+        The tracks are loaded by the resort_executor, and a tape which is still loading from an earlier call is
+        not loaded again.
+        """
         if isinstance(date, datetime.date):
             date = date.strftime("%Y-%m-%d")
         if date not in self.dates:
             return [None]
+        self.drop_provisional(keep=date)
         tapes = self.tape_dates[date]
-        _ = [t.tracks() for t in tapes[:3]]  # load first 3 tapes' tracks. Decrease score of those without titles.
-        tapes = sorted(tapes, key=methodcaller("compute_score"), reverse=True)
+        futures = [self.load_tracks(t) for t in tapes[: self.resort_k] if not t.meta_loaded]
+        done, late = wait(futures, timeout=self.resort_deadline)
+        for future in done:
+            future.result()
+        ranked = self.rank_tape_date(date)
+        if len(late) > 0:
+            logger.info(f"The order of the tapes on {date} is provisional, {len(late)} tapes are still loading")
+            self.refine_when_loaded(date, late)
+        else:
+            self.provisional.pop(date, None)
+        return ranked
+
+    def load_tracks(self, tape):  # IA
+        """A Future of the loading of the tracks of tape by the resort_executor"""
+        with self.resort_lock:
+            future = self.loading.get(tape.identifier)
+            if future is None:
+                future = self.resort_executor.submit(load_tracks, materialize(tape))
+                self.loading[tape.identifier] = future
+                future.add_done_callback(lambda f: self.loading.pop(tape.identifier, None))
+        return future
+
+    def refine_when_loaded(self, date, futures):  # IA
+        """Set provisional[date] to a Future of the order of the tapes of date, once the futures loading their
+        tracks are done. The order is worked out by whichever thread finishes the last of them."""
+        refined = Future()
+        refined.set_running_or_notify_cancel()
+        with self.resort_lock:
+            self.provisional[date] = refined
+        remaining = [len(futures)]
+        lock = Lock()
+
+        def loaded(_):
+            with lock:
+                remaining[0] = remaining[0] - 1
+                if remaining[0] > 0:
+                    return
+            try:
+                refined.set_result(self.refine_tape_date(date, refined))
+            except Exception as e:
+                refined.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(loaded)
+        return refined
+
+    def rank_tape_date(self, date):  # IA
+        tapes = self.tape_dates.get(date, [])
+        tapes = [materialize(tapes[i]) for i in rank_tapes(tapes)]
         tapes = [t for t in tapes if not t._remove_from_archive]  # eliminate missing tapes
+        self.score_cache.save()
         return tapes
 
+    def refine_tape_date(self, date, refined):  # IA
+        """The order of the tapes of date, now that their metadata has arrived. It is applied to tape_dates[date],
+        if refined is still the provisional order of the date."""
+        tapes = self.rank_tape_date(date)
+        with self.resort_lock:
+            if self.provisional.get(date) is not refined:
+                logger.debug(f"Dropped the refined order of the tapes on {date}")
+                return tapes
+            date_tapes = self.tape_dates.get(date, [])
+            self.tape_dates[date] = [date_tapes[i] for i in rank_tapes(date_tapes)]
+            del self.provisional[date]
+        logger.info(f"Refined the order of the tapes on {date}")
+        return tapes
+
+    def drop_provisional(self, keep=None):  # IA
+        """Forget the provisional orders of all dates but keep, whose refined orders are then not applied"""
+        with self.resort_lock:
+            for date in [d for d in self.provisional if d != keep]:
+                del self.provisional[date]
+
     def best_tape(self, date, resort=True):  # IA
         """archive.org version of this method"""
         if isinstance(date, datetime.date):
@@ -1480,120 +3788,491 @@ class GDArchive(BaseArchive):
         if resort:
             tapes = self.resort_tape_date(date)
         else:
-            tapes = self.tape_dates[date]
-        return tapes[0]
-
+            tapes = self.tape_dates[date]
+        return materialize(tapes[0])
+
+
+    def load_current_tapes(self, reload_ids=False, meta_path=None):  # IA
+        """Load current tapes or download them from archive.org if they are not already loaded
+        Returns a TapeIndex holding the tapes of collection_list in self.date_range, and the max addeddate
+        """
+        logger.debug("Loading current tapes")
+        meta_path = self.idpath if meta_path is None else meta_path
+        self.download_missing_tapes(reload_ids, meta_path)
+        return self.read_current_tapes(meta_path)
+
+    def download_missing_tapes(self, reload_ids, meta_path):  # IA
+        """Download the tapes of meta_path if they are missing, incomplete or to be reloaded"""
+        collection_path = os.path.join(os.getenv('HOME'), ".etree_collection_names.json")
+        yearly_collections = ["etree", "georgeblood"]  # should this be in config?
+
+        years_to_load = self.years_to_load()
+
+        recover_reload(meta_path)
+        all_meta_files = os.listdir(meta_path) if os.path.exists(meta_path) else []
+        all_meta_files = [x for x in all_meta_files if x.endswith(".json")]
+        meta_files = [x for x in all_meta_files if int(os.path.splitext(x)[0].split("_")[-1]) in years_to_load]
+        interrupted = DownloadCheckpoint.load(staging_path(meta_path), self.date_range) is not None
+
+        if reload_ids or interrupted or len(all_meta_files) == 0:
+            # Download into a staging folder, which replaces meta_path when it is complete. See reload_all_tapes
+            logger.info(f"{'Resuming loading' if interrupted else 'Loading'} Tapes from the Archive...this will take a few minutes")
+            try:
+                n_tapes = self.downloader.reload_all_tapes(meta_path, date_range=self.date_range)
+                if n_tapes > 0:
+                    logger.info(f"Loaded {n_tapes} tapes from archive {meta_path}")
+            except Exception as e:
+                if len(meta_files) == 0:
+                    raise
+                logger.warning(f"Failed to reload {meta_path}, keeping the tapes we have: {e}")
+
+        elif len(meta_files) == 0:
+            logger.info("Loading Tapes from the Archive...this will take a few minutes")
+            n_tapes = self.downloader.get_all_tapes(
+                meta_path, date_range=self.date_range
+            )  # this will write chunks to folder
+            if n_tapes > 0:
+                logger.info(f"Loaded {n_tapes} tapes from archive {meta_path}")
+
+        elif (len(meta_files) < len(years_to_load)) and os.path.basename(meta_path).replace(
+            "_ids", ""
+        ) in yearly_collections:
+            for year in years_to_load:
+                if len([x for x in meta_files if f"{year}" in x]) == 0:
+                    n_tapes = self.downloader.get_all_tapes(meta_path, date_range=[year])
+
+        if reload_ids or not os.path.exists(collection_path) and meta_path.endswith("etree_ids"):
+            logger.info("Loading collection names from archive.org")
+            try:
+                self.downloader.save_all_collection_names()
+            except Exception as e:
+                logger.warning(f"Error saving all collection_names {e}")
+
+    def read_current_tapes(self, meta_path):  # IA
+        """The tapes of meta_path which are already on disk, as returned by load_current_tapes"""
+        if os.path.isdir(meta_path):
+            return read_tape_index(meta_path, list(self.years_to_load()), self.collection_list)
+        tapes = json.load(open(meta_path, "r"))
+        max_addeddate = max([x["addeddate"] for x in tapes])
+        tapes = [t for t in tapes if any(x in self.collection_list for x in t["collection"])]
+        tapes = TapeIndex.from_rows(os.path.dirname(meta_path), tapes)
+        return (tapes, max_addeddate if len(tapes) > 0 else None)
+
+    def load_all_current_tapes(self, reload_ids=False):  # IA
+        """load_current_tapes for each path of idpath. Returns a dict of meta_path: the result of load_current_tapes.
+
+        When the tape indexes of several collections are stale, e.g. after a download, the json of their files is
+        parsed in a process pool of up to load_workers processes, each of which saves its index. The tapes are
+        then read from the saved indexes here, so nothing is sent back from the processes. Current indexes are
+        only read here, since reading an index is faster than starting a process.
+        """
+        for meta_path in self.idpath:  # downloads stay in this process
+            self.download_missing_tapes(reload_ids, meta_path)
+        stale = [meta_path for meta_path in self.idpath if not TapeIndex.is_current(meta_path)]
+        workers = min(self.load_workers, len(stale))
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(refresh_tape_index, stale))
+            except BrokenProcessPool as e:
+                logger.warning(f"Failed to index the tapes in parallel, indexing them serially: {e}")
+        return {meta_path: self.read_current_tapes(meta_path) for meta_path in self.idpath}
+
+    def load_tapes(self, reload_ids=False, with_latest=False):  # IA
+        """Load the tapes, then add anything which has been added since the tapes were saved"""
+        logger.debug("begin loading tapes")
+        all_tapes_count = 0
+        all_loaded_tables = []
+        current_tapes = self.load_all_current_tapes(reload_ids)
+        for meta_path in self.idpath:
+            n_tapes = 0
+            loaded_tapes, max_addeddate = current_tapes[meta_path]
+            if len(loaded_tapes) == 0:  # e.g. in case of an invalid collection
+                continue
+            self.max_addeddates[meta_path] = max_addeddate
+            logger.debug(f"max addeddate {max_addeddate}")
+            if with_latest:
+                n_tapes = self.download_latest(meta_path)
+            if n_tapes > 0:
+                logger.info(f"Adding {n_tapes} tapes")
+                loaded_tapes, self.max_addeddates[meta_path] = self.load_current_tapes(meta_path=meta_path)
+            all_loaded_tables.append(loaded_tapes)
+            all_tapes_count = all_tapes_count + n_tapes
+        if (all_tapes_count == 0) and (
+            len(self.tapes) > 0
+        ):  # The tapes have already been written, and nothing was added
+            return self.tapes
+        # GDTapes are only built from these rows when they are needed. See GDTapeRow.
+        self.tapes = [GDTapeRow(self, table, i) for table in all_loaded_tables for i in range(len(table))]
+        return self.tapes
+
+    def clone(self):  # IA
+        archive = super().clone()
+        archive.max_addeddates = dict(self.max_addeddates)
+        archive.provisional = {}
+        if self.year_index is not None:
+            archive.year_index = dict(self.year_index)
+            archive.date_seq = dict(self.date_seq)
+        return archive
+
+    def drop_collection(self, collection):  # IA
+        dates = super().drop_collection(collection)
+        self.max_addeddates = {path: d for path, d in self.max_addeddates.items() if path in self.idpath}
+        self.set_data = GDSetBreaks(self.collection_list)
+        if len(dates) > 0:
+            self.year_index = None  # the dates have moved, so it is rebuilt when it is next needed
+        return dates
+
+    def download_latest(self, meta_path):  # IA
+        """Download the tapes of meta_path added since its max addeddate. Returns the number of tapes added."""
+        n_tapes = 0
+        max_addeddate = self.max_addeddates[meta_path]
+        min_download_addeddate = (datetime.datetime.fromisoformat(max_addeddate[:-1])) - datetime.timedelta(hours=1)
+        # min_download_addeddate = datetime.datetime.strftime(min_download_addeddate, "%Y-%m-%dT%H:%M:%SZ")
+        logger.debug(f"Refreshing Tapes\nmax addeddate {max_addeddate}\nmin_download_addeddate {min_download_addeddate}")
+        try:
+            n_tapes = self.downloader.get_all_tapes(meta_path, min_download_addeddate)
+        except CircuitOpenError as e:  # keep the tapes we have
+            logger.warning(f"Not refreshing {meta_path}: {e}")
+        if n_tapes > 0:
+            logger.info(f"Loaded {n_tapes} new tapes from archive {meta_path}")
+        return n_tapes
+
+    def update_archive(self):  # IA
+        """Download the tapes added since the archive was loaded, and apply them in place. Returns the dates which
+        changed."""
+        rows = []
+        years = self.years_to_load()
+        for meta_path in self.idpath:
+            if self.max_addeddates.get(meta_path) is None:
+                continue
+            self.downloader.track_delta(meta_path)
+            try:
+                self.download_latest(meta_path)
+            finally:
+                delta = self.downloader.take_delta(meta_path)
+            if len(delta) > 0:
+                self.max_addeddates[meta_path] = max([self.max_addeddates[meta_path]] + [row["addeddate"] for row in delta if "addeddate" in row])
+            rows.extend(
+                row
+                for row in delta
+                if to_year(row["date"]) in years
+                and any(c in self.collection_list for c in ([row["collection"]] if isinstance(row["collection"], str) else row["collection"]))
+            )
+        return self.apply_delta(rows)
+
+    def apply_delta(self, rows):  # IA
+        """Add the tapes of rows, the raw json of new or changed tapes, to the archive in place, replacing any tapes
+        of the same identifiers on their dates. Only the dates of the rows are re-ranked.
+        Returns the dates which changed."""
+        if len(rows) == 0:
+            return []
+        rows = list({row["identifier"]: row for row in rows}.values())
+        table = TapeIndex.from_rows(os.path.dirname(self.idpath[0]), rows)
+        new_tapes = [GDTapeRow(self, table, i) for i in range(len(table))]
+        identifiers = {t.identifier for t in new_tapes}
+        replaced = set()
+        new_dates = []
+        date_tapes = {}
+        for t in new_tapes:
+            date_tapes.setdefault(t.date, []).append(t)
+        for date, added in date_tapes.items():
+            if date in self.tape_dates:
+                tapes = self.tape_dates[date]
+                replaced.update(id(t) for t in tapes if t.identifier in identifiers)
+                tapes = [t for t in tapes if t.identifier not in identifiers] + added
+            else:
+                tapes = added
+                new_dates.append(date)
+            if "georgeblood" not in self.collection_list:  # see load_archive
+                tapes = [tapes[i] for i in rank_tapes(tapes)]
+            self.tape_dates[date] = tapes
+        if len(replaced) > 0:
+            self.tapes = [t for t in self.tapes if id(t) not in replaced]
+        self.tapes.extend(new_tapes)
+        for date in new_dates:
+            bisect.insort(self.dates, date)
+        if len(new_dates) > 0:
+            self.year_index = None  # the dates have moved, so it is rebuilt when it is next needed
+        else:
+            self.update_year_index(date_tapes.keys())
+        self.score_cache.save()
+        logger.info(f"Added {len(new_tapes) - len(replaced)} tapes and replaced {len(replaced)} on {len(date_tapes)} dates")
+        return sorted(date_tapes)
+
+    def years_to_load(self):  # IA
+        """The years of the tapes of the archive"""
+        if not self.date_range:
+            self.date_range = [1880, datetime.datetime.now().year]
+        elif isinstance(self.date_range, int):
+            self.date_range = [self.date_range]
+        return range(min(self.date_range), max(self.date_range) + 1) if len(self.date_range) <= 2 else self.date_range
+
+    @classmethod
+    def compose(cls, shards):  # IA
+        """A GDArchive of the tapes of GDArchives with different years, eg the shards of a YearShardCache.
+        The shards are not modified."""
+        archive = copy.copy(shards[0])
+        archive.tapes = [t for shard in shards for t in shard.tapes]
+        archive.tape_dates = {date: list(tapes) for shard in shards for date, tapes in shard.tape_dates.items()}
+        archive.dates = sorted(archive.tape_dates.keys())
+        archive.date_range = sorted({year for shard in shards for year in shard.date_range})
+        archive.provisional = {}
+        archive.year_index = {}
+        archive.date_seq = {}
+        for shard in shards:
+            if shard.year_index is None:
+                shard.build_year_index()
+            offset = len(archive.date_seq)
+            archive.date_seq.update((date, seq + offset) for date, seq in shard.date_seq.items())
+            for year, artists in shard.year_index.items():
+                archive.year_index[year] = {
+                    artist: [(seq + offset, t) for seq, t in tapes] for artist, tapes in artists.items()
+                }
+        return archive
+
+    def build_year_index(self):  # IA
+        """Index the tapes of tape_dates by year and artist, for year_artists.
+
+        year_index[year][artist] is a list of (date_seq[date], tape), in the order of tape_dates, where date_seq
+        is the position of the date in tape_dates. The index is dropped when the tapes are grouped by date again,
+        and rebuilt when it is next needed.
+        """
+        self.year_index = {}
+        self.date_seq = {}
+        self.update_year_index(self.tape_dates.keys())
+
+    def update_year_index(self, dates):  # IA
+        """Re-index the years of dates, after the tapes of those dates changed"""
+        if self.year_index is None:
+            return
+        years = {int(date[:4]) for date in dates}
+        for year in years:
+            self.year_index[year] = {}
+        for date, tapes in self.tape_dates.items():
+            year = int(date[:4])
+            if year not in years:
+                continue
+            seq = self.date_seq.setdefault(date, len(self.date_seq))
+            artists = self.year_index[year]
+            for t in tapes:
+                artist = artist_key(t.identifier)
+                if artist is not None:
+                    artists.setdefault(artist, []).append((seq, t))
+
+    def year_artists(self, year, other_year=None):
+        """A dict of artist: tapes, for the tapes from year to other_year"""
+        if self.year_index is None:
+            self.build_year_index()
+        other_year = other_year if other_year else year
+        start_year, end_year = sorted([year, other_year])
+        year_artists = [self.year_index[y] for y in range(start_year, end_year + 1) if y in self.year_index]
+        n_tapes = sum(len(tapes) for artists in year_artists for tapes in artists.values())
+        logger.info(f"Select artists between {start_year} and {end_year}. There are {n_tapes} tapes")
+
+        buckets = {}
+        for artists in year_artists:
+            for artist, tapes in artists.items():
+                buckets.setdefault(artist, []).append(tapes)
+        id_dict = {}
+        for artist, bucket in buckets.items():
+            tapes = bucket[0] if len(bucket) == 1 else heapq.merge(*bucket, key=itemgetter(0))
+            id_dict[artist] = [t for _, t in tapes]
+        return id_dict
+
+
+def artist_key(identifier):
+    """The artist of a georgeblood identifier, eg "78_song-title_first-last-other-names_label" -> "first last".
+    Returns None if the identifier has no artist"""
+    parts = identifier.split("_")
+    if len(parts) < 3:
+        return None
+    return " ".join(parts[2].split("-")[:2])
+
+
+class TaperMatcher:
+    """The FAVORED_TAPER option, compiled.
+
+    tapers is a tuple of (lowercase taper, points). A tape gets the points of every taper which appears in its
+    identifier, ignoring case. One regex of all the tapers finds the identifiers which contain any of them,
+    and only those are checked taper by taper.
+    """
+
+    def __init__(self, tapers):
+        self.tapers = tapers
+        self.regex = re.compile("(?=" + "|".join(re.escape(taper) for taper, _ in tapers) + ")") if tapers else None
+
+    def __repr__(self):
+        return f"TaperMatcher {self.tapers}"
+
+    def points(self, identifier):
+        points_total = 0
+        if self.regex is None:
+            return points_total
+        identifier = identifier.lower()
+        if self.regex.search(identifier) is None:
+            return points_total
+        for taper, points in self.tapers:
+            if taper in identifier:
+                points_total = points_total + points
+        return points_total
+
+
+_taper_matcher = TaperMatcher(())
+
+
+def favored_taper_matcher():
+    """The TaperMatcher of the current FAVORED_TAPER option. It is only recompiled when the option changes."""
+    global _taper_matcher
+    fav_taper = getattr(config, "optd", {}).get("FAVORED_TAPER", [])
+    if isinstance(fav_taper, str):
+        fav_taper = [fav_taper]
+    if isinstance(fav_taper, (list, tuple)):
+        fav_taper = {x: 1 for x in fav_taper}
+    tapers = tuple((taper.lower(), float(points)) for taper, points in fav_taper.items())
+    if tapers != _taper_matcher.tapers:
+        _taper_matcher = TaperMatcher(tapers)
+    return _taper_matcher
+
+
+def favored_taper_points(identifier):
+    """The points given to a tape by the FAVORED_TAPER option"""
+    return favored_taper_matcher().points(identifier)
+
+
+def popularity_score(score, download_rate, downloads, avg_rating, num_reviews):
+    """Add the download and rating parts of the tape score to score"""
+    score = score + download_rate
+    score = score + math.log(1 + downloads)
+    score = score + 0.5 * (
+        avg_rating - 2.0 / math.sqrt(num_reviews)
+    )  # down-weigh avg_rating: it's usually about the show, not the tape.
+    return score
+
+
+def now_microseconds():
+    return (datetime.datetime.now() - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def row_scores(table, rows, score_cache):
+    """Vectorized GDTapeRow.compute_score for rows of a TapeIndex.
+
+    Returns an array of scores, and a boolean array which is True for the rows whose cached metadata has
+    to be scored by a GDTape -- their scores are not valid. The arithmetic follows GDTape.compute_score
+    step by step, so that the scores (and hence the order of the tapes) are the same.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    n = len(rows)
+    identifiers = [table.identifier(i) for i in rows]
+    title_points = np.zeros(n)
+    track_points = np.zeros(n)
+    removed = np.zeros(n, dtype=bool)
+    pending = np.zeros(n, dtype=bool)
+    for k, identifier in enumerate(identifiers):
+        entry = score_cache.get(identifier)
+        if entry is None:
+            continue
+        if len(entry) == 1:
+            pending[k] = True
+        elif entry[1]:
+            removed[k] = True
+        else:
+            title_points[k] = entry[2]
+            track_points[k] = entry[3]
+    taper_points = table.taper_points_column(favored_taper_matcher())[rows]
+    downloads = table.column("downloads")[rows]
+    downloads = np.where(downloads < 0, 1, downloads)
+    num_reviews = table.column("num_reviews")[rows]
+    num_reviews = np.where(num_reviews < 0, 1, num_reviews)
+    avg_rating = table.column("avg_rating")[rows]
+    avg_rating = np.where(np.isnan(avg_rating), 2.0, avg_rating)
+    days = (now_microseconds() - table.column("addeddate")[rows] * 1_000_000) // 86_400_000_000
+    download_rate = downloads / np.maximum(100, days)
+
+    score = 3.0 + 10.0 * table.stream_only_column()[rows]
+    score = score + taper_points
+    score = score + title_points
+    score = score + track_points
+    score = score + download_rate
+    score = score + np.array([math.log(1 + x) for x in downloads.tolist()])  # np.log can differ from math.log in the last bit
+    score = score + 0.5 * (avg_rating - 2.0 / np.sqrt(num_reviews))
+    score[removed] = -1
+    return score, pending
+
+
+def batch_scores(tapes):
+    """The scores of a list of tapes, the same as [t.compute_score() for t in tapes].
+
+    GDTapeRows which have not been built into a GDTape are scored together from their columns with
+    numpy. Any other tapes are scored one at a time.
+    """
+    if np is None:
+        return [t.compute_score() for t in tapes]
+    scores = np.empty(len(tapes))
+    groups = {}
+    for k, t in enumerate(tapes):
+        if isinstance(t, GDTapeRow) and t._tape is None:
+            table, positions, rows = groups.setdefault(id(t.table), (t.table, [], []))
+            positions.append(k)
+            rows.append(t.row)
+        else:
+            scores[k] = t.compute_score()
+    for table, positions, rows in groups.values():
+        score_cache = tapes[positions[0]].archive.score_cache
+        table_scores, pending = row_scores(table, rows, score_cache)
+        scores[positions] = table_scores
+        for k in np.flatnonzero(pending):
+            scores[positions[k]] = tapes[positions[k]].compute_score()
+    return scores
+
+
+def rank_tapes(tapes):
+    """The permutation which puts tapes in order of score, highest first.
+    Like sorted(tapes, key=methodcaller("compute_score"), reverse=True), ties keep their order.
+    """
+    scores = batch_scores(tapes)
+    if np is None:
+        return sorted(range(len(tapes)), key=scores.__getitem__, reverse=True)
+    return np.argsort(-scores, kind="stable").tolist()
 
-    def load_current_tapes(self, reload_ids=False, meta_path=None):  # IA
-        """Load current tapes or download them from archive.org if they are not already loaded"""
-        logger.debug("Loading current tapes")
-        meta_path = self.idpath if meta_path is None else meta_path
-        tapes = []
-        addeddates = []
-        collection_path = os.path.join(os.getenv('HOME'), ".etree_collection_names.json")
-        yearly_collections = ["etree", "georgeblood"]  # should this be in config?
 
-        if not self.date_range:
-            self.date_range = [1880, datetime.datetime.now().year]
-        elif isinstance(self.date_range, int):
-            self.date_range = [self.date_range]
-        years_to_load = (
-            range(min(self.date_range), max(self.date_range) + 1) if len(self.date_range) <= 2 else self.date_range
-        )
+def load_tracks(tape):
+    """Load the tracks of a tape, if archive.org is responding. Otherwise it is scored with the cached metadata."""
+    try:
+        tape.tracks()
+    except CircuitOpenError:
+        pass
 
-        meta_files = os.listdir(meta_path) if os.path.exists(meta_path) else []
-        meta_files = [x for x in meta_files if x.endswith(".json")]
-        meta_files = [x for x in meta_files if int(os.path.splitext(x)[0].split("_")[-1]) in years_to_load]
 
-        if reload_ids or len(meta_files) == 0:
-            if reload_ids:
-                os.system(f"rm -rf {meta_path}")
-            logger.info("Loading Tapes from the Archive...this will take a few minutes")
-            n_tapes = self.downloader.get_all_tapes(
-                meta_path, date_range=self.date_range
-            )  # this will write chunks to folder
-            if n_tapes > 0:
-                logger.info(f"Loaded {n_tapes} tapes from archive {meta_path}")
+def materialize(tape):
+    """Return the GDTape behind a GDTapeRow, or the tape itself"""
+    return tape.tape() if isinstance(tape, GDTapeRow) else tape
 
-        elif (len(meta_files) < len(years_to_load)) and os.path.basename(meta_path).replace(
-            "_ids", ""
-        ) in yearly_collections:
-            for year in years_to_load:
-                if len([x for x in meta_files if f"{year}" in x]) == 0:
-                    n_tapes = self.downloader.get_all_tapes(meta_path, date_range=[year])
 
-        if reload_ids or not os.path.exists(collection_path) and meta_path.endswith("etree_ids"):
-            logger.info("Loading collection names from archive.org")
-            try:
-                self.downloader.save_all_collection_names()
-            except Exception as e:
-                logger.warning(f"Error saving all collection_names {e}")
-        # loop over chunks -- get max addeddate before filtering collections.
-        if os.path.isdir(meta_path):
-            for filename in os.listdir(meta_path):
-                if filename.endswith(".json"):
-                    time_period = int(filename.split("_")[-1].replace(".json", ""))
-                    # if min_year <= time_period <= max_year:
-                    if time_period in years_to_load:
-                        logger.debug(f"loading time period {time_period}")
-                        chunk = json.load(open(os.path.join(meta_path, filename), "r"))
-                        addeddates.append(max([x["addeddate"] for x in chunk]))
-                        chunk = [t for t in chunk if any(x in self.collection_list for x in t["collection"])]
-                        tapes.extend(chunk)
-        else:
-            tapes = json.load(open(meta_path, "r"))
-            addeddates.append(max([x["addeddate"] for x in tapes]))
-            tapes = [t for t in tapes if any(x in self.collection_list for x in t["collection"])]
-        max_addeddate = max(addeddates) if len(tapes) > 0 else None
-        return (tapes, max_addeddate)
+async def async_fetch_metadata(tapes):
+    """Load the metadata of the tapes concurrently. Returns the number of tapes which failed."""
+    results = await asyncio.gather(*[materialize(tape).async_get_metadata() for tape in tapes], return_exceptions=True)
+    failures = [(tape, e) for tape, e in zip(tapes, results) if isinstance(e, Exception)]
+    for tape, e in failures:
+        logger.warning(f"Failed to get metadata of {tape.identifier}: {e}")
+    return len(failures)
 
-    def load_tapes(self, reload_ids=False, with_latest=False):  # IA
-        """Load the tapes, then add anything which has been added since the tapes were saved"""
-        logger.debug("begin loading tapes")
-        all_tapes_count = 0
-        all_loaded_tapes = []
-        for meta_path in self.idpath:
-            n_tapes = 0
-            loaded_tapes, max_addeddate = self.load_current_tapes(reload_ids, meta_path=meta_path)
-            if len(loaded_tapes) == 0:  # e.g. in case of an invalid collection
-                continue
-            logger.debug(f"max addeddate {max_addeddate}")
-            if with_latest:
-                min_download_addeddate = (datetime.datetime.fromisoformat(max_addeddate[:-1])) - datetime.timedelta(
-                    hours=1
-                )
-                # min_download_addeddate = datetime.datetime.strftime(min_download_addeddate, "%Y-%m-%dT%H:%M:%SZ")
-                logger.debug(
-                    f"Refreshing Tapes\nmax addeddate {max_addeddate}\nmin_download_addeddate {min_download_addeddate}"
-                )
-                n_tapes = self.downloader.get_all_tapes(meta_path, min_download_addeddate)
-                if n_tapes > 0:
-                    logger.info(f"Loaded {n_tapes} new tapes from archive {meta_path}")
-            if n_tapes > 0:
-                logger.info(f"Adding {n_tapes} tapes")
-                loaded_tapes, _ = self.load_current_tapes(meta_path=meta_path)
-            all_loaded_tapes.extend(loaded_tapes)
-            all_tapes_count = all_tapes_count + n_tapes
-        if (all_tapes_count == 0) and (
-            len(self.tapes) > 0
-        ):  # The tapes have already been written, and nothing was added
-            return self.tapes
-        self.tapes = [GDTape(self.dbpath, tape, self.set_data, self.collection_list) for tape in all_loaded_tapes]
-        return self.tapes
 
-    def year_artists(self, year, other_year=None):
-        """NOTE: should use some caching here"""
-        id_dict = {}
-        other_year = other_year if other_year else year
-        start_year, end_year = sorted([year, other_year])
-        year_tapes = {k: v for k, v in self.tape_dates.items() if start_year <= int(k[:4]) <= end_year}
-        logger.info(f"Select artists between {start_year} and {end_year}. There are {len(year_tapes)} tapes")
+def fetch_metadata(tapes):
+    """Load the metadata of many tapes, downloading up to http_client.pool_size at a time when aiohttp is
+    installed. Returns the number of tapes which failed."""
+    backend = async_backend()
+    if backend is not None:
+        return backend.run(async_fetch_metadata(tapes))
+    n_failed = 0
+    for tape in tapes:
+        try:
+            tape.get_metadata()
+        except Exception as e:
+            logger.warning(f"Failed to get metadata of {tape.identifier}: {e}")
+            n_failed = n_failed + 1
+    return n_failed
 
-        tapes = [item for sublist in year_tapes.values() for item in sublist]
-        kvlist = [(" ".join(x.identifier.split("_")[2].split("-")[:2]), x) for x in tapes]
-        for kv in kvlist:
-            id_dict.setdefault(kv[0], []).append(kv[1])
-        return id_dict
 
 class GDTape(BaseTape):
     """A Grateful Dead Identifier Item -- does not contain tracks"""
@@ -1601,6 +4280,8 @@ class GDTape(BaseTape):
     def __init__(self, dbpath, raw_json, set_data, collection_list):
         super().__init__(dbpath, raw_json, set_data)
         self.meta_loaded = False
+        self.meta_lock = RLock()  # held while the metadata is loaded, which may be in another thread
+        self._meta_points = None
         self.venue_name = None
         self.coverage = None
         attribs = ["date", "identifier", "avg_rating", "format", "collection", "num_reviews", "downloads", "addeddate"]
@@ -1624,8 +4305,7 @@ class GDTape(BaseTape):
             colls[min([colls.index(c) if c in colls else 100 for c in self.collection])] if len(colls) > 1 else colls[0]
         )
         self.set_data = set_data.get_date(self.artist, self.date)
-        date = to_date(self.date).date()
-        self.meta_path = os.path.join(self.dbpath, str(date.year), str(date.month), self.identifier + ".json")
+        self.meta_path = metadata_path(self.dbpath, self.date, self.identifier)
 
         self.avg_rating = float(raw_json.get("avg_rating", 2))
         self.num_reviews = int(raw_json.get("num_reviews", 1))
@@ -1642,29 +4322,50 @@ class GDTape(BaseTape):
         score = 3
         if self.stream_only():
             score = score + 10
-        if "optd" in dir(config):
-            fav_taper = config.optd.get("FAVORED_TAPER",[])
-            if isinstance(fav_taper,str):
-                fav_taper = [fav_taper]
-            if isinstance(fav_taper,(list,tuple)):
-                fav_taper = {x:1 for x in fav_taper}
-            if len(fav_taper) > 0:
-                for taper, points in fav_taper.items():
-                    if taper.lower() in self.identifier.lower():
-                        score = score + float(points)
-        self.get_metadata(only_if_cached=True)
-        if self.meta_loaded:
-            if not self.contains_sound():
+        score = score + favored_taper_points(self.identifier)
+        points = self.metadata_points()
+        if points is not None:
+            removed, title_points, track_points = points
+            if removed:
                 self._remove_from_archive = True
                 return -1
-            score = score + 3 * (self.title_fraction() - 1)  # reduce score for tapes without titles.
-            score = score + min(20, len(self._tracks)) / 4
-        score = score + self.download_rate
-        score = score + math.log(1 + self.downloads)
-        score = score + 0.5 * (
-            self.avg_rating - 2.0 / math.sqrt(self.num_reviews)
-        )  # down-weigh avg_rating: it's usually about the show, not the tape.
-        return score
+            score = score + title_points
+            score = score + track_points
+        return popularity_score(score, self.download_rate, self.downloads, self.avg_rating, self.num_reviews)
+
+    def metadata_points(self):
+        """The part of the score which comes from cached metadata, as (removed, title_points, track_points).
+        Returns None if the metadata is not cached. Uses the TapeScoreCache to avoid parsing the metadata.
+        """
+        if self._meta_points is not None:
+            return self._meta_points
+        score_cache = TapeScoreCache.for_dbpath(self.dbpath)
+        if not self.meta_loaded:
+            entry = score_cache.lookup(self.identifier, self.meta_path)
+            if entry is not None:
+                self._meta_points = tuple(entry[1:])
+                return self._meta_points
+        if not self.meta_lock.acquire(blocking=False):  # another thread is loading the metadata
+            return None
+        try:
+            if not self.meta_loaded:
+                self.get_metadata(only_if_cached=True)
+                if not self.meta_loaded:
+                    return None
+            if not self.contains_sound():
+                points = (True, 0, 0)
+            else:
+                title_points = 3 * (self.title_fraction() - 1)  # reduce score for tapes without titles.
+                track_points = min(20, len(self._tracks)) / 4
+                points = (False, title_points, track_points)
+        finally:
+            self.meta_lock.release()
+        try:
+            score_cache.put(self.identifier, os.stat(self.meta_path).st_mtime_ns, points)
+        except FileNotFoundError:
+            pass
+        self._meta_points = points
+        return points
 
     def title_fraction(self):
         n_tracks = len(self._tracks)
@@ -1702,28 +4403,79 @@ class GDTape(BaseTape):
             pass
 
     def get_metadata(self, only_if_cached=False):
-        if self.meta_loaded:
+        if only_if_cached and not self.meta_loaded and not metadata_cached(self.meta_path):  # we don't have it cached, so return.
             return
-        if only_if_cached and not os.path.exists(self.meta_path):  # we don't have it cached, so return.
+        # If another thread is loading the metadata, wait for it, unless we only wanted what is cached.
+        if not self.meta_lock.acquire(blocking=not only_if_cached):
             return
-        self._tracks = []
-        try:  # I used to check if file exists, but it may also be corrupt, so this is safer.
-            page_meta = json.load(open(self.meta_path, "r"))
-        except Exception:
-            r = requests.get(self.url_metadata)
-            logger.debug("url is {}".format(r.url))
-            if r.status_code != 200:
-                logger.warning("error pulling data for {}".format(self.identifier))
-                raise Exception("Download", "Error {} url {}".format(r.status_code, self.url_metadata))
-            try:
-                page_meta = r.json()
-            except ValueError:
-                logger.warning("Json Error {}".format(r.url))
+        try:
+            if self.meta_loaded:
                 return
+            try:  # I used to check if file exists, but it may also be corrupt, so this is safer.
+                page_meta = read_cached_metadata(self.meta_path, slim_ia_metadata)
+                downloaded = False
             except Exception:
-                logger.warning("Error getting metadata (json?)")
+                page_meta = self.download_metadata()
+                if page_meta is None:
+                    return
+                downloaded = True
+            self.load_metadata(page_meta, write=downloaded)  # only what came from the network is written
+            if self.meta_loaded:
+                MetadataCache.for_dbpath(self.dbpath).touch(self.meta_path)
+        finally:
+            self.meta_lock.release()
+
+    def download_metadata(self):
+        """Download the metadata from archive.org. Returns None if it is not json."""
+        backend = async_backend()
+        if backend is not None:
+            return backend.run(self.async_download_metadata())
+        r = http_client.get(self.url_metadata)
+        logger.debug("url is {}".format(r.url))
+        if r.status_code != 200:
+            logger.warning("error pulling data for {}".format(self.identifier))
+            raise Exception("Download", "Error {} url {}".format(r.status_code, self.url_metadata))
+        try:
+            return r.json()
+        except ValueError:
+            logger.warning("Json Error {}".format(r.url))
+        except Exception:
+            logger.warning("Error getting metadata (json?)")
+
+    async def async_download_metadata(self):
+        status, page_meta = await async_backend().get_json(self.url_metadata)
+        if status != 200:
+            logger.warning("error pulling data for {}".format(self.identifier))
+            raise Exception("Download", "Error {} url {}".format(status, self.url_metadata))
+        return page_meta
+
+    async def async_get_metadata(self):
+        """get_metadata on the event loop. Downloaded metadata is queued on the metadata_writer, like get_metadata.
+        The tape is loaded under meta_lock, which is not waited for: whoever holds it is loading the tape."""
+        if self.meta_loaded:
+            return
+        try:
+            page_meta = await async_read_cached_metadata(self.meta_path, slim_ia_metadata)
+            downloaded = False
+        except Exception:
+            page_meta = await self.async_download_metadata()
+            if page_meta is None:
+                return
+            downloaded = True
+        if not self.meta_lock.acquire(blocking=False):
+            return
+        try:
+            if self.meta_loaded:
                 return
+            self.load_metadata(page_meta, write=downloaded)
+        finally:
+            self.meta_lock.release()
+        if self.meta_loaded:
+            MetadataCache.for_dbpath(self.dbpath).touch(self.meta_path)
 
+    def load_metadata(self, page_meta, write=True):
+        """Make the tracks from the metadata. With write, the metadata is queued to be written to meta_path."""
+        self._tracks = []
         # self.reviews = page_meta['reviews'] if 'reviews' in page_meta.keys() else []
         orig_titles = {}
         orig_tracknums = {}
@@ -1764,7 +4516,10 @@ class GDTape(BaseTape):
             # logger.warn(f"Failed to read venue, city, state from metadata. {self.meta_path}")
             pass
 
-        self.write_metadata(page_meta)
+        if write:
+            self.write_metadata(page_meta)
+        else:
+            self.meta_loaded = True
 
         for track in self._tracks:
             if not isinstance(track.title, (str, bytes)):
@@ -1776,8 +4531,7 @@ class GDTape(BaseTape):
         return
 
     def write_metadata(self, page_meta):
-        os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
-        json.dump(page_meta, open(self.meta_path, "w"),indent=2)
+        metadata_writer.write(self.meta_path, slim_ia_metadata(page_meta), dbpath=self.dbpath)
         self.meta_loaded = True
 
     def append_track(self, tdict, orig_titles={}, orig_tracks={}):
@@ -1925,6 +4679,106 @@ class GDTape(BaseTape):
         self._tracks = newtracks.copy()
 
 
+class GDTapeRow:
+    """A lightweight handle to one row of a TapeIndex, which stands in for a GDTape in tape_dates.
+
+    The fields which are needed to browse the archive (identifier, date, artist, collection) and the
+    score of a tape with no cached metadata are read from the shared columns. The GDTape is only
+    built when something else is needed (tracks, venue, ...), and it is then memoized.
+    """
+
+    __slots__ = ["archive", "table", "row", "_tape"]
+
+    def __init__(self, archive, table, row):
+        object.__setattr__(self, "archive", archive)
+        object.__setattr__(self, "table", table)
+        object.__setattr__(self, "row", row)
+        object.__setattr__(self, "_tape", None)
+
+    def __getattr__(self, name):
+        return getattr(self.tape(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.tape(), name, value)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __repr__(self):
+        if self._tape is not None:
+            return self._tape.__repr__()
+        tag = "SBD" if self.stream_only() else "aud"
+        return f"{self.artist} {self.date} - {tag} - {self.compute_score():5.2f} - {self.identifier} Loaded:False\n"
+
+    def tape(self):
+        if self._tape is None:
+            object.__setattr__(self, "_tape", self.detached_tape())
+        return self._tape
+
+    def detached_tape(self):
+        """A new GDTape of the row, which is not memoized, eg to download its metadata in another thread"""
+        return GDTape(self.archive.dbpath, self.table.row_dict(self.row), self.archive.set_data, self.archive.collection_list)
+
+    @property
+    def identifier(self):
+        return self.table.identifier(self.row)
+
+    @property
+    def date(self):
+        return int_to_date(self.table.date[self.row])
+
+    @property
+    def collection(self):
+        return self.table.collection(self.row)
+
+    @property
+    def artist(self):
+        colls = self.archive.collection_list
+        collection = self.collection
+        return colls[min([colls.index(c) if c in colls else 100 for c in collection])] if len(colls) > 1 else colls[0]
+
+    @property
+    def meta_path(self):
+        year, monthday = divmod(self.table.date[self.row], 10000)
+        return os.path.join(self.archive.dbpath, str(year), str(monthday // 100), self.identifier + METADATA_SUFFIX)
+
+    @property
+    def meta_loaded(self):
+        return self._tape is not None and self._tape.meta_loaded
+
+    @property
+    def _remove_from_archive(self):
+        return self._tape is not None and self._tape._remove_from_archive
+
+    def stream_only(self):
+        return "stream_only" in self.collection
+
+    def compute_score(self):
+        """Same as GDTape.compute_score, without touching the disk unless the TapeScoreCache entry is stale."""
+        if self._tape is not None:
+            return self._tape.compute_score()
+        entry = self.archive.score_cache.get(self.identifier)
+        if entry is not None:
+            if len(entry) == 1:  # the metadata has to be scored
+                return self.tape().compute_score()
+            if entry[1]:  # removed
+                return -1
+        table, i = self.table, self.row
+        avg_rating = 2 if math.isnan(table.avg_rating[i]) else table.avg_rating[i]
+        num_reviews = 1 if table.num_reviews[i] < 0 else table.num_reviews[i]
+        downloads = 1 if table.downloads[i] < 0 else table.downloads[i]
+        addeddate = EPOCH + datetime.timedelta(seconds=table.addeddate[i])
+        download_rate = downloads / max(100, (datetime.datetime.now() - addeddate).days)
+        score = 3
+        if self.stream_only():
+            score = score + 10
+        score = score + favored_taper_points(self.identifier)
+        if entry is not None:
+            score = score + entry[2]
+            score = score + entry[3]
+        return popularity_score(score, download_rate, downloads, avg_rating, num_reviews)
+
+
 class GDTrack(BaseTrack):
     """A track from a GDTape recording"""
 
@@ -2026,26 +4880,115 @@ class GDDate_info:
         return retstr
 
 
-class GDSetBreaks:
-    """Set Information from a Grateful Dead date"""
+class SetBreaksIndex:
+    """The rows of set_breaks.csv indexed by artist and date, and the GDDate_info of each (artist, date).
 
-    def __init__(self, collection_list):
-        self.collection_list = collection_list
-        self.asd = {}
-        self.set_rows = []
-        # if 'GratefulDead' not in self.collection_list:
-        #    self.set_data = set_data
-        #    return
+    There is one index per process, see SetBreaksIndex.get. It is pickled to a sidecar next to the csv,
+    which is used while the csv is unchanged, so that startup does not have to parse the csv.
+    """
+
+    SIDECAR_VERSION = 1
+    _index = None
+    _lock = Lock()
+
+    def __init__(self, set_rows, csv_stat=None):
+        self.csv_stat = csv_stat
+        self._artist_dates = {}
+        for row in set_rows:
+            self._artist_dates.setdefault(row.artist, {}).setdefault(row.date, []).append(row)
+        self.date_info = {
+            (artist, date): GDDate_info(rows) for artist, dates in self._artist_dates.items() for date, rows in dates.items()
+        }
+        self.no_date_info = GDDate_info([])
+
+    def __repr__(self):
+        return f"SetBreaksIndex of {len(self.date_info)} dates"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_artist_dates"] = None  # only the GDDate_info are pickled, the rows are read again if needed.
+        return state
+
+    @property
+    def artist_dates(self):
+        """The GDSet_rows of each artist and date"""
+        if self._artist_dates is None:
+            artist_dates = {}
+            for row in self.read_csv():
+                artist_dates.setdefault(row.artist, {}).setdefault(row.date, []).append(row)
+            self._artist_dates = artist_dates
+        return self._artist_dates
+
+    @classmethod
+    def get(cls):
+        """The process-wide index"""
+        with cls._lock:
+            if cls._index is None:
+                cls._index = cls.load()
+            return cls._index
+
+    @staticmethod
+    def csv_path():
+        return pkg_resources.resource_filename("timemachine.metadata", "set_breaks.csv")
+
+    @classmethod
+    def sidecar_path(cls):
+        return os.path.join(os.path.dirname(cls.csv_path()), "set_breaks.pkl")
+
+    @classmethod
+    def load(cls):
+        csv_path = cls.csv_path()
+        try:
+            stat = os.stat(csv_path)
+            csv_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            csv_stat = None
+        if csv_stat is not None:
+            try:
+                with open(cls.sidecar_path(), "rb") as f:
+                    version, index = pickle.load(f)
+                if version == cls.SIDECAR_VERSION and index.csv_stat == csv_stat:
+                    return index
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Failed to read {cls.sidecar_path()}: {e}")
+        index = cls(cls.read_csv(), csv_stat)
+        if csv_stat is not None:
+            index.save()
+        return index
+
+    @staticmethod
+    def read_csv():
         set_breaks = pkg_resources.resource_stream("timemachine.metadata", "set_breaks.csv")
         utf8_reader = codecs.getreader("utf-8")
         r = [r for r in csv.reader(utf8_reader(set_breaks))]
         headers = r[0]
-        for row in r[1:]:
-            d = dict(zip(headers, row))
-            current_row = GDSet_row(d)
-            self.set_rows.append(current_row)
+        return [GDSet_row(dict(zip(headers, row))) for row in r[1:]]
 
-        # self.set_data = set_data
+    def save(self):
+        sidecar_path = self.sidecar_path()
+        tmpfile = None
+        try:
+            fd, tmpfile = tempfile.mkstemp(".pkl", dir=os.path.dirname(sidecar_path))
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.SIDECAR_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmpfile, sidecar_path)
+        except Exception as e:  # eg, if the package is installed read-only
+            logger.info(f"Failed to write set breaks {sidecar_path}: {e}")
+            if tmpfile and os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
+    def get_date(self, artist, date):
+        return self.date_info.get((artist, date), self.no_date_info)
+
+
+class GDSetBreaks:
+    """Set Information from a Grateful Dead date"""
+
+    def __init__(self, collection_list):
+        self.collection_list = collection_list
+        self.index = SetBreaksIndex.get()
 
     def __str__(self):
         return self.__repr__()
@@ -2055,21 +4998,11 @@ class GDSetBreaks:
         return retstr
 
     def get_artist_set_dict(self, artist):
-        if artist in self.asd.keys():
-            return self.asd[artist]
-
-        self.asd[artist] = {}
-        artist_rows = [sd for sd in self.set_rows if sd.artist == artist]
-        for s in artist_rows:
-            if not s.date in self.asd[artist].keys():
-                self.asd[artist][s.date] = [s]
-            else:
-                self.asd[artist][s.date].append(s)
-
-        return self.asd[artist]
+        return self.index.artist_dates.get(artist, {})
 
     def get_date(self, artist, date):
-        return GDDate_info(self.get_artist_set_dict(artist).get(date, []))
+        """The GDDate_info of an artist on a date. It is shared, do not modify it"""
+        return self.index.get_date(artist, date)
 
     def multi_location(self, artist, date):
         d = self.get_date(artist, date)
@@ -2102,6 +5035,174 @@ class GDSetBreaks:
             return None
 
 
+class TapeMemoryModel:
+    """A running model of the memory taken by loaded tapes.
+
+    Archives report the growth of the resident set size while their tapes load. The growth of a single load is
+    noisy, since memory freed by earlier loads gets reused, so bytes_per_tape is the ratio of the totals over all
+    loads, and default_bytes_per_tape is used until min_tapes have been measured.
+    """
+
+    def __init__(self, default_bytes_per_tape=500, min_tapes=1000, memory_fraction=0.5):
+        self.default_bytes_per_tape = default_bytes_per_tape
+        self.min_tapes = min_tapes
+        self.memory_fraction = memory_fraction  # of the available memory that loaded tapes may use
+        self.measured_tapes = 0
+        self.measured_bytes = 0
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"TapeMemoryModel {self.bytes_per_tape:.0f} bytes per tape, from {self.measured_tapes} tapes"
+
+    @staticmethod
+    def rss():
+        return psutil.Process().memory_info().rss
+
+    def record(self, n_tapes, n_bytes):
+        """Record that loading n_tapes grew the resident set by n_bytes"""
+        if n_tapes <= 0 or n_bytes <= 0:
+            return
+        with self.lock:
+            self.measured_tapes = self.measured_tapes + n_tapes
+            self.measured_bytes = self.measured_bytes + n_bytes
+
+    @property
+    def bytes_per_tape(self):
+        if self.measured_tapes < self.min_tapes:
+            return self.default_bytes_per_tape
+        return self.measured_bytes / self.measured_tapes
+
+    def budget(self, loaded_bytes=0):
+        """The bytes that tapes may take, given that loaded_bytes of tapes which could be dropped are loaded"""
+        return int(self.memory_fraction * (psutil.virtual_memory().available + loaded_bytes))
+
+    def diagnostics(self):
+        return {
+            "bytes_per_tape": self.bytes_per_tape,
+            "measured_tapes": self.measured_tapes,
+            "measured_bytes": self.measured_bytes,
+            "available_bytes": psutil.virtual_memory().available,
+            "budget_bytes": self.budget(),
+        }
+
+
+memory_model = TapeMemoryModel()
+
+
+class YearShardCache:
+    """A least-recently-used cache of GDArchives of single years, for players like the 78 RPM shuffle which load
+    many random years.
+
+    archivary(years) builds only the years which are not cached, and composes the cached shards into an
+    Archivary. Shards which are not in use are dropped, least recently used first, when the cached tapes
+    take more than the budget: max_bytes, or if that is None, the share of the available memory allowed by
+    the memory_model. The growth of the resident set while each shard loads is kept for diagnostics, but
+    being noisy, the budget is kept with the bytes_per_tape of the memory_model.
+    """
+
+    def __init__(self, collection_list, dbpath=os.path.join(ROOT_DIR, "metadata"), max_bytes=None):
+        self.collection_list = collection_list
+        self.dbpath = dbpath
+        self.max_bytes = max_bytes
+        self.shards = OrderedDict()  # year: GDArchive, least recently used first
+        self.shard_bytes = {}  # year: measured growth of the resident set while the shard loaded
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"YearShardCache of {len(self.shards)} years, {self.n_tapes()} tapes"
+
+    def n_tapes(self):
+        return sum(len(shard.tapes) for shard in self.shards.values())
+
+    def cached_bytes(self):
+        return int(self.n_tapes() * memory_model.bytes_per_tape)
+
+    def budget(self):
+        return self.max_bytes if self.max_bytes is not None else memory_model.budget(self.cached_bytes())
+
+    def missing(self, years):
+        """The years which are not cached"""
+        return [year for year in years if year not in self.shards]
+
+    def year_tapes(self):
+        """The number of tapes in each year, from the tape indexes"""
+        year_tapes = {}
+        for collection in self.collection_list:
+            for source in TapeIndex.load_sources(os.path.join(self.dbpath, f"{collection}_ids")):
+                year = period_of(source["name"])
+                if year is not None:
+                    year_tapes[year] = year_tapes.get(year, 0) + source["n_rows"]
+        return year_tapes
+
+    def estimate_bytes(self, years):
+        """The bytes which the tapes of each year take, or will take when loaded"""
+        year_tapes = self.year_tapes()
+        year_tapes.update((year, len(shard.tapes)) for year, shard in self.shards.items())
+        mean_tapes = sum(year_tapes.values()) / len(year_tapes) if len(year_tapes) > 0 else 0
+        return {year: year_tapes.get(year, mean_tapes) * memory_model.bytes_per_tape for year in years}
+
+    def select_years(self, years, rng=random):
+        """A random selection of years whose tapes fit in the budget, taking cached years first"""
+        years = list(years)
+        rng.shuffle(years)
+        years = sorted(years, key=lambda year: year not in self.shards)
+        estimates = self.estimate_bytes(years)
+        budget = self.budget()
+        selected = []
+        total = 0
+        for year in years:
+            if total + estimates[year] <= budget or len(selected) == 0:
+                selected.append(year)
+                total = total + estimates[year]
+        logger.info(f"Selected {len(selected)} of {len(years)} years, estimated {total} of {budget} bytes")
+        return sorted(selected)
+
+    def shard(self, year, reload_ids=False):
+        if year in self.shards:
+            self.shards.move_to_end(year)
+            return self.shards[year]
+        logger.info(f"Loading {self.collection_list} tapes from {year}")
+        shard = GDArchive(dbpath=self.dbpath, reload_ids=reload_ids, collection_list=self.collection_list, date_range=[year])
+        shard.tape_dates = shard.get_tape_dates()  # ranked, as in an Archivary
+        self.shards[year] = shard
+        self.shard_bytes[year] = shard.loaded_bytes
+        return shard
+
+    def evict(self, keep=()):
+        """Drop the least recently used shards, other than those of the years to keep, until within the budget"""
+        n_bytes = self.cached_bytes()
+        budget = self.budget()
+        for year in list(self.shards.keys()):
+            if n_bytes <= budget:
+                break
+            if year in keep:
+                continue
+            n_bytes = n_bytes - len(self.shards.pop(year).tapes) * memory_model.bytes_per_tape
+            del self.shard_bytes[year]
+            logger.info(f"Dropped the {year} tapes from the cache")
+
+    def diagnostics(self):
+        """The budget, the memory model, and the measured bytes and tapes of each cached year"""
+        return {
+            "budget_bytes": self.budget(),
+            "cached_bytes": self.cached_bytes(),
+            "memory_model": memory_model.diagnostics(),
+            "shards": {
+                year: {"tapes": len(shard.tapes), "measured_bytes": self.shard_bytes[year]} for year, shard in self.shards.items()
+            },
+        }
+
+    def archivary(self, years, reload_ids=False):
+        """An Archivary of the tapes from years"""
+        years = sorted(set(years))
+        with self.lock:
+            shards = [self.shard(year, reload_ids) for year in years]
+            self.evict(keep=years)
+        shards = [shard for shard in shards if len(shard.tape_dates) > 0]
+        archives = [GDArchive.compose(shards)] if len(shards) > 0 else []
+        return Archivary.from_archives(archives, self.collection_list, self.dbpath)
+
+
 class Archivary_Updater(Thread):
     """Updater runs in the backround checking for updates.
 
@@ -2127,10 +5228,9 @@ class Archivary_Updater(Thread):
             interval (float): Seconds between checks, pre-jitter.
             state (controls.state): state of the player.
             event (Event): Event which can be used to stop the update loop.
-            lock (Lock): Optional. Lock to acquire before an update. If a
-                lock is provided, it is only acquired when performing
-                the update and not when checking if the update is
-                necessary.
+            lock (Lock): Optional. Lock to acquire to publish an update. If a
+                lock is provided, it is only held while the updated archive
+                is swapped in, and not while it is downloaded and built.
             scr (controls.screen): The screen object, used to indicate that device is updating.
             stop_on_exception (bool): Set to True to have the updater loop
                 stop checking for updates if there is an exception in the
@@ -2149,6 +5249,7 @@ class Archivary_Updater(Thread):
         self.stop_on_exception = stop_on_exception
         self.last_update_time = datetime.datetime.now()
         self.min_time_between_updates = 5 * 3600
+        self.pending = None  # an updated archive which has not been published
 
     def check_for_updates(self, playstate) -> bool:
         """Check for updates.
@@ -2163,31 +5264,251 @@ class Archivary_Updater(Thread):
         return (not playing) and (time_since_last_update >= self.min_time_between_updates)
 
     def update(self) -> None:
-        """Get the updates."""
+        """Get the updates.
+
+        The updates are loaded into a clone of the archive, without the lock, so the current archive is untouched
+        if they fail. The clone is then published.
+        """
         logger.info("Running update")
-        archive = self.state.date_reader.archive
+        archive = self.pending if self.pending is not None else self.state.date_reader.archive
         if self.scr:
             self.scr.show_venue("UPDATING ARCHIVE", color=(255, 0, 0), force=True)
 
-        # Note: This should work with a copy and set current archive after update succeeds
-        archive.load_archive(reload_ids=False, with_latest=True)
+        updated = archive.clone()
+        updated.load_archive(reload_ids=False, with_latest=True)
+        self.pending = updated
         self.last_update_time = datetime.datetime.now()
+        self.publish()
+
+    def publish(self) -> bool:
+        """Swap the updated archive in for the current one, holding the lock only for the swap.
+        Returns:
+            (bool) True if the archive was swapped. If not, it is tried again on the next check.
+        """
+        if self.pending is None:
+            return False
+        if self.lock and not self.lock.acquire(timeout=10.0):
+            logger.info("Not publishing the updated archive yet, the lock is busy")
+            return False
+        try:
+            self.state.set_archive(self.pending)
+            self.pending = None
+            logger.info("Published the updated archive")
+            return True
+        finally:
+            if self.lock:
+                self.lock.release()
 
     def run(self):
         while not self.stopped.wait(timeout=self.interval * (1 + 0.1 * random.random())):
+            self.publish()
             current = self.state.get_current()
             playstate = current["PLAY_STATE"]
             if not self.check_for_updates(playstate):
                 continue
             try:
-                if self.lock:
-                    if self.lock.acquire(timeout=10.0):
-                        self.update()
+                self.update()
             except Exception as e:
                 if self.stop_on_exception:
                     raise e
                 logger.exception(e)
-            finally:
-                if self.lock:
-                    logger.debug("releasing updater lock")
-                    self.lock.release()
+
+
+class MetadataPrefetcher(Thread):
+    """Downloads the metadata of the tapes around the date on the knobs, so that it is cached when select is pressed.
+
+    The prefetcher polls the date_reader. When the staged date has stayed the same for an interval, the metadata
+    of the top k tapes of each archive is downloaded, first for the staged date and then for the n_neighbours
+    show dates on either side of it, nearest first. The downloads are done a date at a time. As soon as the knobs
+    move on, the downloads in flight are cancelled and the rest of the plan is dropped.
+
+    Only metadata which is not on disk is downloaded, by detached GDTapes, so that the tapes in the archive are
+    not loaded from two threads. Selecting the date then only reads the cached metadata.
+    """
+
+    def __init__(self, date_reader, event: Event, k: int = 3, n_neighbours: int = 2, interval: float = 0.25) -> None:
+        super().__init__(daemon=True)
+        self.date_reader = date_reader
+        self.stopped = event
+        self.k = k
+        self.n_neighbours = n_neighbours
+        self.interval = interval
+        self.done = None  # the (archive, date) which was prefetched last
+        self.in_flight = None  # the future of the downloads in flight, cancelled when the knobs move
+
+    def staged(self):
+        """The (archive, date) on the knobs"""
+        return (self.date_reader.archive, self.date_reader.fmtdate())
+
+    def plan(self, archive, date):
+        """The dates to prefetch, in order: the staged date if it has tapes, then the neighbouring show dates"""
+        dates = archive.dates
+        i = bisect.bisect_left(dates, date)
+        plan = [date] if i < len(dates) and dates[i] == date else []
+        after = dates[i + len(plan) : i + len(plan) + self.n_neighbours]
+        before = dates[max(0, i - self.n_neighbours) : i][::-1]
+        for n in range(self.n_neighbours):
+            plan.extend(d[n] for d in [after, before] if n < len(d))
+        return plan
+
+    def missing_tapes(self, archive, date):
+        """Detached tapes of the top k tapes of date in each archive, whose metadata is not cached"""
+        tapes = []
+        for a in getattr(archive, "archives", [archive]):
+            for t in a.tape_dates.get(date, [])[: self.k]:
+                if not isinstance(t, GDTapeRow) or (t._tape is not None and t._tape.meta_loaded):
+                    continue
+                if not metadata_cached(t.meta_path):
+                    tapes.append(t.detached_tape())
+        return tapes
+
+    def fetch(self, tapes, staged=None):
+        """Fetch the metadata of the tapes, cancelling the downloads in flight if the knobs move away from staged.
+        Returns False if the fetch was cancelled."""
+        staged = staged or self.staged()
+        backend = async_backend()
+        if backend is None:  # one tape at a time, so there is nothing in flight when the knobs move
+            n_failed = 0
+            for tape in tapes:
+                if self.staged() != staged:
+                    return False
+                n_failed = n_failed + fetch_metadata([tape])
+        else:
+            self.in_flight = backend.submit(async_fetch_metadata(tapes))
+            while not wait([self.in_flight], timeout=self.interval).done:
+                if self.staged() != staged or self.stopped.is_set():
+                    self.in_flight.cancel()
+                    logger.debug(f"Cancelled the prefetch of {len(tapes)} tapes for {staged[1]}")
+                    return False
+            n_failed = self.in_flight.result()
+        logger.debug(f"Prefetched the metadata of {len(tapes) - n_failed} of {len(tapes)} tapes")
+        return True
+
+    def prefetch(self, archive, date):
+        """Prefetch the metadata around date. Returns False if the knobs moved on before it was done."""
+        for d in self.plan(archive, date):
+            if self.staged() != (archive, date):
+                return False
+            tapes = self.missing_tapes(archive, d)
+            if len(tapes) > 0 and not self.fetch(tapes, (archive, date)):
+                return False
+        self.done = (archive, date)
+        return True
+
+    def run(self):
+        seen = None
+        while not self.stopped.wait(timeout=self.interval):
+            staged = self.staged()
+            if staged != seen:  # the knobs are moving. Wait until they stay put.
+                seen = staged
+                if hasattr(staged[0], "drop_provisional"):
+                    staged[0].drop_provisional(keep=staged[1])
+                continue
+            if staged == self.done or staged[0] is None or staged[1] is None:
+                continue
+            try:
+                self.prefetch(*staged)
+            except Exception as e:
+                logger.exception(e)
+                self.done = staged  # don't retry until the knobs move
+
+
+class MetadataEvictor(Thread):
+    """Keeps the metadata cached by the archives of the player under the METADATA_CACHE_MB quota.
+    The metadata of local archives belongs to the user, and is left alone.
+
+    Every interval, the MetadataCache of each archive's dbpath evicts its least-recently-used metadata. The tapes
+    of the player's date and staged date, and the tape it is playing, are pinned. These are the fields of the
+    saved state, so the tapes of the saved state are never evicted.
+    """
+
+    def __init__(self, state, interval: float, event: Event, quota_mb: float = None) -> None:
+        super().__init__(daemon=True)
+        self.state = state
+        self.interval = interval
+        self.stopped = event
+        self.quota_mb = quota_mb
+
+    def quota(self):
+        quota_mb = self.quota_mb if self.quota_mb is not None else config.optd.get("METADATA_CACHE_MB", METADATA_CACHE_MB)
+        return int(float(quota_mb) * 1e6)
+
+    def pinned(self):
+        """The identifiers of the tapes of the current and staged dates, and of the current tape"""
+        archive = self.state.date_reader.archive
+        current = self.state.get_current()
+        pinned = {current.get("TAPE_ID")}
+        for field in ["DATE", "STAGED_DATE"]:
+            date = current.get(field)
+            if date:
+                pinned.update(t.identifier for t in archive.tape_dates.get(date.strftime("%Y-%m-%d"), []))
+        return pinned
+
+    def evict(self):
+        archive = self.state.date_reader.archive
+        quota = self.quota()
+        pinned = self.pinned()
+        for dbpath in {a.dbpath for a in getattr(archive, "archives", [archive]) if not isinstance(a, LocalArchive)}:
+            MetadataCache.for_dbpath(dbpath).evict(quota, pinned)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.evict()
+            except Exception as e:
+                logger.exception(e)
+            self.stopped.wait(timeout=self.interval)
+
+
+class OptionsWatcher(Thread):
+    """Reloads the options when the options file is saved, and re-ranks the tapes of the player's archive when the
+    FAVORED_TAPER or PLAY_LOSSLESS options changed.
+
+    A FAVORED_TAPER change only re-ranks the dates whose tapes have other taper points. The tapers which the archive
+    was ranked with are compared to the option without the lock, so the lock is only taken when there is something
+    to re-rank. A PLAY_LOSSLESS change re-scores all of the tapes.
+    """
+
+    rank_options = ("FAVORED_TAPER", "PLAY_LOSSLESS")
+
+    def __init__(self, state, interval: float, event: Event, lock: Optional[Lock] = None) -> None:
+        super().__init__(daemon=True)
+        self.state = state
+        self.interval = interval
+        self.stopped = event
+        self.lock = lock
+
+    def tapers_changed(self, archive):
+        """True if the tapes of the archive were ranked with other tapers than the FAVORED_TAPER option"""
+        tapers = favored_taper_matcher().tapers
+        archives = [a for a in getattr(archive, "archives", [archive]) if isinstance(a, GDArchive)]
+        return any(a.favored_tapers not in (None, tapers) for a in archives)
+
+    def rerank(self, changed) -> bool:
+        """Re-rank the tapes after the options changed, the names of which are changed. Returns True if they were
+        re-ranked."""
+        archive = self.state.archive
+        rescore = "PLAY_LOSSLESS" in changed
+        if not rescore and not self.tapers_changed(archive):
+            return False
+        if self.lock and not self.lock.acquire(timeout=10.0):
+            return False
+        try:
+            if rescore:
+                logger.info("PLAY_LOSSLESS changed, re-scoring the tapes")
+                archive.rescore()
+            else:
+                archive.rerank_favored_tapers()
+            return True
+        finally:
+            if self.lock:
+                self.lock.release()
+
+    def run(self):
+        while not self.stopped.wait(timeout=self.interval):
+            try:
+                changed = config.reload_options()
+                if changed.intersection(self.rank_options):
+                    self.rerank(changed)
+            except Exception as e:
+                logger.exception(e)
@@ -19,6 +19,7 @@ except Exception as e:
 OPTIONS_PATH = os.path.join(os.getenv("HOME"), ".timemachine_options.txt")
 
 optd = {}
+options_mtime = None  # the modification time of the options file when the options were loaded
 
 # State variables
 NOT_READY = -1
@@ -73,6 +74,7 @@ def default_options():
     d["UPDATE_ARCHIVE_ON_STARTUP"] = False
     d["PLAY_LOSSLESS"] = False
     d["ON_TOUR_ALLOWED"] = False
+    d["METADATA_CACHE_MB"] = 500
     d["PULSEAUDIO_ENABLE"] = False
     if os_version > 10:
         d["PULSEAUDIO_ENABLE"] = True
@@ -105,14 +107,14 @@ def save_options(optd_to_save):
         json.dump(options, outfile, indent=1)
 
 
-def load_options():
-    global optd
-    optd = default_options()
+def read_options():
+    """The options in the options file, over the defaults. Unlike load_options, it has no side effects."""
+    d = default_options()
     tmpd = {}
     try:
         f = open(OPTIONS_PATH, "r")
         tmpd = json.loads(f.read())
-        for k in optd.keys():
+        for k in d.keys():
             logger.debug(f"Loading options key is {k}")
             try:
                 if k in [
@@ -133,14 +135,30 @@ def load_options():
                     if k == "COLLECTIONS":
                         c = ["Phish" if x.lower() == "phish" else x for x in c]
                     tmpd[k] = c
+                if k in ["METADATA_CACHE_MB"]:  # make numbers.
+                    tmpd[k] = float(tmpd[k])
                 if k in ["DEFAULT_START_TIME"]:  # make datetime
                     logger.debug(f"time k is {k}")
                     tmpd[k] = datetime.time.fromisoformat(tmpd[k])
             except Exception:
-                logger.warning(f"Failed to set option {k}. Using {optd[k]}")
+                logger.warning(f"Failed to set option {k}. Using {d[k]}")
     except Exception:
         logger.warning(f"Failed to read options from {OPTIONS_PATH}. Using defaults")
-    optd.update(tmpd)  # update defaults with those read from the file.
+    d.update(tmpd)  # update defaults with those read from the file.
+    return d
+
+
+def options_file_mtime():
+    try:
+        return os.stat(OPTIONS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_options():
+    global optd, options_mtime
+    options_mtime = options_file_mtime()
+    optd = read_options()
     if utils.get_os_name() == "Ubuntu":
         return
     logger.info(f"in load_options, optd {optd}")
@@ -151,3 +169,20 @@ def load_options():
     led_cmd = 'sudo bash -c "echo none > /sys/class/leds/led1/trigger"'
     logger.info(f"in load_options, running {led_cmd}")
     os.system(led_cmd)
+
+
+def reload_options():
+    """Reload the options if the options file was saved since they were loaded, e.g. by serve_options, which
+    only restarts the player when the MODULE changes. The new options are read in full and then swapped in, so
+    other threads never see a partial set, and none of the side effects of load_options are repeated.
+    Returns the names of the options which changed."""
+    global optd, options_mtime
+    mtime = options_file_mtime()
+    if mtime is None or mtime == options_mtime:
+        return set()
+    logger.info(f"Reloading options from {OPTIONS_PATH}")
+    options_mtime = mtime
+    new_optd = read_options()
+    changed = {k for k, v in new_optd.items() if optd.get(k) != v}
+    optd = new_optd
+    return changed
@@ -255,6 +255,14 @@ class date_knob_reader:
         self.shownum = divmod(shownum, max(1, len(self.shows_available())))[1]
         self._update()
 
+    def set_archive(self, archive):
+        """Replace the archive, eg with an updated one, keeping the date"""
+        date = self.date
+        self.archive = archive
+        self.year_baseline = min(archive.year_list())
+        self.y.steps = date.year - self.year_baseline
+        self._update()
+
     def fmtdate(self):
         if self.date is None:
             return None
@@ -1013,6 +1021,15 @@ class state:
         self.player = player
         self.dict = self.get_current()
 
+    @property
+    def archive(self):
+        """The archive of the player. It is read through the date_reader, so that set_archive switches everything."""
+        return self.date_reader.archive
+
+    def set_archive(self, archive):
+        """Switch the player to the archive, eg an updated one"""
+        self.date_reader.set_archive(archive)
+
     def __str__(self):
         return self.__repr__()
 
@@ -1055,6 +1055,7 @@ if "GratefulDead" not in archive.collection_list:
     date_reader.set_date(*date_reader.next_show())
 
 state = controls.state(date_reader, player)
+del archive  # the Archivary_Updater publishes updated archives to the state. Read the archive through state.archive
 current = state.get_current()
 current["PLAY_STATE"] = config.READY
 state.set(current)
@@ -1089,7 +1090,7 @@ TMB.y_button.when_held = lambda button: year_button_longpress(button, state)
 TMB.scr.clear_area(controls.Bbox(0, 0, 160, 100))
 TMB.scr.show_text("Powered by\n archive.org\n & phish.in", color=(0, 255, 255), force=True)
 TMB.scr.show_text(
-    str(len(archive.collection_list)).rjust(3), font=TMB.scr.boldsmall, loc=(120, 100), color=(255, 100, 0), force=True
+    str(len(state.archive.collection_list)).rjust(3), font=TMB.scr.boldsmall, loc=(120, 100), color=(255, 100, 0), force=True
 )
 
 # save_pid()
@@ -1103,6 +1104,12 @@ def main(parms_arg):
     if parms.verbose or parms.debug:
         set_logger_debug()
     load_saved_state(state)
+    prefetcher = Archivary.MetadataPrefetcher(date_reader, stop_update_event)
+    prefetcher.start()
+    evictor = Archivary.MetadataEvictor(state, 600, stop_update_event)
+    evictor.start()
+    options_watcher = Archivary.OptionsWatcher(state, 10, stop_update_event, lock=lock)
+    options_watcher.start()
     if config.optd["AUTO_UPDATE_ARCHIVE"] or config.UPDATE_COLLECTIONS:
         archive_updater = Archivary.Archivary_Updater(state, 3600, stop_update_event, scr=TMB.scr, lock=lock)
         archive_updater.start()
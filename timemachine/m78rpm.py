@@ -61,12 +61,12 @@ QUIESCENT_TIME = 20
 SLEEP_AFTER_SECONDS = 3600
 PWR_LED_ON = False
 AUTO_PLAY = True
-MAX_LOADABLE_YEARS = 10  # NOTE: this should depend on psutil.virtual_memory()
 SHUFFLE_SIZE = 12
 MAX_TAPES_PER_ARTIST = 10
 
 config.optd["COLLECTIONS"] = ["georgeblood"]
 artist_year_dict = {}  # this needs to be either in state or somewhere.
+year_shards = Archivary.YearShardCache(config.optd["COLLECTIONS"])  # tapes of the years loaded so far
 
 random.seed(datetime.datetime.now().timestamp())  # to ensure that random show will be new each time.
 parms = None
@@ -191,18 +191,14 @@ def shuffle_artist(state):
     config.DATE_RANGE = sorted([year, config.OTHER_YEAR if config.OTHER_YEAR else year])
     artist_counter = state.artist_counter
     date = date_reader.date
-    if (max(config.DATE_RANGE) - min(config.DATE_RANGE)) > MAX_LOADABLE_YEARS:  # Do I really need the check?
-        date_range = sorted(random.sample(range(*config.DATE_RANGE), MAX_LOADABLE_YEARS))
-        logger.info(f"Loading a reduced set of years: {date_range}")
-    else:
-        date_range = config.DATE_RANGE
-    TMB.scr.show_experience(text="Loading. May \n Require 5 Minutes", color=(255, 100, 0), force=True)
-    date_reader.archive = Archivary.Archivary(
-        reload_ids=reload_ids,
-        with_latest=False,
-        collection_list=config.optd["COLLECTIONS"],
-        date_range=date_range,
-    )
+    all_years = range(min(config.DATE_RANGE), max(config.DATE_RANGE) + 1)
+    years = year_shards.select_years(all_years)  # as many years as fit in memory
+    if len(years) < len(all_years):
+        logger.info(f"Loading a reduced set of years: {years}")
+    if len(year_shards.missing(years)) > 0:
+        TMB.scr.show_experience(text="Loading. May \n Require 5 Minutes", color=(255, 100, 0), force=True)
+    date_reader.archive = year_shards.archivary(years, reload_ids=reload_ids)
+    logger.info(f"Year cache {year_shards.diagnostics()}")
     artist_year_dict = date_reader.archive.year_artists(*config.DATE_RANGE)
     # artist_year_dict = archive.year_artists(date.year, config.OTHER_YEAR)
     artist_list = sorted(list(artist_year_dict.keys()))
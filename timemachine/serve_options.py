@@ -91,6 +91,7 @@ def default_options():
     d["UPDATE_ARCHIVE_ON_STARTUP"] = "false"
     d["ON_TOUR_ALLOWED"] = "false"
     d["PLAY_LOSSLESS"] = "false"
+    d["METADATA_CACHE_MB"] = "500"
     d["PULSEAUDIO_ENABLE"] = "false"
     if get_os_version() > 10:
         d["PULSEAUDIO_ENABLE"] = "true"